@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark das etapas build_payload, validate_payload, save_json e create_daily_zip
+sobre dados sintéticos (aurora_iqvia.synthetic), sem Oracle.
+
+    python -m aurora_iqvia.bench --scales 1000,10000,100000 --repeat 3
+    python -m aurora_iqvia.bench --e2e --scales 10000 --days 3
+    python -m aurora_iqvia.bench --sql-check --scales 100000 --days 3
+    python -m aurora_iqvia.bench --compare bench_results/antes.json bench_results/depois.json
+
+- --e2e: run_period completo (extração inclusa) sobre o banco local de aurora_iqvia.standin.
+- --sql-check: consultas originais × variantes enxutas (plans.VARIANTS) no banco local, dia a dia: tempo e linhas.
+- Tempo: melhor e mediana de N repetições (sem tracemalloc ligado).
+- Memória: pico do tracemalloc em uma execução extra por etapa.
+- Resultado em JSON (bench_results/bench_<data>_<hora>.json) para comparar execuções.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Callable, Optional
+
+RESULTS_DIR = Path(__file__).resolve().parent.parent / "bench_results"
+STAGES = ("build_payload", "validate_payload", "save_json", "create_daily_zip")
+
+def _noop(msg: str):
+    pass
+
+def _git_rev() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=5)
+        return out.stdout.strip()
+    except Exception:
+        return ""
+
+def _measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(max(1, repeat)):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "best_s": round(min(times), 4),
+        "median_s": round(statistics.median(times), 4),
+        "runs": len(times),
+        "peak_mb": round(peak / 1_048_576, 2),
+    }
+
+def bench_scale(scale: int, repeat: int, seed: int = 0, logger=_noop) -> Dict[str, Any]:
+    """
+    Mede as etapas para uma escala de linhas de venda.
+
+    Args:
+        scale: Linhas de venda do dia sintético
+        repeat: Repetições de cada etapa
+        seed: Semente do gerador
+        logger: Função para log
+
+    Returns:
+        Resultado da escala (linhas por seção e medidas por etapa)
+    """
+    from .controller import build_payload, build_dados_entrada, save_json, create_daily_zip
+    from .synthetic import generate_day
+    from .validator import validate_payload, FALLBACK_SPEC
+
+    dia = date(2025, 7, 1)
+    t = time.perf_counter()
+    frames = generate_day(scale, seed=seed, dia=dia)
+    gen_s = time.perf_counter() - t
+    dados_entrada = build_dados_entrada(frames["entradas"])
+
+    def build():
+        return build_payload(frames["mov"], frames["dev"], frames["fil"], frames["cli"], frames["est"],
+                             frames["produtos_unicos"], dados_entrada, dia, "BENCH", "0000", _noop)
+
+    payload = build()
+    result: Dict[str, Any] = {
+        "scale": scale,
+        "generate_s": round(gen_s, 3),
+        "rows": {k: len(frames[k]) for k in frames},
+        "sections": {k: len(v) for k, v in payload.items() if isinstance(v, list) and v},
+        "stages": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="gddi_bench_") as tmp:
+        out_dir = Path(tmp)
+        json_path = save_json(payload, "BENCH", dia, out_dir)
+        result["json_mb"] = round(json_path.stat().st_size / 1_048_576, 2)
+        steps = {
+            "build_payload": build,
+            "validate_payload": lambda: validate_payload(payload, FALLBACK_SPEC),
+            "save_json": lambda: save_json(payload, "BENCH", dia, out_dir),
+            "create_daily_zip": lambda: create_daily_zip(json_path, "BENCH", out_dir),
+        }
+        for name in STAGES:
+            logger(f"  {scale:>9} linhas · {name}...")
+            result["stages"][name] = _measure(steps[name], repeat)
+        result["zip_mb"] = round((out_dir / (json_path.stem + ".zip")).stat().st_size / 1_048_576, 2)
+    return result
+
+def bench_e2e(scale: int, days: int, repeat: int, seed: int = 0, logger=_noop) -> Dict[str, Any]:
+    """
+    Mede o run_period de ponta a ponta contra o banco local (standin), sem cache e sem envio.
+
+    Args:
+        scale: Linhas de venda por dia
+        days: Dias do período
+        repeat: Repetições do período
+        seed: Semente do gerador
+        logger: Função para log
+
+    Returns:
+        Resultado da escala (tempo total e soma das etapas por dia)
+    """
+    from .controller import run_period
+    from .db import AppConfig
+    from . import standin
+
+    d0 = date(2025, 7, 1)
+    d1 = d0 + timedelta(days=max(1, days) - 1)
+    with tempfile.TemporaryDirectory(prefix="gddi_bench_e2e_") as tmp:
+        db = standin.build_database(Path(tmp) / "prisma.db", d0, d1, scale=scale, seed=seed)
+        runs = []
+        for i in range(max(1, repeat)):
+            logger(f"  {scale:>9} linhas × {days} dia(s) · run_period #{i + 1}...")
+            cfg = AppConfig(out_dir=str(Path(tmp) / f"out{i}"), iqvia_client_id="BENCH",
+                            cache_enabled=False, skip_unchanged_days=False)
+            t = time.perf_counter()
+            summary = run_period(cfg, d0, d1, upload=False, logger=_noop, connect=lambda c: standin.connect(db))
+            total = time.perf_counter() - t
+            stages: Dict[str, float] = {}
+            for d in summary["days"]:
+                for k, v in (d.get("timings") or {}).items():
+                    stages[k] = stages.get(k, 0.0) + v
+            runs.append((total, stages, summary["days"][0].get("rows", {})))
+    best = min(runs, key=lambda r: r[0])
+    return {
+        "scale": scale,
+        "days": days,
+        "best_s": round(best[0], 4),
+        "median_s": round(statistics.median(r[0] for r in runs), 4),
+        "runs": len(runs),
+        "stages_s": {k: round(v, 4) for k, v in best[1].items()},
+        "rows_day1": best[2],
+    }
+
+def bench_sql_variants(scale: int, days: int, repeat: int, seed: int = 0, logger=_noop) -> List[Dict[str, Any]]:
+    """
+    Compara cada consulta com a sua variante enxuta (plans.VARIANTS) no banco local, dia a dia.
+
+    Args:
+        scale: Linhas de venda por dia
+        days: Dias do período
+        repeat: Execuções de cada consulta (vale o melhor tempo)
+        seed: Semente do gerador
+        logger: Função para log
+
+    Returns:
+        Um resultado de plans.compare_variant por consulta e dia
+    """
+    from . import standin
+    from .plans import VARIANTS, compare_variant
+
+    d0 = date(2025, 7, 1)
+    d1 = d0 + timedelta(days=max(1, days) - 1)
+    out = []
+    with tempfile.TemporaryDirectory(prefix="gddi_bench_sql_") as tmp:
+        db = standin.build_database(Path(tmp) / "prisma.db", d0, d1, scale=scale, seed=seed)
+        conn = standin.connect(db)
+        try:
+            for i in range(max(1, days)):
+                for name in VARIANTS:
+                    r = compare_variant(conn, name, d0 + timedelta(days=i), 1, repeat=repeat, logger=logger)
+                    out.append(dict(r, scale=scale))
+        finally:
+            conn.close()
+    return out
+
+def run_bench(scales: List[int], repeat: int = 3, seed: int = 0, logger=print,
+              e2e_days: int = 0, sql_days: int = 0) -> Dict[str, Any]:
+    """Executa o benchmark em todas as escalas e devolve o documento de resultados."""
+    import pandas as pd
+    doc: Dict[str, Any] = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "seed": seed,
+        "results": [],
+    }
+    for scale in scales:
+        logger(f"⏱️ Escala {scale} linhas de venda")
+        doc["results"].append(bench_scale(scale, repeat, seed, logger=logger))
+        if e2e_days:
+            doc.setdefault("e2e", []).append(bench_e2e(scale, e2e_days, repeat, seed, logger=logger))
+        if sql_days:
+            doc.setdefault("sql_variants", []).extend(bench_sql_variants(scale, sql_days, repeat, seed, logger=logger))
+    return doc
+
+def render(doc: Dict[str, Any]) -> str:
+    lines = [f"Benchmark {doc.get('timestamp', '')} (git {doc.get('git_rev') or '?'}, python {doc.get('python')})"]
+    lines.append(f"{'linhas':>10}  {'etapa':<18}{'melhor s':>10}{'mediana s':>11}{'pico MB':>10}")
+    for r in doc["results"]:
+        for name, m in r["stages"].items():
+            lines.append(f"{r['scale']:>10}  {name:<18}{m['best_s']:>10.4f}{m['median_s']:>11.4f}{m['peak_mb']:>10.2f}")
+    for r in doc.get("e2e", []):
+        etapas = ", ".join(f"{k} {v:.2f}s" for k, v in r["stages_s"].items())
+        lines.append(f"{r['scale']:>10}  run_period × {r['days']} dia(s): melhor {r['best_s']:.2f}s, "
+                     f"mediana {r['median_s']:.2f}s ({etapas})")
+    for r in doc.get("sql_variants", []):
+        status = "mesmas linhas" if r["same_rows"] else f"{r['only_original']}/{r['only_variant']} linha(s) diferentes"
+        lines.append(f"{r['scale']:>10}  {r['query']} × {r['variant']} {r['dia']}: "
+                     f"{r['best_s']['original']:.3f}s × {r['best_s']['variant']:.3f}s, {status}")
+    return "\n".join(lines)
+
+def compare(base: Dict[str, Any], new: Dict[str, Any]) -> str:
+    """Tabela de comparação (razão novo/base do melhor tempo e do pico de memória)."""
+    idx = {(r["scale"], name): m for r in base["results"] for name, m in r["stages"].items()}
+    lines = [f"{'linhas':>10}  {'etapa':<18}{'tempo novo/base':>16}{'memória novo/base':>19}"]
+    for r in new["results"]:
+        for name, m in r["stages"].items():
+            b = idx.get((r["scale"], name))
+            if not b:
+                continue
+            tr = m["best_s"] / b["best_s"] if b["best_s"] else float("nan")
+            mr = m["peak_mb"] / b["peak_mb"] if b["peak_mb"] else float("nan")
+            lines.append(f"{r['scale']:>10}  {name:<18}{tr:>15.2f}x{mr:>18.2f}x")
+    e2e = {(r["scale"], r["days"]): r for r in base.get("e2e", [])}
+    for r in new.get("e2e", []):
+        b = e2e.get((r["scale"], r["days"]))
+        if b and b["best_s"]:
+            lines.append(f"{r['scale']:>10}  {'run_period':<18}{r['best_s'] / b['best_s']:>15.2f}x")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m aurora_iqvia.bench",
+                                 description="Benchmark build/validate/save/zip com dados sintéticos")
+    ap.add_argument("--scales", default="1000,10000,100000",
+                    help="linhas de venda por dia, separadas por vírgula (até 2000000)")
+    ap.add_argument("--repeat", type=int, default=3, help="repetições por etapa")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--e2e", action="store_true", help="mede também o run_period completo no banco local (standin)")
+    ap.add_argument("--sql-check", action="store_true",
+                    help="compara as consultas originais com as variantes enxutas no banco local (standin)")
+    ap.add_argument("--days", type=int, default=3, help="dias do período no --e2e/--sql-check")
+    ap.add_argument("--out", help="arquivo JSON de resultado (padrão: bench_results/bench_<data>.json)")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NOVO"), help="compara dois resultados e sai")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        base, new = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        print(compare(base, new))
+        return 0
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    log = lambda m: print(m, file=sys.stderr, flush=True)
+    doc = run_bench(scales, repeat=args.repeat, seed=args.seed, logger=log, e2e_days=args.days if args.e2e else 0,
+                    sql_days=args.days if args.sql_check else 0)
+    out = Path(args.out) if args.out else RESULTS_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(render(doc))
+    print(f"\nResultado: {out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Cache em disco dos DataFrames extraídos do Oracle.
+- Chave: (nome da query, filial, dia, hash do texto SQL).
+- Formato Parquet (pyarrow) quando disponível; caso contrário, pickle do pandas.
+- Expiração por TTL e despejo dos arquivos menos usados quando o cache passa do limite de tamanho.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import time
+from datetime import date
+from pathlib import Path
+from typing import Optional, List
+
+from .db import restore_none
+
+CACHE_DIRNAME = "cache"
+
+def _has_parquet() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def sql_hash(sql: str) -> str:
+    """Hash curto do texto SQL (muda quando a query muda)."""
+    return hashlib.sha1(sql.encode("utf-8")).hexdigest()[:12]
+
+class ExtractionCache:
+    def __init__(self, out_dir: Path, ttl_hours: float = 12.0, max_mb: float = 1024.0):
+        self.root = Path(out_dir) / CACHE_DIRNAME
+        self.ttl_seconds = float(ttl_hours) * 3600.0
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self.ext = ".parquet" if _has_parquet() else ".pkl"
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, query_name: str, codfilial: int, dia: date, sql: str) -> Path:
+        """
+        Caminho do arquivo de cache de uma query.
+
+        Args:
+            query_name: Nome da query (ex.: SQL_MOV)
+            codfilial: Código da filial
+            dia: Dia de referência
+            sql: Texto SQL efetivamente executado
+
+        Returns:
+            Path do arquivo (pode não existir)
+        """
+        return self.root / str(codfilial) / dia.strftime("%Y%m%d") / f"{query_name}_{sql_hash(sql)}{self.ext}"
+
+    def _expired(self, p: Path) -> bool:
+        if self.ttl_seconds <= 0:
+            return False
+        # o TTL conta a partir da gravação (ctime pode mudar com o utime de leitura no Windows)
+        written = p.with_suffix(p.suffix + ".ts")
+        try:
+            ts = float(written.read_text(encoding="utf-8"))
+        except Exception:
+            ts = p.stat().st_mtime
+        return (time.time() - ts) > self.ttl_seconds
+
+    def get(self, query_name: str, codfilial: int, dia: date, sql: str):
+        """
+        Lê um DataFrame do cache.
+
+        Returns:
+            DataFrame ou None se ausente/expirado/ilegível
+        """
+        p = self.path_for(query_name, codfilial, dia, sql)
+        if not p.is_file() or self._expired(p):
+            self.misses += 1
+            return None
+        try:
+            import pandas as pd
+            df = pd.read_parquet(p) if p.suffix == ".parquet" else pd.read_pickle(p)
+        except Exception:
+            self.misses += 1
+            return None
+        # o Parquet devolve NULLs de texto como NaN; o restante do código espera None (como no fetch_df)
+        restore_none(df)
+        # marca uso recente (para o despejo por tamanho)
+        try:
+            os.utime(p, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return df
+
+    def put(self, query_name: str, codfilial: int, dia: date, sql: str, df) -> Optional[Path]:
+        """
+        Grava um DataFrame no cache. Falhas de gravação não interrompem o processamento.
+
+        Returns:
+            Path gravado ou None em caso de erro
+        """
+        p = self.path_for(query_name, codfilial, dia, sql)
+        tmp = p.with_name(p.name + ".tmp")
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            if p.suffix == ".parquet":
+                df.to_parquet(tmp, index=False)
+            else:
+                df.to_pickle(tmp)
+            os.replace(tmp, p)
+            p.with_suffix(p.suffix + ".ts").write_text(str(time.time()), encoding="utf-8")
+        except Exception:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            return None
+        self.evict()
+        return p
+
+    def invalidate(self, codfilial: int, dia: date) -> int:
+        """
+        Remove todas as entradas de uma filial/dia (usado no "atualizar do Oracle").
+
+        Returns:
+            Quantidade de arquivos removidos
+        """
+        d = self.root / str(codfilial) / dia.strftime("%Y%m%d")
+        removed = 0
+        if d.is_dir():
+            for f in d.iterdir():
+                try:
+                    f.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def _entries(self) -> List[Path]:
+        if not self.root.is_dir():
+            return []
+        return [p for p in self.root.rglob("*") if p.is_file() and p.suffix in (".parquet", ".pkl")]
+
+    def evict(self) -> int:
+        """
+        Remove entradas expiradas e, se necessário, as menos usadas até caber no limite.
+
+        Returns:
+            Quantidade de entradas removidas
+        """
+        removed = 0
+        live = []
+        for p in self._entries():
+            try:
+                if self._expired(p):
+                    self._remove(p)
+                    removed += 1
+                else:
+                    st = p.stat()
+                    live.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                pass
+        total = sum(size for _, size, _ in live)
+        if self.max_bytes > 0 and total > self.max_bytes:
+            for _, size, p in sorted(live):
+                if total <= self.max_bytes:
+                    break
+                self._remove(p)
+                total -= size
+                removed += 1
+        return removed
+
+    def _remove(self, p: Path):
+        for f in (p, p.with_suffix(p.suffix + ".ts")):
+            try:
+                f.unlink()
+            except OSError:
+                pass
+
+    def size_bytes(self) -> int:
+        total = 0
+        for p in self._entries():
+            try:
+                total += p.stat().st_size
+            except OSError:
+                pass
+        return total
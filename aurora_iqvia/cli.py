@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Linha de comando (sem interface gráfica) para execuções agendadas.
+
+    python -m aurora_iqvia run --ini 01/07/2025 --fim 31/07/2025 --filial 1 --upload
+    python -m aurora_iqvia --ontem --upload          # "run" é o comando padrão
+    python -m aurora_iqvia plan --dia 01/07/2025     # planos de execução das consultas (EXPLAIN PLAN)
+    python -m aurora_iqvia setup-staging             # cria a tabela temporária das chaves do dia (uma vez)
+
+- Não importa tkinter/ttkbootstrap: roda no Agendador de Tarefas / cron.
+- Log no stderr; resumo em JSON no stdout (e opcionalmente em arquivo).
+- Códigos de saída: ver EXIT_*.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import sys
+from dataclasses import replace
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Dict, Any
+
+from .db import AppConfig
+
+EXIT_OK = 0          # tudo processado (e enviado, se pedido)
+EXIT_PARTIAL = 1     # processado com falhas de envio ou divergências de validação
+EXIT_USAGE = 2       # argumentos inválidos (padrão do argparse)
+EXIT_FAILED = 3      # falha geral (configuração, conexão, erro no processamento)
+
+COMMANDS = ("run", "plan", "setup-staging")
+
+def _parse_date(s: str) -> date:
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"data inválida: {s} (use dd/mm/aaaa ou aaaa-mm-dd)")
+
+def _parse_filiais(values: Optional[List[str]]) -> List[int]:
+    out: List[int] = []
+    for v in values or []:
+        for part in str(v).split(","):
+            part = part.strip()
+            if part:
+                out.append(int(part))
+    return out
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m aurora_iqvia",
+                                     description="GDDI – Gerador de dados IQVIA (modo linha de comando)")
+    sub = parser.add_subparsers(dest="command")
+
+    run = sub.add_parser("run", help="gera (e opcionalmente envia) os arquivos diários de um período")
+    run.add_argument("--config", help="arquivo de configuração (padrão: iqvia_gui_config.json)")
+    run.add_argument("--ini", type=_parse_date, help="data inicial (dd/mm/aaaa)")
+    run.add_argument("--fim", type=_parse_date, help="data final (dd/mm/aaaa); padrão = data inicial")
+    run.add_argument("--ontem", action="store_true", help="processa apenas o dia anterior")
+    run.add_argument("--filial", action="append", metavar="COD",
+                     help="filial(is) a processar; repetir ou separar por vírgula (padrão: a da configuração)")
+    run.add_argument("--out-dir", help="pasta de saída (padrão: a da configuração)")
+    run.add_argument("--upload", action=argparse.BooleanOptionalAction, default=None,
+                     help="envia para a IQVIA (padrão: a da configuração)")
+    run.add_argument("--validate", action=argparse.BooleanOptionalAction, default=None,
+                     help="valida o payload (padrão: a da configuração)")
+    run.add_argument("--layout", help="layout JSON oficial para a validação")
+    run.add_argument("--format", dest="output_format", choices=("both", "json", "zip"), default="both",
+                     help="arquivos gerados: JSON e ZIP (padrão), só JSON, ou só ZIP")
+    run.add_argument("--refresh", action="store_true", help="ignora o cache de extração (e refaz todos os dias)")
+    run.add_argument("--skip-unchanged", action=argparse.BooleanOptionalAction, default=None,
+                     help="pula dias sem alterações na origem, no layout e na configuração (padrão: a da configuração)")
+    run.add_argument("--force", action="store_true", help="refaz também os dias sem alterações (com --skip-unchanged)")
+    run.add_argument("--consistent-read", action=argparse.BooleanOptionalAction, default=None,
+                     help="consultas do dia no mesmo SCN (AS OF SCN; padrão: a da configuração)")
+    run.add_argument("--profile", action="store_true",
+                     help="perfila cada etapa do dia (cProfile + tracemalloc) ao lado da saída")
+    run.add_argument("--profile-top", type=int, metavar="N", help="funções/alocações listadas por etapa")
+    run.add_argument("--workers", type=int, metavar="N",
+                     help="dias gerados em paralelo, uma sessão Oracle por worker (padrão: a da configuração)")
+    run.add_argument("--query-sessions", type=int, metavar="N",
+                     help="consultas do dia executadas ao mesmo tempo, cada uma em sua sessão (máx. 7)")
+    run.add_argument("--fetch-backend", choices=("auto", "arrow", "columns", "rows"),
+                     help="leitura dos resultados: Arrow do oracledb, colunas em lotes ou linhas (padrão: a da configuração, rows)")
+    run.add_argument("--worker-max-mb", type=int, metavar="MB",
+                     help="dias com extração acima deste tamanho são montados sem concorrência")
+    run.add_argument("--project-columns", action=argparse.BooleanOptionalAction, default=None,
+                     help="vendas/devoluções só com as colunas usadas no payload (padrão: a da configuração)")
+    run.add_argument("--entry-lookup", choices=("index", "targeted", "scan"),
+                     help="EAN/preço de entrada: índice local incremental, só os produtos sem EAN/preço ou varredura de 365 dias")
+    run.add_argument("--stock-mode", choices=("plsql", "ledger"),
+                     help="estoque dos dias: PKG_ESTOQUE por produto/dia ou saldo final recuado pelas movimentações")
+    run.add_argument("--sargable", metavar="NOMES",
+                     help="consultas com o predicado de data que usa índice (ex.: SQL_MOV,SQL_FINGERPRINT ou all)")
+    run.add_argument("--lean-devolucoes", action=argparse.BooleanOptionalAction, default=None,
+                     help="devoluções sem as junções não usadas (mesmo resultado, DISTINCT sobre 4 tabelas)")
+    run.add_argument("--stage-keys", action=argparse.BooleanOptionalAction, default=None,
+                     help="filtra vendas/devoluções uma vez por dia numa tabela temporária (GDDI_DIA_ITENS)")
+    run.add_argument("--watermark", action=argparse.BooleanOptionalAction, default=None,
+                     help="regeração intradiária: lê só as notas novas desde a última execução do dia")
+    run.add_argument("--query-timeout", type=float, metavar="S",
+                     help="prazo de cada consulta pesada do dia; estourado, refaz em janelas de horário/faixas de CODPROD (0 = sem prazo)")
+    run.add_argument("--split-parts", type=int, metavar="N",
+                     help="pedaços iniciais de uma consulta que estourou o prazo (padrão: 4, janelas de 6 horas)")
+    run.add_argument("--driver-mode", choices=("thick", "thin"),
+                     help="python-oracledb com o Instant Client (thick) ou sem ele (thin, Oracle 12.1+)")
+    run.add_argument("--throttle", action=argparse.BooleanOptionalAction, default=None,
+                     help="controle de carga no ERP: limita sessões e consultas por minuto e pausa quando o Oracle fica lento")
+    run.add_argument("--quiet-hours", metavar="HH-HH",
+                     help="horário livre do controle de carga, sem limites (ex.: 22-06; vazio = limites o dia todo)")
+    run.add_argument("--compact", action=argparse.BooleanOptionalAction, default=None,
+                     help="dados do dia em memória compacta: texto repetido como categoria, inteiros menores")
+    run.add_argument("--summary-file", help="grava o resumo JSON também neste arquivo")
+
+    plan = sub.add_parser("plan", help="planos de execução (EXPLAIN PLAN/DBMS_XPLAN) das consultas, "
+                                       "original × sargable, marcando acessos completos")
+    plan.add_argument("--config", help="arquivo de configuração (padrão: iqvia_gui_config.json)")
+    plan.add_argument("--dia", type=_parse_date, help="dia dos binds representativos (padrão: ontem)")
+    plan.add_argument("--filial", type=int, metavar="COD", help="filial dos binds (padrão: a da configuração)")
+    plan.add_argument("--query", action="append", metavar="NOME", help="consulta a explicar; repetir (padrão: todas)")
+    plan.add_argument("--compare", action="store_true",
+                      help="executa a consulta original e a variante enxuta (ex.: SQL_DEVOLUCOES) e compara tempo e linhas")
+    plan.add_argument("--repeat", type=int, default=3, help="execuções de cada consulta no --compare")
+    plan.add_argument("--out-dir", help="pasta de saída (padrão: a da configuração); relatório em <saída>/plans")
+
+    setup = sub.add_parser("setup-staging", help="cria a GLOBAL TEMPORARY TABLE GDDI_DIA_ITENS usada por --stage-keys")
+    setup.add_argument("--config", help="arquivo de configuração (padrão: iqvia_gui_config.json)")
+    setup.add_argument("--print", dest="print_only", action="store_true",
+                       help="só mostra o DDL (para o DBA rodar), sem conectar")
+    return parser
+
+def _logger(msg: str):
+    print(msg, file=sys.stderr, flush=True)
+
+def cmd_run(args) -> int:
+    cfg = AppConfig.load(args.config)
+    if args.ontem:
+        d0 = d1 = date.today() - timedelta(days=1)
+    elif args.ini:
+        d0 = args.ini
+        d1 = args.fim or args.ini
+    else:
+        _logger("❌ Informe --ini/--fim ou --ontem.")
+        return EXIT_USAGE
+    if d1 < d0:
+        _logger("❌ Data final anterior à inicial.")
+        return EXIT_USAGE
+
+    if args.out_dir:
+        cfg.out_dir = args.out_dir
+    if args.profile_top:
+        cfg.profile_top_n = args.profile_top
+    if args.skip_unchanged is not None:
+        cfg.skip_unchanged_days = args.skip_unchanged
+    if args.consistent_read is not None:
+        cfg.consistent_read = args.consistent_read
+    if args.workers is not None:
+        if args.workers < 1:
+            _logger("❌ --workers deve ser 1 ou mais.")
+            return EXIT_USAGE
+        cfg.parallel_workers = args.workers
+    if args.query_sessions is not None:
+        if args.query_sessions < 1:
+            _logger("❌ --query-sessions deve ser 1 ou mais.")
+            return EXIT_USAGE
+        cfg.query_sessions = args.query_sessions
+    if args.fetch_backend:
+        cfg.fetch_backend = args.fetch_backend
+    if args.worker_max_mb is not None:
+        cfg.worker_max_mb = args.worker_max_mb
+    if args.project_columns is not None:
+        cfg.project_columns = args.project_columns
+    if args.entry_lookup:
+        cfg.entry_lookup = args.entry_lookup
+    if args.stock_mode:
+        cfg.stock_mode = args.stock_mode
+    if args.sargable is not None:
+        cfg.sargable_queries = args.sargable
+    if args.lean_devolucoes is not None:
+        cfg.lean_devolucoes = args.lean_devolucoes
+    if args.stage_keys is not None:
+        cfg.stage_day_keys = args.stage_keys
+    if args.watermark is not None:
+        cfg.intraday_watermark = args.watermark
+    if args.query_timeout is not None:
+        cfg.query_timeout_s = args.query_timeout
+    if args.split_parts is not None:
+        cfg.split_parts = args.split_parts
+    if args.driver_mode:
+        cfg.oracle_driver_mode = args.driver_mode
+    if args.throttle is not None:
+        cfg.throttle_enabled = args.throttle
+    if args.quiet_hours is not None:
+        cfg.throttle_quiet_hours = args.quiet_hours
+    if args.compact is not None:
+        cfg.compact_frames = args.compact
+    filiais = _parse_filiais(args.filial) or [cfg.codfilial]
+    upload = cfg.upload_default if args.upload is None else args.upload
+    validate = cfg.validation_enabled if args.validate is None else args.validate
+    layout = args.layout if args.layout is not None else cfg.layout_example_path
+    if upload and args.output_format == "json":
+        _logger("❌ --upload exige o ZIP (--format both ou zip).")
+        return EXIT_USAGE
+    if cfg.throttle_enabled:
+        from .throttle import parse_hours
+        try:
+            parse_hours(cfg.throttle_quiet_hours)
+        except ValueError as e:
+            _logger(f"❌ {e}")
+            return EXIT_USAGE
+
+    # controller é importado aqui: nada de GUI, e o driver só carrega quando necessário
+    from .controller import run_period
+
+    result: Dict[str, Any] = {"status": "ok", "exit_code": EXIT_OK, "runs": []}
+    for cod in filiais:
+        fcfg = replace(cfg, codfilial=cod)
+        if len(filiais) > 1:
+            # uma subpasta por filial: os nomes U_<CLIENTE>_<DATA> colidiriam entre filiais
+            fcfg.out_dir = str(Path(cfg.out_dir) / f"F{cod}")
+        try:
+            summary = run_period(fcfg, d0, d1, upload=upload, logger=_logger, validate=validate,
+                                 example_layout=layout, refresh=args.refresh,
+                                 output_format=args.output_format, force=args.force,
+                                 profile=args.profile)
+        except Exception as e:
+            _logger(f"❌ ERRO (filial {cod}): {e}")
+            summary = {"codfilial": cod, "error": str(e)}
+            result["exit_code"] = EXIT_FAILED
+        else:
+            if (summary.get("upload_errors") or summary.get("validation_errors")) and result["exit_code"] == EXIT_OK:
+                result["exit_code"] = EXIT_PARTIAL
+        result["runs"].append(summary)
+
+    result["status"] = {EXIT_OK: "ok", EXIT_PARTIAL: "partial", EXIT_FAILED: "failed"}[result["exit_code"]]
+    text = json.dumps(result, ensure_ascii=False, indent=2, default=str)
+    print(text)
+    if args.summary_file:
+        Path(args.summary_file).write_text(text, encoding="utf-8")
+    return result["exit_code"]
+
+def cmd_plan(args) -> int:
+    from .db import connect_oracle
+    from .plans import capture_plans, compare_variant, save_report, VARIANTS
+
+    cfg = AppConfig.load(args.config)
+    if args.out_dir:
+        cfg.out_dir = args.out_dir
+    dia = args.dia or date.today() - timedelta(days=1)
+    try:
+        _logger("🔌 Conectando ao Oracle...")
+        conn = connect_oracle(cfg)
+        try:
+            if args.compare:
+                results = [compare_variant(conn, name, dia, args.filial or cfg.codfilial, repeat=args.repeat,
+                                           logger=_logger) for name in (args.query or list(VARIANTS))]
+            else:
+                doc = capture_plans(conn, dia, args.filial or cfg.codfilial, names=args.query, logger=_logger)
+        finally:
+            conn.close()
+    except ValueError as e:
+        _logger(f"❌ {e}")
+        return EXIT_USAGE
+    except Exception as e:
+        _logger(f"❌ ERRO: {e}")
+        return EXIT_FAILED
+    if args.compare:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return EXIT_OK if all(r["same_rows"] for r in results) else EXIT_PARTIAL
+    path = save_report(doc, Path(cfg.out_dir))
+    _logger(f"💾 Relatório de planos: {path}")
+    print(json.dumps({n: {v: len(r["full_scans"]) for v, r in out.items()} for n, out in doc["queries"].items()},
+                     ensure_ascii=False, indent=2))
+    return EXIT_OK
+
+def cmd_setup_staging(args) -> int:
+    from .sql_prisma import STAGING_DDL
+
+    if args.print_only:
+        print(";\n".join(ddl.strip() for ddl in STAGING_DDL) + ";")
+        return EXIT_OK
+    from .db import connect_oracle
+    cfg = AppConfig.load(args.config)
+    result = {"created": 0, "existing": 0}
+    try:
+        _logger("🔌 Conectando ao Oracle...")
+        conn = connect_oracle(cfg)
+        try:
+            cur = conn.cursor()
+            for ddl in STAGING_DDL:
+                try:
+                    cur.execute(ddl)
+                    result["created"] += 1
+                except Exception as e:
+                    # ORA-00955: o nome já é usado por um objeto existente (setup já rodado)
+                    if "ORA-00955" not in str(e) and "already exists" not in str(e):
+                        raise
+                    result["existing"] += 1
+            cur.close()
+        finally:
+            conn.close()
+    except Exception as e:
+        _logger(f"❌ ERRO: {e}")
+        return EXIT_FAILED
+    _logger(f"✅ GDDI_DIA_ITENS pronta: {result['created']} objeto(s) criado(s), {result['existing']} já existente(s)")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return EXIT_OK
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # "run" é o comando padrão
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv.insert(0, "run")
+    # console do Windows (cp1252) não representa os emojis do log
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.reconfigure(errors="replace")
+        except Exception:
+            pass
+    args = build_parser().parse_args(argv)
+    if args.command == "run":
+        return cmd_run(args)
+    if args.command == "plan":
+        return cmd_plan(args)
+    if args.command == "setup-staging":
+        return cmd_setup_staging(args)
+    return EXIT_USAGE
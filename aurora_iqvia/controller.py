@@ -3,9 +3,11 @@ from __future__ import annotations
 import sys
 import os
 from pathlib import Path
-from typing import Dict, Any, List, Callable
+from typing import Dict, Any, List, Callable, Optional
 from datetime import date, datetime
-import io, zipfile, json
+import io, zipfile, json, time, threading, queue, re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
 # Para execução direta
 if __name__ == "__main__":
@@ -13,20 +15,44 @@ if __name__ == "__main__":
 
 # Imports (relativos e absolutos)
 try:
-    from .db import AppConfig, connect_oracle, fetch_df
+    from .db import AppConfig, connect_oracle, create_pool, fetch_df, apply_types, compact_frame
     from .sql_prisma import (
-        SQL_MOV, SQL_DEVOLUCOES, SQL_FILIAL, SQL_CLIENTES,
-        SQL_ESTOQUE, SQL_PRODUTOS_UNICOS, SQL_ENTRADA_PRODUTOS
+        QUERIES, QUERY_TYPES, SQL_FINGERPRINT,
+        SQL_CURRENT_SCN, SQL_CURRENT_SCN_VDB, as_of_scn, project,
+        SQL_ENTRADA_PRODUTOS_ALVO, SQL_DEVOLUCOES_ENXUTA, in_batches, sargable,
+        STAGED_QUERIES, SQL_STAGE_CHECK, SQL_STAGE_CLEAR, SQL_STAGE_VENDAS, SQL_STAGE_DEVOLUCOES,
+        DAY_QUERY_PARTS, watermark_delta, order_columns, SQL_WATERMARK, without_scn
     )
+    from .cache import ExtractionCache
+    from .entries import EntryIndex
+    from .intraday import IntradayState, DELTA_QUERIES
+    from .split import deadline_fetch
+    from .throttle import Throttle
+    from .ledger import StockLedger
+    from .manifest import RunManifest, fingerprint_hash, config_hash
+    from .profiling import StageProfiler, stage
+    from .querystats import QueryStats
     from .utils import only_digits, md5_bytes, beautify_json, daterange
     from .iqvia_api import get_token, upload_zip
     from .validator import validate_payload, load_spec
 except ImportError:
-    from aurora_iqvia.db import AppConfig, connect_oracle, fetch_df
+    from aurora_iqvia.db import AppConfig, connect_oracle, create_pool, fetch_df, apply_types, compact_frame
     from aurora_iqvia.sql_prisma import (
-        SQL_MOV, SQL_DEVOLUCOES, SQL_FILIAL, SQL_CLIENTES,
-        SQL_ESTOQUE, SQL_PRODUTOS_UNICOS, SQL_ENTRADA_PRODUTOS
+        QUERIES, QUERY_TYPES, SQL_FINGERPRINT,
+        SQL_CURRENT_SCN, SQL_CURRENT_SCN_VDB, as_of_scn, project,
+        SQL_ENTRADA_PRODUTOS_ALVO, SQL_DEVOLUCOES_ENXUTA, in_batches, sargable,
+        STAGED_QUERIES, SQL_STAGE_CHECK, SQL_STAGE_CLEAR, SQL_STAGE_VENDAS, SQL_STAGE_DEVOLUCOES,
+        DAY_QUERY_PARTS, watermark_delta, order_columns, SQL_WATERMARK, without_scn
     )
+    from aurora_iqvia.cache import ExtractionCache
+    from aurora_iqvia.entries import EntryIndex
+    from aurora_iqvia.intraday import IntradayState, DELTA_QUERIES
+    from aurora_iqvia.split import deadline_fetch
+    from aurora_iqvia.throttle import Throttle
+    from aurora_iqvia.ledger import StockLedger
+    from aurora_iqvia.manifest import RunManifest, fingerprint_hash, config_hash
+    from aurora_iqvia.profiling import StageProfiler, stage
+    from aurora_iqvia.querystats import QueryStats
     from aurora_iqvia.utils import only_digits, md5_bytes, beautify_json, daterange
     from aurora_iqvia.iqvia_api import get_token, upload_zip
     from aurora_iqvia.validator import validate_payload, load_spec
@@ -34,7 +60,7 @@ except ImportError:
 # --------------------------
 # Controle de versão do layout
 # --------------------------
-LAYOUT_VERSION = "1.0.3"
+LAYOUT_VERSION = "1.0.4"
 
 def get_layout_version():
     """Retorna a versão atual do layout"""
@@ -43,6 +69,7 @@ def get_layout_version():
 def get_layout_changes():
     """Retorna histórico de mudanças no layout"""
     return {
+        "1.0.4": "Preço de entrada dos produtos passa a ser o PUNIT da nota (antes PTABELA), da entrada mais recente do produto.",
         "1.0.3": "Correção na estrutura de preços e brindes. Adicionado tratamento de descontos para brindes com preço de tabela exibido.",
         "1.0.2": "Adicionado campo tipoCaptacaoPrescricao nos estabelecimentos. Corrigido problema de 611 produtos faltantes no estoque.",
         "1.0.1": "Corrigido formato de série fiscal para STRING. Adicionada validação de layout.",
@@ -205,26 +232,34 @@ def build_payload(
     Returns:
         Dicionário com o payload completo no formato IQVIA
     """
+    # colunas no tipo final (NULL = padrão tipado, DTSAIDA já em texto): os laços só montam os dicionários.
+    # Frames vindos do fetch_df/cache já chegam tipados e passam direto.
+    mov = apply_types(mov, QUERY_TYPES["SQL_MOV"])
+    dev = apply_types(dev, QUERY_TYPES["SQL_DEVOLUCOES"])
+    fil = apply_types(fil, QUERY_TYPES["SQL_FILIAL"])
+    cli = apply_types(cli, QUERY_TYPES["SQL_CLIENTES"])
+    est = apply_types(est, QUERY_TYPES["SQL_ESTOQUE"])
+    produtos_unicos = apply_types(produtos_unicos, QUERY_TYPES["SQL_PRODUTOS_UNICOS"])
 
     # -------- Estabelecimentos --------
     logger("...dados das filiais")
     estabs: List[Dict[str, Any]] = []
     for r in fil.itertuples(index=False):
-        tel_fil = format_telefone(getattr(r, "TELEFONE", "") or "")
+        tel_fil = format_telefone(r.TELEFONE)
         estabs.append({
-            "cod": validate_field_length(str(r.CODFILIAL), 14),
-            "doc": format_cnpj(getattr(r, "CGC", "") or ""),
-            "nome": validate_field_length(getattr(r, "RAZAOSOCIAL", "") or "", 40),
-            "nomeOfc": validate_field_length(getattr(r, "FANTASIA_FILIAL", "") or "", 40),
+            "cod": validate_field_length(r.CODFILIAL, 14),
+            "doc": format_cnpj(r.CGC),
+            "nome": validate_field_length(r.RAZAOSOCIAL, 40),
+            "nomeOfc": validate_field_length(r.FANTASIA_FILIAL, 40),
             "tipo": "CD",
             # Cosméticos: sem captação de prescrição
             "tipoCaptacaoPrescricao": 0,
             "ender": {
-                "descr": validate_field_length(getattr(r, "ENDERECOFILIAL", "") or "", 70),
+                "descr": validate_field_length(r.ENDERECOFILIAL, 70),
                 "compl": "",  # ✅ CORRIGIDO: campo oficial, removido "num"
-                "cep": format_cep(getattr(r, "CEP", "") or ""),
-                "cidade": validate_field_length(getattr(r, "CIDADE", "") or "", 40) if hasattr(r, "CIDADE") else validate_field_length(getattr(r, "MUNICIPIO", "") or "", 40),
-                "uf": validate_field_length(getattr(r, "UF", "") or "", 2),
+                "cep": format_cep(r.CEP),
+                "cidade": validate_field_length(r.CIDADE, 40),
+                "uf": validate_field_length(r.UF, 2),
                 "tel": tel_fil,  # exigido pelo layout
             },
             "codIqvia": validate_field_length(str(codiqvia), 10)
@@ -234,27 +269,27 @@ def build_payload(
     logger("...dados dos clientes")
     clientes: List[Dict[str, Any]] = []
     for r in cli.itertuples(index=False):
-        doc_raw = getattr(r, "CGCENT", "") or ""
+        doc_raw = r.CGCENT
         digits = only_digits(doc_raw)
         doc_fmt = format_cnpj(doc_raw) if len(digits) >= 12 else format_cpf(doc_raw)
-        tel_cli = format_telefone(getattr(r, "TELENT", "") or "")
+        tel_cli = format_telefone(r.TELENT)
         # Cosméticos: não atuam com prof. saúde/prescrição
         tipo_cli = 2 if len(digits) == 14 else 1
         prof_saude = 0
 
         clientes.append({
-            "cod": validate_field_length(str(getattr(r, "CODCLI", 0) or 0), 14),
+            "cod": validate_field_length(r.CODCLI or "0", 14),
             "doc": doc_fmt,
-            "nome": validate_field_length(getattr(r, "CLIENTE", "") or "", 40),
-            "nomeOfc": validate_field_length(getattr(r, "FANTASIA_CLIENT", "") or "", 40),
-            "tipo": int(tipo_cli),
-            "profSaude": int(prof_saude),
+            "nome": validate_field_length(r.CLIENTE, 40),
+            "nomeOfc": validate_field_length(r.FANTASIA_CLIENT, 40),
+            "tipo": tipo_cli,
+            "profSaude": prof_saude,
             "ender": {
-                "descr": validate_field_length(getattr(r, "ENDERECOCLI", "") or "", 70),
+                "descr": validate_field_length(r.ENDERECOCLI, 70),
                 "compl": "",  # ✅ CORRIGIDO: campo oficial
-                "cep": format_cep(getattr(r, "CEPENT", "") or ""),
-                "cidade": validate_field_length(getattr(r, "MUNICENT", "") or "", 40),
-                "uf": validate_field_length(getattr(r, "ESTENT", "") or "", 2),
+                "cep": format_cep(r.CEPENT),
+                "cidade": validate_field_length(r.MUNICENT, 40),
+                "uf": validate_field_length(r.ESTENT, 2),
                 "tel": tel_cli,  # exigido pelo layout
             }
         })
@@ -264,10 +299,10 @@ def build_payload(
     dados_entrada = dados_entrada or {}
     produtos: List[Dict[str, Any]] = []
     for r in produtos_unicos.itertuples(index=False):
-        ean_final = getattr(r, "CODAUXILIAR", "") or ""
-        preco_final = round(float(getattr(r, "PTABELA", 0.0) or 0.0), 2)
+        ean_final = r.CODAUXILIAR
+        preco_final = r.PTABELA
 
-        if getattr(r, "CODPROD", None) in dados_entrada:
+        if r.CODPROD in dados_entrada:
             entrada = dados_entrada[r.CODPROD]
             if not ean_final and entrada.get('ean'):
                 ean_final = str(entrada['ean'])
@@ -279,9 +314,9 @@ def build_payload(
                 "cod": validate_field_length(str(r.CODPROD), 13),
                 "eanSellIn": validate_field_length(str(ean_final), 14),
                 "eanSellOut": validate_field_length(str(ean_final), 14),
-                "ncm": validate_field_length(str(getattr(r, "NBM", "") or ""), 8),
-                "apresent": validate_field_length(getattr(r, "DESCRICAO", "") or "", 70),
-                "fabr": validate_field_length(getattr(r, "FORNECEDOR", "") or "", 40),
+                "ncm": validate_field_length(r.NBM, 8),
+                "apresent": validate_field_length(r.DESCRICAO, 70),
+                "fabr": validate_field_length(r.FORNECEDOR, 40),
                 "precoFabrica": round(preco_final, 2),
                 # Cosméticos: não se aplica (strings conforme validador)
                 "dispViaFarmaciaPopular": "0",
@@ -293,32 +328,31 @@ def build_payload(
     logger("...dados de vendas")
     vendas: List[Dict[str, Any]] = []
     for r in mov.itertuples(index=False):
-        dt_s = r.DTSAIDA.strftime("%Y-%m-%d") if hasattr(r, "DTSAIDA") and hasattr(r.DTSAIDA, "strftime") else str(getattr(r, "DTSAIDA", ""))[:10]
-        vl_unit = round(float(getattr(r, "PUNIT", 0.0) or 0.0), 2)
+        vl_unit = r.PUNIT
 
-        eh_brinde = (vl_unit == 0.0) or (getattr(r, "BRINDE", "N") == "S")
+        eh_brinde = (vl_unit == 0.0) or (r.BRINDE == "S")
         preco_para_json = vl_unit
         if eh_brinde and vl_unit == 0.0:
-            preco_para_json = round(float(getattr(r, "PTABELA", 0.0) or 0.0), 2)
+            preco_para_json = r.PTABELA
 
         # ✅ Campos extras corrigidos
-        doc_tipo = 2 if (getattr(r, "CHAVENFE", None) not in (None, "", 0)) else 0
-        doc_serie = str(int(getattr(r, "SERIE", 0) or 0))  # ✅ CORRIGIDO: STRING
-        doc_num = int(getattr(r, "NUMNOTA", 0) or 0)
-        danfe = str(getattr(r, "CHAVENFE", "") or "")
+        danfe = r.CHAVENFE
+        doc_tipo = 2 if danfe else 0
+        doc_serie = r.SERIE  # ✅ CORRIGIDO: STRING (apply_types)
+        doc_num = r.NUMNOTA
         venda_judic = 0
         tipo_pagto = 0
 
         venda = {
-            "codEstab": validate_field_length(str(r.CODFILIAL), 14),
-            "codCliente": validate_field_length(str(r.CODCLI), 14),
+            "codEstab": validate_field_length(r.CODFILIAL, 14),
+            "codCliente": validate_field_length(r.CODCLI, 14),
             # Cosméticos: sem prescrição / prof. saúde
             "comPrescricao": 0,
             "paraUsoProfSaude": 0,
             "codProfSaude": "0",
             "codProd": validate_field_length(str(r.CODPROD), 13),
-            "dt": dt_s,
-            "qt": int(getattr(r, "QT", 0) or 0),
+            "dt": r.DTSAIDA,
+            "qt": r.QT,
             "ecommerce": 0,
             "meio": 5,  # 5 = Balcão (ajuste se necessário)
             # ✅ Campos de documento corrigidos:
@@ -336,9 +370,9 @@ def build_payload(
                 },
                 "icms": {                    # ✅ DENTRO DE preco - estava fora
                     "isento": 0,
-                    "aliq": round(float(getattr(r, "PERCICM", 0.0) or 0.0), 2),
-                    "valor": round(float(getattr(r, "VLICMS", 0.0) or 0.0), 2),
-                    "cst": str(getattr(r, "SITTRIBUT", "60") or "60"),
+                    "aliq": r.PERCICM,
+                    "valor": r.VLICMS,
+                    "cst": r.SITTRIBUT or "60",
                     "subsTrib": {"valor": 0, "embutidoPreco": 0, "cest": "0"}
                 }
             }
@@ -358,34 +392,34 @@ def build_payload(
     logger("...dados de devoluções/cancelamentos")
     vendas_devolucoes: List[Dict[str, Any]] = []
     for r in dev.itertuples(index=False):
-        dt_s = r.DTSAIDA.strftime("%Y-%m-%d") if hasattr(r, "DTSAIDA") and hasattr(r.DTSAIDA, "strftime") else str(getattr(r, "DTSAIDA", ""))[:10]
         vendas_devolucoes.append({
-            "codEstab": validate_field_length(str(r.CODFILIAL), 14),
-            "codCliente": validate_field_length(str(r.CODCLI), 14),
+            "codEstab": validate_field_length(r.CODFILIAL, 14),
+            "codCliente": validate_field_length(r.CODCLI, 14),
             "codProfSaude": "0",
             "codProd": validate_field_length(str(r.CODPROD), 13),
             "comPrescricao": 0,
             "ecommerce": 0,
-            "dt": dt_s,
-            "qt": int(getattr(r, "QT", 0) or 0)  # POSITIVA
+            "dt": r.DTSAIDA,
+            "qt": r.QT  # POSITIVA
         })
 
     # -------- Estoque --------
     logger("...dados de estoque")
     estoque: List[Dict[str, Any]] = []
+    dt_arquivo = data_arquivo.strftime("%Y-%m-%d")
     for r in est.itertuples(index=False):
-        ean_estoque = getattr(r, "CODAUXILIAR", "") or ""
-        if not ean_estoque and hasattr(r, 'CODPROD') and r.CODPROD in (dados_entrada or {}):
+        ean_estoque = r.CODAUXILIAR
+        if not ean_estoque and r.CODPROD in dados_entrada:
             entrada_data = dados_entrada[r.CODPROD]
             if entrada_data.get('ean'):
                 ean_estoque = str(entrada_data['ean'])
 
         if ean_estoque:
             estoque.append({
-                "codEstab": validate_field_length(str(r.CODFILIAL), 14),
+                "codEstab": validate_field_length(r.CODFILIAL, 14),
                 "codProd": validate_field_length(str(r.CODPROD), 13),
-                "dt": data_arquivo.strftime("%Y-%m-%d"),
-                "qt": int(getattr(r, "ESTOQUEATUAL", 0) or 0)
+                "dt": dt_arquivo,
+                "qt": r.ESTOQUEATUAL
             })
 
     # ✅ PAYLOAD COMPLETO COM SEÇÕES OBRIGATÓRIAS MÍNIMAS
@@ -409,9 +443,419 @@ def build_payload(
     }
     return payload
 
+# --------------------------
+# Extração do dia (com cache)
+# --------------------------
+# (chave no dicionário de frames, nome da query, mensagem de log)
+DAY_QUERIES = [
+    ("mov", "SQL_MOV", "📄 Consultando movimentação de faturamento"),
+    ("dev", "SQL_DEVOLUCOES", "📄 Consultando devoluções"),
+    ("fil", "SQL_FILIAL", "🏢 Consultando filiais"),
+    ("cli", "SQL_CLIENTES", "👥 Consultando clientes"),
+    ("est", "SQL_ESTOQUE", "📦 Consultando estoque"),
+    ("produtos_unicos", "SQL_PRODUTOS_UNICOS", "📥 Consultando dados de entrada para produtos sem EAN/preço"),
+    ("entradas", "SQL_ENTRADA_PRODUTOS", None),
+]
+
+# Colunas que o build_payload lê das consultas de vendas/devoluções (as de QUERY_TYPES). Os dados de
+# filial, cliente e produto não vão em cada linha: vêm uma vez só de SQL_FILIAL, SQL_CLIENTES e SQL_PRODUTOS_UNICOS.
+PAYLOAD_COLUMNS = {
+    "SQL_MOV": tuple(QUERY_TYPES["SQL_MOV"]),
+    "SQL_DEVOLUCOES": tuple(QUERY_TYPES["SQL_DEVOLUCOES"]),
+}
+
+def use_sargable(cfg: AppConfig, name: str) -> bool:
+    """
+    Se a consulta usa os predicados de data sargable (cfg.sargable_queries: nomes separados por vírgula ou "all").
+    
+    Args:
+        cfg: Configuração da aplicação
+        name: Nome da consulta (ex.: SQL_MOV, SQL_FINGERPRINT)
+        
+    Returns:
+        True para reescrever `TRUNC(coluna) = :DIA` (sql_prisma.sargable)
+    """
+    names = {n.strip().upper() for n in str(getattr(cfg, "sargable_queries", "") or "").split(",") if n.strip()}
+    return "ALL" in names or name.upper() in names
+
+def day_query(name: str, cfg: AppConfig, staged: bool = False, delta: bool = False) -> str:
+    """
+    SQL de uma consulta do dia: a variante enxuta das devoluções (cfg.lean_devolucoes), o SELECT
+    reduzido às colunas de PAYLOAD_COLUMNS quando habilitado e os predicados de data sargable quando a
+    consulta estiver em cfg.sargable_queries.
+    
+    Args:
+        name: Nome da consulta (ex.: SQL_MOV)
+        cfg: Configuração da aplicação
+        staged: Usa a variante que lê as chaves do dia de GDDI_DIA_ITENS (STAGED_QUERIES), se houver
+        delta: Só as notas entre duas marcas d'água (watermark_delta), com as expressões do ORDER BY como
+               colunas ORDEM_* (order_columns), mantidas na projeção
+        
+    Returns:
+        Texto da consulta
+    """
+    sql = QUERIES[name] if name in QUERIES else DAY_QUERY_PARTS[name]
+    if staged and name in STAGED_QUERIES:
+        sql = STAGED_QUERIES[name]
+    elif name == "SQL_DEVOLUCOES" and getattr(cfg, "lean_devolucoes", False):
+        sql = SQL_DEVOLUCOES_ENXUTA
+    order: tuple = ()
+    if delta:
+        # o modo incremental reordena o acumulado pelo ORDER BY da consulta
+        sql, order = order_columns(watermark_delta(sql))
+    if name in PAYLOAD_COLUMNS and getattr(cfg, "project_columns", False):
+        sql = project(sql, PAYLOAD_COLUMNS[name] + order)
+    if use_sargable(cfg, name):
+        sql = sargable(sql)
+    return sql
+
+def staging_available(conn) -> bool:
+    """
+    Se a tabela temporária das chaves do dia (GDDI_DIA_ITENS) existe e pode ser lida pela sessão.
+    
+    Args:
+        conn: Conexão com o banco de dados
+        
+    Returns:
+        True se o SQL_STAGE_CHECK rodou sem erro
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(SQL_STAGE_CHECK)
+        cur.fetchall()
+        return True
+    except Exception:
+        return False
+    finally:
+        cur.close()
+
+def stage_day_keys(conn, cfg: AppConfig, dia: date, stats=None, scn: Optional[int]=None) -> Dict[str, int]:
+    """
+    Grava em GDDI_DIA_ITENS as chaves dos itens de venda e de devolução do dia (filtros aplicados uma vez só);
+    as consultas *_STG da mesma sessão leem dela em vez de repetir as junções e os filtros.
+    
+    Args:
+        conn: Conexão com o banco de dados (a tabela é privada da sessão: as consultas *_STG rodam nela)
+        cfg: Configuração da aplicação
+        dia: Dia de referência
+        stats: QueryStats para instrumentar os INSERTs (opcional)
+        scn: Lê as tabelas do PRISMA AS OF SCN, se informado
+        
+    Returns:
+        {SQL_STAGE_VENDAS: itens, SQL_STAGE_DEVOLUCOES: itens}
+    """
+    counts: Dict[str, int] = {}
+    cur = conn.cursor()
+    try:
+        cur.execute(SQL_STAGE_CLEAR)
+        for name, sql in (("SQL_STAGE_VENDAS", SQL_STAGE_VENDAS), ("SQL_STAGE_DEVOLUCOES", SQL_STAGE_DEVOLUCOES)):
+            if use_sargable(cfg, name):
+                sql = sargable(sql)
+            if scn:
+                sql = as_of_scn(sql)
+            binds = {k: v for k, v in {"DIA": dia, "CODFILIAL": cfg.codfilial, "SCN": scn}.items()
+                     if re.search(rf":{k}\b", sql)}
+            throttle = getattr(stats, "throttle", None)
+            with (throttle.slot(name) if throttle is not None else nullcontext()):
+                before = stats.snapshot(conn) if stats is not None else None
+                t0 = time.perf_counter()
+                cur.execute(sql, binds)
+                counts[name] = max(cur.rowcount or 0, 0)
+                if stats is not None:
+                    stats.record(conn, name, before, time.perf_counter() - t0, 0.0, counts[name], binds)
+        conn.commit()
+    finally:
+        cur.close()
+    return counts
+
+def open_cache(cfg: AppConfig):
+    """
+    Abre o cache de extração configurado.
+    
+    Args:
+        cfg: Configuração da aplicação
+        
+    Returns:
+        ExtractionCache ou None se o cache estiver desabilitado
+    """
+    if not getattr(cfg, "cache_enabled", False):
+        return None
+    return ExtractionCache(Path(cfg.out_dir), ttl_hours=cfg.cache_ttl_hours, max_mb=cfg.cache_max_mb)
+
+def extract_day(conn, cfg: AppConfig, dia: date, logger: Callable[[str], None],
+                cache=None, refresh: bool=False, stats=None, pool=None, sessions: int=1,
+                scn: Optional[int]=None, entries=None, ledger=None, staged: bool=False,
+                intraday=None) -> Dict[str, Any]:
+    """
+    Executa as queries do dia, lendo/gravando no cache de extração quando habilitado.
+    
+    Args:
+        conn: Conexão com o banco de dados
+        cfg: Configuração da aplicação
+        dia: Dia de referência
+        logger: Função para log
+        cache: ExtractionCache (opcional)
+        refresh: Ignora o conteúdo do cache e consulta novamente o Oracle
+        stats: QueryStats para instrumentar as consultas (opcional)
+        pool: Pool de sessões para rodar as consultas do dia ao mesmo tempo (opcional)
+        sessions: Sessões simultâneas no dia, contando a própria conn (1 = uma consulta por vez)
+        scn: Lê todas as consultas AS OF SCN (leitura consistente), se informado
+        entries: EntryIndex já atualizado; as entradas do dia saem dele, sem o SQL_ENTRADA_PRODUTOS.
+                 Sem ele e com cfg.entry_lookup = "targeted", as entradas são lidas depois das outras
+                 consultas, só para os produtos sem EAN/preço (SQL_ENTRADA_PRODUTOS_ALVO)
+        ledger: StockLedger já carregado; o estoque do dia sai dele, sem o SQL_ESTOQUE, depois de
+                conferido numa amostra contra o PKG_ESTOQUE (com divergência, roda o SQL_ESTOQUE no dia
+                e nos seguintes)
+        staged: Grava as chaves do dia em GDDI_DIA_ITENS (stage_day_keys) e roda as consultas de
+                STAGED_QUERIES na própria conn, lendo delas
+        intraday: IntradayState do dia; vendas, devoluções, clientes e os produtos das vendas/devoluções
+                  saem do acumulado + notas novas desde a marca d'água (os produtos com estoque são relidos)
+        
+    Returns:
+        Dicionário {mov, dev, fil, cli, est, produtos_unicos, entradas} com os DataFrames
+    """
+    if cache is not None and refresh:
+        cache.invalidate(cfg.codfilial, dia)
+
+    frames: Dict[str, Any] = {}
+    pending = []
+    targeted = entries is None and getattr(cfg, "entry_lookup", "scan") == "targeted"
+    if ledger is not None and not ledger.active:
+        ledger = None
+    for key, name, msg in DAY_QUERIES:
+        if key == "entradas" and entries is not None:
+            frames[key] = entries.frame(dia)
+            continue
+        if key == "entradas" and targeted:
+            continue
+        if key == "est" and ledger is not None:
+            frames[key] = ledger.frame(dia)
+            continue
+        if intraday is not None and any(name == n for _, n in DELTA_QUERIES):
+            continue
+        if key == "produtos_unicos" and intraday is not None:
+            key, name = "produtos_est", "SQL_PRODUTOS_ESTOQUE"
+        sql = day_query(name, cfg, staged)
+        if scn:
+            sql = as_of_scn(sql)
+        # chave sem o AS OF SCN: a prévia, o Processar e a leitura sem SCN reaproveitam o mesmo cache
+        df = cache.get(name, cfg.codfilial, dia, without_scn(sql)) if cache is not None else None
+        if df is not None:
+            logger(f"🗃️ {name}: {len(df)} linha(s) do cache")
+            frames[key] = df
+        else:
+            if msg:
+                logger(msg)
+            pending.append((key, name, sql))
+
+    def fetch_one(session, name, sql, **extra):
+        return fetch_df(session, sql, query_name=name, stats=stats, backend=getattr(cfg, "fetch_backend", "rows"),
+                        arraysize=getattr(cfg, "fetch_arraysize", None), types=QUERY_TYPES.get(name), DIA=dia, CODFILIAL=cfg.codfilial, SCN=scn,
+                        **extra)
+
+    timeout_ms = int(float(getattr(cfg, "query_timeout_s", 0) or 0) * 1000)
+
+    def fetch(session, name, sql, **extra):
+        # consultas pesadas com prazo (call_timeout): estourado, refaz em janelas de horário/faixas de CODPROD
+        return deadline_fetch(fetch_one, session, name, sql, dia, timeout_ms, getattr(cfg, "split_parts", 4),
+                              logger, **extra)
+
+    if staged and any(name in STAGED_QUERIES for _, name, _ in pending):
+        try:
+            counts = stage_day_keys(conn, cfg, dia, stats=stats, scn=scn)
+            logger(f"🧺 Chaves do dia em GDDI_DIA_ITENS: {counts['SQL_STAGE_VENDAS']} item(ns) de venda e "
+                   f"{counts['SQL_STAGE_DEVOLUCOES']} de devolução")
+        except Exception as e:
+            logger(f"⚠️ Falha ao gravar as chaves do dia em GDDI_DIA_ITENS ({e}); consultas completas no dia")
+            staged = False
+            pending = [(key, name, (as_of_scn(day_query(name, cfg)) if scn else day_query(name, cfg))
+                        if name in STAGED_QUERIES else sql) for key, name, sql in pending]
+    # GDDI_DIA_ITENS só tem dados na conn: as consultas que leem dela rodam ali, em sequência
+    own = [p for p in pending if staged and p[1] in STAGED_QUERIES]
+    rest = [p for p in pending if p not in own]
+
+    if pool is not None and sessions > 1 and len(pending) > 1:
+        # as consultas do dia são independentes: uma sessão por consulta, junta tudo antes do payload
+        n_extra = min(sessions - 1, len(rest)) if own else min(sessions, len(pending)) - 1
+        extra = [pool.acquire() for _ in range(n_extra)]
+        if own and not extra:
+            own, rest = own + rest, []
+        free: "queue.Queue" = queue.Queue()
+        for session in ([] if own else [conn]) + extra:
+            free.put(session)
+
+        def run(name, sql):
+            session = free.get()
+            try:
+                return fetch(session, name, sql)
+            finally:
+                free.put(session)
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(extra) + 1, thread_name_prefix="gddi-sql") as ex:
+                chain = ex.submit(lambda: {key: fetch(conn, name, sql) for key, name, sql in own}) if own else None
+                futures = {key: ex.submit(run, name, sql) for key, name, sql in rest}
+                for key, name, sql in rest:
+                    frames[key] = futures[key].result()
+                if chain is not None:
+                    frames.update(chain.result())
+        finally:
+            for session in extra:
+                pool.release(session)
+    else:
+        for key, name, sql in pending:
+            frames[key] = fetch(conn, name, sql)
+
+    if intraday is not None:
+        queries = {name: day_query(name, cfg, delta=True) for _, name in DELTA_QUERIES}
+        acc = intraday.extract(lambda name, sql, **binds: fetch(conn, name, sql, **binds),
+                               {name: as_of_scn(sql) if scn else sql for name, sql in queries.items()},
+                               refresh=refresh, logger=logger,
+                               watermark_sql=as_of_scn(SQL_WATERMARK) if scn else SQL_WATERMARK)
+        frames.update(mov=acc["mov"], dev=acc["dev"], cli=acc["cli"])
+        frames["produtos_unicos"] = merge_products(frames["produtos_est"], acc["produtos_mov"])
+
+    if ledger is not None:
+        check = ledger.reconcile(lambda sql, **binds: fetch(conn, "SQL_ESTOQUE_AMOSTRA", as_of_scn(sql) if scn else sql,
+                                                           **binds), dia, logger)
+        if check["diff"]:
+            sql = day_query("SQL_ESTOQUE", cfg)
+            sql = as_of_scn(sql) if scn else sql
+            frames["est"] = fetch(conn, "SQL_ESTOQUE", sql)
+            pending.append(("est", "SQL_ESTOQUE", sql))
+
+    if cache is not None:
+        for key, name, sql in pending:
+            cache.put(name, cfg.codfilial, dia, without_scn(sql), frames[key])
+
+    if targeted:
+        # 2ª fase: só os produtos que o build_payload vai completar com a entrada
+        import pandas as pd
+        ids = missing_entry_products(frames["produtos_unicos"], frames["est"])
+        parts = []
+        for codprods, binds in in_batches(ids):
+            sql = SQL_ENTRADA_PRODUTOS_ALVO.replace("{CODPRODS}", codprods)
+            parts.append(fetch(conn, "SQL_ENTRADA_PRODUTOS_ALVO", as_of_scn(sql) if scn else sql, **binds))
+        frames["entradas"] = (pd.concat(parts, ignore_index=True) if parts else
+                              pd.DataFrame(columns=["CODPROD", "CODAUXILIAR", "PUNIT", "DTENT", "RN"]))
+        logger(f"🎯 Entradas: {len(ids)} produto(s) sem EAN/preço, {len(frames['entradas'])} encontrado(s) "
+               f"em {len(parts)} consulta(s)")
+    return {key: frames[key] for key, _, _ in DAY_QUERIES}
+
+def merge_products(com_estoque, movimentados):
+    """
+    SQL_PRODUTOS_UNICOS a partir das duas partes (SQL_PRODUTOS_ESTOQUE e SQL_PRODUTOS_MOVIMENTO):
+    união sem repetição, por CODPROD.
+    
+    Args:
+        com_estoque: Produtos com estoque no dia
+        movimentados: Produtos das vendas/devoluções do dia
+        
+    Returns:
+        DataFrame com as colunas do SQL_PRODUTOS_UNICOS
+    """
+    import pandas as pd
+    if not len(movimentados):
+        return com_estoque
+    df = pd.concat([com_estoque, movimentados[list(com_estoque.columns)]], ignore_index=True)
+    return df.drop_duplicates().sort_values("CODPROD", kind="stable").reset_index(drop=True)
+
+def missing_entry_products(produtos_unicos, est) -> List[int]:
+    """
+    CODPRODs que o build_payload completa com a última entrada: sem EAN ou sem preço (produtos)
+    e sem EAN (estoque).
+    
+    Args:
+        produtos_unicos: DataFrame de SQL_PRODUTOS_UNICOS
+        est: DataFrame de SQL_ESTOQUE
+        
+    Returns:
+        Lista ordenada de CODPROD
+    """
+    pu = apply_types(produtos_unicos, QUERY_TYPES["SQL_PRODUTOS_UNICOS"])
+    es = apply_types(est, QUERY_TYPES["SQL_ESTOQUE"])
+    ids = set(pu.loc[(pu["CODAUXILIAR"] == "") | (pu["PTABELA"] == 0.0), "CODPROD"].tolist())
+    ids.update(es.loc[es["CODAUXILIAR"] == "", "CODPROD"].tolist())
+    return sorted(int(x) for x in ids)
+
+def build_dados_entrada(entradas) -> Dict[int, Dict[str, Any]]:
+    """
+    Monta o dicionário CODPROD -> {ean, preco} a partir das notas de entrada.
+    
+    Args:
+        entradas: DataFrame retornado por SQL_ENTRADA_PRODUTOS
+        
+    Returns:
+        Dicionário com dados complementares de entrada por produto
+    """
+    dados_entrada = {}
+    for r in entradas.itertuples(index=False):
+        codprod = int(getattr(r, "CODPROD"))
+        if codprod in dados_entrada:
+            continue    # linhas em DTENT decrescente: vale a entrada mais recente (RN = 1)
+        dados_entrada[codprod] = {
+            "ean": getattr(r, "CODAUXILIAR", "") or "",
+            "preco": float(getattr(r, "PUNIT", 0.0) or 0.0)
+        }
+    return dados_entrada
+
+def source_fingerprint(conn, cfg: AppConfig, dia: date, stats=None, scn: Optional[int]=None) -> Dict[str, Any]:
+    """
+    Lê os agregados baratos de origem do dia (SQL_FINGERPRINT).
+    
+    Args:
+        conn: Conexão com o banco de dados
+        cfg: Configuração da aplicação
+        dia: Dia de referência
+        stats: QueryStats para instrumentar a consulta (opcional)
+        scn: Lê os agregados AS OF SCN, se informado
+        
+    Returns:
+        Dicionário {coluna: valor} com os agregados
+    """
+    sql = sargable(SQL_FINGERPRINT) if use_sargable(cfg, "SQL_FINGERPRINT") else SQL_FINGERPRINT
+    sql = as_of_scn(sql) if scn else sql
+    df = fetch_df(conn, sql, query_name="SQL_FINGERPRINT", stats=stats, DIA=dia, CODFILIAL=cfg.codfilial, SCN=scn)
+    if df.empty:
+        return {}
+    return {str(k): (v.item() if hasattr(v, "item") else v) for k, v in df.iloc[0].to_dict().items()}
+
+def current_scn(conn) -> Optional[int]:
+    """
+    SCN atual do banco (DBMS_FLASHBACK ou V$DATABASE).
+    
+    Returns:
+        SCN ou None se o usuário não tiver acesso a nenhum dos dois
+    """
+    for sql in (SQL_CURRENT_SCN, SQL_CURRENT_SCN_VDB):
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute(sql)
+                row = cur.fetchone()
+            finally:
+                cur.close()
+            if row and row[0]:
+                return int(row[0])
+        except Exception:
+            continue
+    return None
+
+# leitura AS OF SCN recusada: snapshot expirado (ORA-01555), SCN fora do alcance do flashback
+# (ORA-08180/ORA-08181) ou sem privilégio de FLASHBACK na tabela (ORA-01031)
+_RE_FLASHBACK = re.compile(r"ORA-01555|ORA-08180|ORA-08181|ORA-01031")
+
+def is_flashback_error(e: BaseException) -> bool:
+    """Se o erro é da leitura AS OF SCN em si (repetir sem SCN resolve); os demais são relançados."""
+    return bool(_RE_FLASHBACK.search(str(e)))
+
 # --------------------------
 # Funções modificadas para processamento diário
 # --------------------------
+def output_stem(client_id: str, dia: date) -> str:
+    """Nome-base dos arquivos do dia (sem extensão): U_<CLIENTE>_<YYYYMMDD>"""
+    return f"U_{client_id.upper()}_{dia.strftime('%Y%m%d')}"
+
 def save_json(payload: Dict[str, Any], client_id: str, dia: date, out_dir: Path) -> Path:
     """
     Salva payload como arquivo JSON.
@@ -425,9 +869,12 @@ def save_json(payload: Dict[str, Any], client_id: str, dia: date, out_dir: Path)
     Returns:
         Path do arquivo salvo
     """
-    name = f"U_{client_id.upper()}_{dia.strftime('%Y%m%d')}.json"
+    name = output_stem(client_id, dia) + ".json"
     fp = out_dir / name
-    fp.write_text(beautify_json(payload), encoding="utf-8")
+    # grava em temporário e renomeia: o nome final só existe com o arquivo completo
+    tmp = fp.with_name(fp.name + ".tmp")
+    tmp.write_text(beautify_json(payload), encoding="utf-8")
+    os.replace(tmp, fp)
     return fp
 
 def create_daily_zip(json_path: Path, client_id: str, out_dir: Path) -> tuple[Path, str]:
@@ -450,8 +897,9 @@ def create_daily_zip(json_path: Path, client_id: str, out_dir: Path) -> tuple[Pa
     with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as z:
         z.write(json_path, arcname=json_path.name)
     
-    buf.seek(0)
-    zip_path.write_bytes(buf.getvalue())
+    tmp = zip_path.with_name(zip_path.name + ".tmp")
+    tmp.write_bytes(buf.getvalue())
+    os.replace(tmp, zip_path)
     return zip_path, md5_bytes(buf.getvalue())
 
 def save_upload_history(guid: str, status: Dict[str, Any], zip_path: Path, dia: date, out_dir: Path):
@@ -494,10 +942,104 @@ def save_upload_history(guid: str, status: Dict[str, Any], zip_path: Path, dia:
     except Exception as e:
         print(f"⚠️ Erro ao salvar histórico: {str(e)}")
 
-def run_period(cfg: AppConfig, d0, d1, upload: bool, logger, validate: bool=False, example_layout: str=""):
+def _upload_day(cfg: AppConfig, token: str, zip_path: Path, dia: date, out_dir: Path,
+                day_info: Dict[str, Any], summary: Dict[str, Any], manifest, logger):
+    """Envia o ZIP de um dia e registra o resultado no resumo e no manifesto."""
+    logger("📤 Enviando arquivo...")
+    try:
+        resp = upload_zip(cfg.iqvia_upload_url, zip_path, token, logger=logger)
+        if 'guid' in resp:
+            logger(f"✅ Envio concluído: {resp['guid']}")
+            save_upload_history(resp['guid'], resp, zip_path, dia, out_dir)
+            day_info["guid"] = resp['guid']
+        else:
+            logger("✅ Envio concluído")
+        day_info["uploaded"] = True
+        summary["uploaded"] += 1
+        manifest.update(cfg.codfilial, dia, guid=day_info.get("guid", ""), uploaded=True)
+    except Exception as e:
+        logger(f"❌ Erro no envio: {str(e)}")
+        logger("⏭️ Continuando processamento...")
+        day_info["uploaded"] = False
+        day_info["upload_error"] = str(e)
+        summary["upload_errors"] += 1
+
+OUTPUT_FORMATS = ("both", "json", "zip")
+
+def frames_mb(frames: Dict[str, Any]) -> float:
+    """Memória ocupada pelos DataFrames extraídos de um dia (MB)."""
+    total = 0
+    for df in frames.values():
+        try:
+            total += int(df.memory_usage(index=True, deep=True).sum())
+        except Exception:
+            pass
+    return total / 1_048_576
+
+def prepare_sources(conn, cfg: AppConfig, d0: date, d1: date, stats=None, refresh: bool=False,
+                    logger: Callable[[str], None]=print, intraday: bool=False) -> Dict[str, Any]:
     """
-    Executa processamento para um período de datas com envio diário.
+    Prepara o que o extract_day recebe além da conexão, igual para o run_period e a prévia da GUI:
+    índice de entradas, estoque por movimentação e tabela temporária das chaves do dia.
     
+    Args:
+        conn: Conexão com o banco de dados
+        cfg: Configuração da aplicação
+        d0: Data inicial
+        d1: Data final
+        stats: QueryStats para instrumentar as consultas (opcional)
+        refresh: Reconstrói o índice de entradas
+        logger: Função para log
+        intraday: Regeração intradiária (não combina com a tabela temporária)
+        
+    Returns:
+        {entries, ledger, staged} (None/False quando desligado ou indisponível)
+    """
+    out_dir = Path(cfg.out_dir)
+    entries = None
+    if getattr(cfg, "entry_lookup", "scan") == "index" and d0 <= d1:
+        # uma consulta pequena por execução (entradas novas) no lugar da varredura de 365 dias a cada dia
+        try:
+            entries = EntryIndex(out_dir, cfg.codfilial)
+            entries.refresh(conn, d0, stats=stats, rebuild=refresh, logger=logger)
+        except Exception as e:
+            logger(f"⚠️ Índice de entradas indisponível ({e}); consultando SQL_ENTRADA_PRODUTOS a cada dia")
+            entries = None
+    ledger = None
+    if getattr(cfg, "stock_mode", "plsql") == "ledger" and d1 > d0:
+        # saldo uma vez só no último dia + movimentações do período, no lugar do PKG_ESTOQUE por produto/dia
+        try:
+            ledger = StockLedger(cfg.codfilial, d0, d1, sample=getattr(cfg, "stock_ledger_sample", 20))
+            # saldo e movimentações no mesmo instante
+            scn = current_scn(conn) if getattr(cfg, "consistent_read", False) else None
+            try:
+                ledger.load(conn, stats=stats, logger=logger, scn=scn)
+            except Exception as e:
+                if scn is None or not is_flashback_error(e):
+                    raise
+                logger(f"⚠️ Leitura AS OF SCN do estoque por movimentação falhou ({e}); lendo sem SCN")
+                ledger.load(conn, stats=stats, logger=logger)
+        except Exception as e:
+            logger(f"⚠️ Estoque por movimentação indisponível ({e}); consultando SQL_ESTOQUE a cada dia")
+            ledger = None
+    staged = False
+    if getattr(cfg, "stage_day_keys", False) and not intraday:
+        # filtros de vendas/devoluções uma vez por dia, gravados na tabela temporária da sessão
+        staged = staging_available(conn)
+        if staged:
+            logger("🧺 Chaves do dia em tabela temporária (GDDI_DIA_ITENS)")
+        else:
+            logger("⚠️ GDDI_DIA_ITENS não encontrada (rode 'python -m aurora_iqvia setup-staging'); "
+                   "consultas completas a cada dia")
+    return {"entries": entries, "ledger": ledger, "staged": staged}
+
+def run_period(cfg: AppConfig, d0, d1, upload: bool, logger, validate: bool=False, example_layout: str="",
+               refresh: bool=False, output_format: str="both", force: bool=False,
+               profile: bool=False, connect: Optional[Callable[[AppConfig], Any]]=None,
+               workers: Optional[int]=None, query_sessions: Optional[int]=None) -> Dict[str, Any]:
+    """
+    Executa processamento para um período de datas com envio diário.
+
     Args:
         cfg: Configuração da aplicação
         d0: Data inicial
@@ -506,13 +1048,99 @@ def run_period(cfg: AppConfig, d0, d1, upload: bool, logger, validate: bool=Fals
         logger: Função para log
         validate: Se deve validar o JSON
         example_layout: Caminho para layout de exemplo
+        refresh: Ignora o cache de extração e consulta novamente o Oracle (e refaz todos os dias)
+        output_format: "both" (JSON + ZIP), "json" (sem ZIP) ou "zip" (remove o JSON após compactar)
+        force: Refaz todos os dias, mesmo os que não mudaram desde a última execução
+        profile: Perfila cada etapa do dia (cProfile + tracemalloc), gravando ao lado da saída
+        connect: Abre a conexão a partir da configuração (padrão: connect_oracle; ex.: standin.connect)
+        workers: Dias gerados em paralelo, cada um com sua sessão do pool (padrão: cfg.parallel_workers).
+                 O log, o manifesto e os envios continuam na ordem das datas.
+        query_sessions: Consultas do dia executadas ao mesmo tempo, cada uma na sua sessão
+                        (padrão: cfg.query_sessions; 1 = uma por vez)
+
+    Returns:
+        Resumo do processamento (contagens e arquivos por dia)
     """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de saída inválido: {output_format}")
+    if upload and output_format == "json":
+        raise ValueError("Upload exige o ZIP diário (formato 'both' ou 'zip').")
+
     out_dir = Path(cfg.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
+    cache = open_cache(cfg)
+    manifest = RunManifest(out_dir)
+    payload_config = config_hash(cfg)
+    throttle = None
+    if getattr(cfg, "throttle_enabled", False):
+        throttle = Throttle(max_sessions=cfg.throttle_max_sessions, max_queries_per_min=cfg.throttle_max_queries_per_min,
+                            slowdown=cfg.throttle_slowdown, max_pause_s=cfg.throttle_max_pause_s,
+                            quiet_hours=cfg.throttle_quiet_hours, out_dir=out_dir, logger=logger)
+    qstats = QueryStats(out_dir, slow_seconds=getattr(cfg, "slow_query_seconds", 0), logger=logger, throttle=throttle)
+    skip_unchanged = bool(getattr(cfg, "skip_unchanged_days", False)) and not (force or refresh)
+
+    days = list(daterange(d0, d1))
+    workers = max(1, min(int(workers or getattr(cfg, "parallel_workers", 1) or 1), len(days) or 1))
+    if profile and workers > 1:
+        # o tracemalloc é global ao processo: etapas simultâneas se misturariam
+        logger("⚠️ Perfilamento ligado: processando um dia por vez.")
+        workers = 1
+    if getattr(cfg, "stock_mode", "plsql") == "ledger" and workers > 1:
+        # o saldo recuado e a desativação na primeira divergência dependem da ordem dos dias
+        logger("⚠️ Estoque pelo PCMOV (ledger): processando um dia por vez.")
+        workers = 1
+    query_sessions = max(1, min(int(query_sessions or getattr(cfg, "query_sessions", 1) or 1), len(DAY_QUERIES)))
+    if throttle is not None and throttle.is_quiet():
+        logger(f"🌙 Controle de carga: horário livre ({cfg.throttle_quiet_hours}h), sem limites; "
+               f"medindo a referência das consultas")
+    elif throttle is not None:
+        # sessões abertas no ERP: primeiro menos consultas simultâneas por dia, depois menos dias em paralelo
+        query_sessions = max(1, min(query_sessions, throttle.max_sessions // workers or 1))
+        workers = max(1, min(workers, throttle.max_sessions // query_sessions))
+        logger(f"🚦 Controle de carga: até {throttle.max_sessions} sessão(ões) no Oracle"
+               + (f", {throttle.max_queries_per_min} consulta(s)/min" if throttle.max_queries_per_min else "")
+               + f", pausa acima de {throttle.slowdown:g}× a referência")
+    worker_max_mb = float(getattr(cfg, "worker_max_mb", 0) or 0)
+    heavy_lock = threading.Lock()
+    # desligado no primeiro erro (sem privilégio de FLASHBACK / undo insuficiente) e seguido sem AS OF SCN
+    consistent = {"on": bool(getattr(cfg, "consistent_read", False))}
+
+    summary: Dict[str, Any] = {
+        "codfilial": cfg.codfilial,
+        "periodo": [d0.strftime("%Y-%m-%d"), d1.strftime("%Y-%m-%d")],
+        "layout_version": LAYOUT_VERSION,
+        "out_dir": str(out_dir),
+        "workers": workers,
+        "query_sessions": query_sessions,
+        "processed": 0,
+        "skipped": 0,
+        "uploaded": 0,
+        "upload_errors": 0,
+        "validation_errors": 0,
+        "days": [],
+    }
 
     logger(f"🔌 Conectando ao Oracle...")
-    conn = connect_oracle(cfg)
+    pool = None
+    if workers > 1 or query_sessions > 1:
+        # cada dia usa no máximo query_sessions sessões: o pool nunca se esgota
+        pool = create_pool(cfg, workers * query_sessions, connect=connect)
+        conn = pool.acquire()
+    else:
+        conn = (connect or connect_oracle)(cfg)
     logger(f"✅ Conectado. DB version: {conn.version}")
+    intraday = bool(getattr(cfg, "intraday_watermark", False))
+    if intraday:
+        logger("💧 Modo incremental: só as notas novas desde a última execução de cada dia (marca d'água)")
+    sources = prepare_sources(conn, cfg, d0, d1, stats=qstats, refresh=refresh, logger=logger, intraday=intraday)
+    entries, ledger, staged = sources["entries"], sources["ledger"], sources["staged"]
+    if pool is not None:
+        pool.release(conn)
+        conn = None
+        if workers > 1:
+            logger(f"🧵 {workers} dias em paralelo (uma sessão do pool por dia)")
+        if query_sessions > 1:
+            logger(f"🧵 Até {query_sessions} consultas simultâneas por dia")
 
     # Obter token uma única vez se upload estiver habilitado
     token = None
@@ -521,102 +1149,262 @@ def run_period(cfg: AppConfig, d0, d1, upload: bool, logger, validate: bool=Fals
         token = get_token(cfg.iqvia_token_url, cfg.iqvia_client_id, cfg.iqvia_client_secret, logger=logger)
         if not token:
             logger("❌ Falha ao obter token; upload será desabilitado para todos os dias.")
+            summary["upload_errors"] += 1
             upload = False
         else:
             logger("✅ Token obtido com sucesso.")
+    summary["upload"] = bool(upload)
 
-    try:
-        processed_count = 0
-        uploaded_count = 0
-        spec = load_spec(example_layout) if validate else None
-
-        for dia in daterange(d0, d1):
-            logger(f"\n📊 Processando dia {dia.strftime('%d/%m/%Y')}")
+    spec = load_spec(example_layout) if validate else None
 
-            logger("📄 Consultando movimentação de faturamento")
-            mov = fetch_df(conn, SQL_MOV, DIA=dia, CODFILIAL=cfg.codfilial)
+    def process_day(conn, dia: date, log: Callable[[str], None]):
+        """Gera o dia (impressão digital, extração, payload, JSON e ZIP). Não grava o manifesto nem envia."""
+        log(f"\n📊 Processando dia {dia.strftime('%d/%m/%Y')}")
+        day_info: Dict[str, Any] = {"date": dia.strftime("%Y-%m-%d")}
+        timings: Dict[str, float] = {}
 
-            logger("📄 Consultando devoluções")
-            dev = fetch_df(conn, SQL_DEVOLUCOES, DIA=dia, CODFILIAL=cfg.codfilial)
+        # Leitura consistente: um SCN por dia, usado pela impressão digital e pelas 7 consultas
+        scn = current_scn(conn) if consistent["on"] else None
+        if consistent["on"] and scn is None:
+            log("⚠️ SCN indisponível (sem acesso a DBMS_FLASHBACK/V$DATABASE); leitura sem AS OF SCN")
+            consistent["on"] = False
+        day_info["scn"] = scn
 
-            logger("🏢 Consultando filiais")
-            fil = fetch_df(conn, SQL_FILIAL, DIA=dia, CODFILIAL=cfg.codfilial)
+        # Impressão digital da origem: pula o dia se nada mudou desde a última geração
+        t = time.perf_counter()
+        try:
+            fp_row = source_fingerprint(conn, cfg, dia, stats=qstats, scn=scn)
+            fp = fingerprint_hash(fp_row)
+        except Exception as e:
+            log(f"⚠️ Não foi possível calcular a impressão digital do dia: {e}")
+            fp_row, fp = {}, None
+        timings["fingerprint"] = time.perf_counter() - t
+        previous = manifest.get(cfg.codfilial, dia)
+        if skip_unchanged and fp and manifest.is_current(cfg.codfilial, dia, fp, LAYOUT_VERSION,
+                                                         output_format, upload, payload_config):
+            log("⏭️ Dia sem alterações na origem desde a última geração; mantendo arquivos existentes")
+            day_info.update(skipped=True, json=previous.get("json"), zip=previous.get("zip"),
+                            md5=previous.get("md5"), rows=previous.get("rows"))
+            return day_info, None
+        if cache is not None and previous and previous.get("fingerprint") != fp:
+            # origem mudou: o que estiver no cache para o dia está desatualizado
+            cache.invalidate(cfg.codfilial, dia)
 
-            logger("👥 Consultando clientes")
-            cli = fetch_df(conn, SQL_CLIENTES, DIA=dia, CODFILIAL=cfg.codfilial)
+        prof = StageProfiler(out_dir, output_stem(cfg.iqvia_client_id, dia),
+                             top_n=getattr(cfg, "profile_top_n", 25)) if profile else None
 
-            logger("📦 Consultando estoque")
-            est = fetch_df(conn, SQL_ESTOQUE, DIA=dia, CODFILIAL=cfg.codfilial)
+        state = IntradayState(out_dir, cfg.codfilial, dia) if intraday else None
+        t = time.perf_counter()
+        with stage(prof, "extract"):
+            try:
+                frames = extract_day(conn, cfg, dia, log, cache=cache, refresh=refresh, stats=qstats,
+                                     pool=pool, sessions=query_sessions, scn=scn, entries=entries,
+                                     ledger=ledger, staged=staged, intraday=state)
+            except Exception as e:
+                if scn is None or not is_flashback_error(e):
+                    raise
+                log(f"⚠️ Leitura AS OF SCN falhou ({e}); repetindo o dia sem leitura consistente")
+                consistent["on"] = False
+                scn = day_info["scn"] = None
+                # a impressão digital foi lida no SCN: refeita sem ele, como os dados do dia
+                try:
+                    fp_row = source_fingerprint(conn, cfg, dia, stats=qstats)
+                    fp = fingerprint_hash(fp_row)
+                except Exception as e2:
+                    log(f"⚠️ Não foi possível calcular a impressão digital do dia: {e2}")
+                    fp_row, fp = {}, None
+                frames = extract_day(conn, cfg, dia, log, cache=cache, refresh=refresh, stats=qstats,
+                                     pool=pool, sessions=query_sessions, entries=entries, ledger=ledger,
+                                     staged=staged, intraday=state)
+            if ledger is not None:
+                day_info["stock_ledger"] = ledger.checks.get(day_info["date"])
+            if state is not None:
+                day_info["intraday"] = state.last
+            mb = None
+            if getattr(cfg, "compact_frames", False):
+                raw_mb = frames_mb(frames)
+                frames = {k: compact_frame(df) for k, df in frames.items()}
+                mb = frames_mb(frames)
+                day_info["frames_mb_raw"] = round(raw_mb, 1)
+                day_info["frames_mb"] = round(mb, 1)
+                log(f"🧠 Dados do dia em memória: {raw_mb:.1f} MB → {mb:.1f} MB (categorias/downcast)")
+            mov, dev, fil, cli = frames["mov"], frames["dev"], frames["fil"], frames["cli"]
+            est, produtos_unicos = frames["est"], frames["produtos_unicos"]
+            dados_entrada = build_dados_entrada(frames["entradas"])
+        timings["extract"] = time.perf_counter() - t
 
-            logger("📥 Consultando dados de entrada para produtos sem EAN/preço")
-            produtos_unicos = fetch_df(conn, SQL_PRODUTOS_UNICOS, DIA=dia, CODFILIAL=cfg.codfilial)
-            entradas = fetch_df(conn, SQL_ENTRADA_PRODUTOS, DIA=dia, CODFILIAL=cfg.codfilial)
+        # Limite de memória por worker: dias acima dele são montados um de cada vez
+        guard = nullcontext()
+        if workers > 1 and worker_max_mb > 0:
+            if mb is None:
+                mb = frames_mb(frames)
+                day_info["frames_mb"] = round(mb, 1)
+            if mb > worker_max_mb:
+                log(f"⚠️ Dia com {mb:.0f} MB extraídos (limite por worker: {worker_max_mb:.0f} MB); "
+                    "aguardando para montar sem concorrência")
+                guard = heavy_lock
+        del frames
 
-            dados_entrada = {}
-            for r in entradas.itertuples(index=False):
-                dados_entrada[int(getattr(r, "CODPROD"))] = {
-                    "ean": getattr(r, "CODAUXILIAR", "") or "",
-                    "preco": float(getattr(r, "PTABELA", 0.0) or 0.0)
-                }
-
-            payload = build_payload(
-                mov, dev, fil, cli, est, produtos_unicos, dados_entrada,
-                dia, cfg.iqvia_client_id, cfg.codiqvia, logger
-            )
+        with guard:
+            t = time.perf_counter()
+            with stage(prof, "build_payload"):
+                payload = build_payload(
+                    mov, dev, fil, cli, est, produtos_unicos, dados_entrada,
+                    dia, cfg.iqvia_client_id, cfg.codiqvia, log
+                )
+            timings["build"] = time.perf_counter() - t
+            del mov, dev, fil, cli, est, produtos_unicos, dados_entrada
+            day_info["rows"] = {k: len(payload[k]) for k in
+                                ("estabelecimentos", "clientes", "produtos", "vendas",
+                                 "vendasDevolucoesCancelamentos", "estoque")}
 
             # Validação leve opcional
             if validate and spec:
-                errs = validate_payload(payload, spec)
+                t = time.perf_counter()
+                with stage(prof, "validate_payload"):
+                    errs = validate_payload(payload, spec)
+                timings["validate"] = time.perf_counter() - t
+                day_info["validation_errors"] = len(errs)
                 if errs:
-                    logger("⚠️ Divergências encontradas na validação:")
+                    log("⚠️ Divergências encontradas na validação:")
                     for e in errs[:200]:
-                        logger(" - " + e)
+                        log(" - " + e)
                 else:
-                    logger("✅ Payload válido segundo a spec")
+                    log("✅ Payload válido segundo a spec")
 
             # Salvar JSON
-            json_path = save_json(payload, cfg.iqvia_client_id, dia, out_dir)
-            logger(f"💾 JSON salvo: {json_path.name}")
+            t = time.perf_counter()
+            with stage(prof, "save_json"):
+                json_path = save_json(payload, cfg.iqvia_client_id, dia, out_dir)
+            timings["save_json"] = time.perf_counter() - t
+            del payload
+        log(f"💾 JSON salvo: {json_path.name}")
+        day_info["json"] = str(json_path)
+        day_info["payload_md5"] = md5_bytes(json_path.read_bytes())
+
+        # Criar ZIP diário
+        if output_format != "json":
+            log("🗜️ Compactando arquivo...")
+            t = time.perf_counter()
+            with stage(prof, "create_daily_zip"):
+                zip_path, md5sum = create_daily_zip(json_path, cfg.iqvia_client_id, out_dir)
+            timings["zip"] = time.perf_counter() - t
+            log(f"✅ Arquivo compactado: {zip_path.name}")
+            day_info["zip"] = str(zip_path)
+            day_info["md5"] = md5sum
+            if output_format == "zip":
+                json_path.unlink()
+                day_info["json"] = None
 
-            # Criar ZIP diário
-            logger("🗜️ Compactando arquivo...")
-            zip_path, md5sum = create_daily_zip(json_path, cfg.iqvia_client_id, out_dir)
-            logger(f"✅ Arquivo compactado: {zip_path.name}")
+        day_info["timings"] = {k: round(v, 3) for k, v in timings.items()}
+        if prof is not None:
+            day_info["profile"] = str(prof.write())
+            log(f"🔬 Perfil: {prof.summary_line()}")
+        record = dict(
+            fingerprint=fp, source=fp_row, layout_version=LAYOUT_VERSION, scn=scn,
+            payload_md5=day_info["payload_md5"], rows=day_info["rows"],
+            timings=day_info["timings"], json=day_info["json"], zip=day_info.get("zip"),
+            md5=day_info.get("md5"), output_format=output_format, config=payload_config,
+        )
+        return day_info, record
 
-            processed_count += 1
+    def finish_day(dia: date, day_info: Dict[str, Any], record: Optional[Dict[str, Any]]):
+        """Registra o dia no resumo e no manifesto e envia (sempre na ordem das datas)."""
+        summary["days"].append(day_info)
+        if record is None:
+            summary["skipped"] += 1
+            previous = manifest.get(cfg.codfilial, dia)
+            zip_path = Path(previous["zip"]) if previous.get("zip") else None
+            if upload and token and zip_path is not None and not previous.get("uploaded"):
+                # gerado antes sem envio: envia o ZIP existente
+                _upload_day(cfg, token, zip_path, dia, out_dir, day_info, summary, manifest, logger)
+                manifest.save()
+        else:
+            summary["processed"] += 1
+            summary["validation_errors"] += day_info.get("validation_errors", 0)
+            manifest.record(cfg.codfilial, dia, **record)
+            manifest.save()
 
             # Upload imediato se habilitado
             if upload and token:
-                logger("📤 Enviando arquivo...")
+                _upload_day(cfg, token, Path(day_info["zip"]), dia, out_dir, day_info, summary, manifest, logger)
+                manifest.save()
+        logger(f"✔️ Processamento concluído")
+
+    def run_day(dia: date, log: Optional[Callable[[str], None]] = None):
+        """Tarefa do worker: sessão própria do pool e log em buffer (entregue na ordem das datas)."""
+        lines: List[str] = []
+        session = pool.acquire()
+        try:
+            return process_day(session, dia, log or lines.append) + (lines, None)
+        except Exception as e:
+            return None, None, lines, e
+        finally:
+            pool.release(session)
+
+    try:
+        if pool is None:
+            for dia in days:
+                day_info, record = process_day(conn, dia, logger)
+                finish_day(dia, day_info, record)
+        elif workers == 1:
+            for dia in days:
+                day_info, record, _, err = run_day(dia, logger)
+                if err is not None:
+                    raise err
+                finish_day(dia, day_info, record)
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gddi-dia") as ex:
+                futures = [ex.submit(run_day, dia) for dia in days]
                 try:
-                    resp = upload_zip(cfg.iqvia_upload_url, zip_path, token, logger=logger)
-                    if 'guid' in resp:
-                        logger(f"✅ Envio concluído: {resp['guid']}")
-                        save_upload_history(resp['guid'], resp, zip_path, dia, out_dir)
-                    else:
-                        logger("✅ Envio concluído")
-                    
-                    uploaded_count += 1
-                    
-                except Exception as e:
-                    logger(f"❌ Erro no envio: {str(e)}")
-                    logger("⏭️ Continuando processamento...")
-            
-            logger(f"✔️ Processamento concluído")
+                    for dia, fut in zip(days, futures):
+                        day_info, record, lines, err = fut.result()
+                        for m in lines:
+                            logger(m)
+                        if err is not None:
+                            raise err
+                        finish_day(dia, day_info, record)
+                except BaseException:
+                    for f in futures:
+                        f.cancel()
+                    raise
+
+        processed_count = summary["processed"]
+        uploaded_count = summary["uploaded"]
 
         # Resumo final
         logger(f"\n📊 Resumo do processamento:")
         logger(f"📅 Período: {d0.strftime('%d/%m/%Y')} a {d1.strftime('%d/%m/%Y')}")
         logger(f"✅ Arquivos processados: {processed_count}")
+        if summary["skipped"]:
+            logger(f"⏭️ Dias sem alterações (mantidos): {summary['skipped']}")
         if upload:
             logger(f"📤 Arquivos enviados: {uploaded_count}")
-            if uploaded_count < processed_count:
-                logger(f"⚠️ {processed_count - uploaded_count} arquivo(s) não enviado(s)")
+            if summary["upload_errors"]:
+                logger(f"⚠️ {summary['upload_errors']} arquivo(s) não enviado(s)")
+        summary["queries"] = qstats.summary()
+        if throttle is not None:
+            throttle.save()
+            summary["throttle"] = throttle.summary()
+            if summary["throttle"]["pauses"] or summary["throttle"]["waited_s"] >= 1:
+                logger(f"🚦 Controle de carga: {summary['throttle']['waited_s']:.0f}s esperando a vez, "
+                       f"{summary['throttle']['pauses']} pausa(s) por lentidão do ERP")
+        if summary["queries"]:
+            logger("🛢️ Consultas ao Oracle (totais do período):")
+            for line in qstats.render():
+                logger(line)
+        if cache is not None:
+            summary["cache"] = {"hits": cache.hits, "misses": cache.misses}
+            logger(f"🗃️ Cache de extração: {cache.hits} leitura(s) reaproveitada(s), {cache.misses} consulta(s) ao Oracle")
         logger("🎉 Processamento finalizado")
+        return summary
 
     finally:
         try:
-            conn.close()
+            if pool is not None:
+                pool.close()
+            else:
+                conn.close()
         except Exception:
             pass
 
@@ -3,8 +3,13 @@ from __future__ import annotations
 from dataclasses import dataclass, asdict
 from pathlib import Path
 import json
+import re
+import threading
+import time
+from contextlib import nullcontext
+from decimal import Decimal
 from typing import Optional, Dict, Any, List
-import oracledb
+# oracledb é importado sob demanda (primeiro uso), para não atrasar a abertura da janela
 
 CONFIG_FILE = Path(__file__).resolve().parent.parent / "iqvia_gui_config.json"
 
@@ -12,6 +17,9 @@ CONFIG_FILE = Path(__file__).resolve().parent.parent / "iqvia_gui_config.json"
 class AppConfig:
     # Oracle
     instant_client_dir: str = r"C:\iqvia_python\ClientLight\instantclient_23_8"
+    # Modo do python-oracledb: thick (Instant Client, qualquer versão do banco) ou thin (sem Instant Client,
+    # conexão mais rápida; exige Oracle 12.1 ou mais novo)
+    oracle_driver_mode: str = "thick"
     db_host: str = "192.168.0.5"
     db_port: int = 1521
     db_sid: str = "WINT"
@@ -34,6 +42,65 @@ class AppConfig:
     # Validation
     validation_enabled: bool = True
     layout_example_path: str = ""
+    # Cache de extração
+    cache_enabled: bool = True
+    cache_ttl_hours: float = 12.0
+    cache_max_mb: int = 1024
+    # Reexecução: pula dias cuja origem, layout e configuração do payload não mudaram (manifest.json);
+    # alterações de cadastro e de reservas/bloqueios de estoque não são detectadas
+    skip_unchanged_days: bool = False
+    # Perfilamento (--profile / "Perfilar etapas"): funções/alocações listadas por etapa
+    profile_top_n: int = 25
+    # Consultas acima deste tempo (s) vão para <saída>/slow_queries.log com os binds (0 = desliga)
+    slow_query_seconds: float = 30.0
+    # Backfill: dias gerados em paralelo (uma sessão por worker) e limite de memória por dia/worker
+    parallel_workers: int = 1
+    worker_max_mb: int = 2048
+    # Consultas do dia rodando ao mesmo tempo, cada uma em sua sessão (1 = uma por vez)
+    query_sessions: int = 1
+    # Leitura consistente: as consultas do dia leem o mesmo SCN (AS OF SCN; exige privilégio de FLASHBACK
+    # e undo suficiente, por isso fica desligada por padrão)
+    consistent_read: bool = False
+    # Leitura dos resultados: rows (fetchall, o caminho original), auto (Arrow do oracledb quando houver),
+    # arrow ou columns; linhas por round trip
+    fetch_backend: str = "rows"
+    fetch_arraysize: int = 1000
+    # Dados extraídos em memória compacta (texto repetido como categoria, inteiros no menor tipo; opcional)
+    compact_frames: bool = False
+    # Vendas/devoluções trazem só as colunas usadas no payload (dados de filial/cliente/produto vêm das dimensões;
+    # opcional, as consultas completas são o padrão)
+    project_columns: bool = False
+    # EAN/preço de entrada: scan (SQL_ENTRADA_PRODUTOS, 365 dias, a cada dia; o padrão), index (índice local
+    # em <saída>/entradas, atualizado por marca d'água; exige pyarrow) ou targeted (por dia, só os produtos sem EAN/preço)
+    entry_lookup: str = "scan"
+    # Estoque dos dias: plsql (PKG_ESTOQUE por produto/dia) ou ledger (saldo no último dia recuado pelas
+    # movimentações do PCMOV; produtos da amostra conferidos por dia contra o PKG_ESTOQUE)
+    stock_mode: str = "plsql"
+    stock_ledger_sample: int = 20
+    # Consultas com `TRUNC(data) = :DIA` reescrito para `data >= TRUNC(:DIA) AND data < TRUNC(:DIA) + 1`
+    # (nomes separados por vírgula, ex.: "SQL_MOV,SQL_FINGERPRINT", ou "all"); conferir antes com o comando plan
+    sargable_queries: str = ""
+    # Devoluções sem as junções que o payload não lê (SQL_DEVOLUCOES_ENXUTA; conferir com plan --compare)
+    lean_devolucoes: bool = False
+    # Chaves dos itens de venda/devolução do dia gravadas uma vez em GDDI_DIA_ITENS (GLOBAL TEMPORARY TABLE,
+    # criada pelo comando setup-staging); SQL_MOV, SQL_DEVOLUCOES, SQL_FILIAL, SQL_CLIENTES e SQL_PRODUTOS_UNICOS leem dela
+    stage_day_keys: bool = False
+    # Regeração intradiária: guarda por filial/dia as maiores NUMTRANSVENDA/NUMTRANSENT lidas e o acumulado de
+    # vendas/devoluções/clientes (<saída>/intradia); cada execução lê só as notas novas (sem efeito com stage_day_keys)
+    intraday_watermark: bool = False
+    # Controle de carga no ERP (extração em horário de operação): consultas simultâneas, consultas por minuto,
+    # pausa quando a consulta fica throttle_slowdown × mais lenta que a referência (<saída>/throttle.json) e
+    # horário livre sem limites (ex.: "22-06"; vazio = limites o dia todo)
+    throttle_enabled: bool = False
+    throttle_max_sessions: int = 2
+    throttle_max_queries_per_min: int = 30
+    throttle_slowdown: float = 1.5
+    throttle_max_pause_s: float = 60.0
+    throttle_quiet_hours: str = "22-06"
+    # Prazo (s) de cada consulta pesada do dia (call_timeout; 0 = sem prazo). Estourado, a consulta é refeita em
+    # split_parts janelas de horário (notas) ou faixas de CODPROD (estoque/produtos), divididas de novo se preciso
+    query_timeout_s: float = 0.0
+    split_parts: int = 4
 
     def save(self):
         """
@@ -42,21 +109,27 @@ class AppConfig:
         CONFIG_FILE.write_text(json.dumps(asdict(self), ensure_ascii=False, indent=2), encoding="utf-8")
 
     @staticmethod
-    def load() -> "AppConfig":
+    def load(path: Optional[str] = None) -> "AppConfig":
         """
         Carrega a configuração do arquivo JSON.
         
+        Args:
+            path: Arquivo de configuração alternativo (ex.: linha de comando). Quando
+                  informado e inexistente, retorna o padrão sem gravar nada.
+        
         Returns:
             Objeto AppConfig com a configuração carregada ou padrão
         """
-        if CONFIG_FILE.is_file():
+        cfg_file = Path(path) if path else CONFIG_FILE
+        if cfg_file.is_file():
             try:
-                data = json.loads(CONFIG_FILE.read_text(encoding="utf-8"))
+                data = json.loads(cfg_file.read_text(encoding="utf-8"))
                 return AppConfig(**data)
             except Exception:
                 pass
         cfg = AppConfig()
-        cfg.save()
+        if not path:
+            cfg.save()
         return cfg
 
 def init_oracle_client(lib_dir: str):
@@ -69,6 +142,7 @@ def init_oracle_client(lib_dir: str):
     Raises:
         RuntimeError: Se o diretório do Instant Client não for encontrado
     """
+    import oracledb
     p = Path(lib_dir)
     if not p.exists():
         raise RuntimeError(f"Instant Client não encontrado: {p}")
@@ -78,6 +152,36 @@ def init_oracle_client(lib_dir: str):
         # já inicializado
         pass
 
+DRIVER_MODES = ("thick", "thin")
+# recursos que o modo thin não tem: versão do banco, verificador de senha antigo, criptografia nativa
+_RE_THIN_UNSUPPORTED = re.compile(r"DPY-3010|DPY-3015|DPY-3001")
+
+def init_driver(cfg: AppConfig):
+    """
+    Prepara o python-oracledb no modo da configuração: thick inicializa o Instant Client; thin não carrega
+    nada (o driver já começa em thin). O modo vale para o processo todo: depois de iniciado o thick, as
+    conexões seguem thick.
+    
+    Args:
+        cfg: Configuração da aplicação
+        
+    Raises:
+        ValueError: Modo desconhecido
+        RuntimeError: Modo thick sem o Instant Client
+    """
+    mode = (getattr(cfg, "oracle_driver_mode", "thick") or "thick").strip().lower()
+    if mode not in DRIVER_MODES:
+        raise ValueError(f"Modo do driver inválido: {mode} (use thick ou thin)")
+    if mode == "thick":
+        init_oracle_client(cfg.instant_client_dir)
+
+def _thin_error(cfg: AppConfig, e: Exception) -> Exception:
+    # no thin, banco/conta fora do suportado: diz o que fazer em vez de só o código DPY
+    if getattr(cfg, "oracle_driver_mode", "thick") == "thin" and _RE_THIN_UNSUPPORTED.search(str(e)):
+        return RuntimeError(f"{e} — o modo thin não atende este banco (Oracle 12.1+, senha 11g+, sem "
+                            f"criptografia nativa); use \"oracle_driver_mode\": \"thick\" com o Instant Client")
+    return e
+
 def connect_oracle(cfg: AppConfig):
     """
     Conecta ao banco de dados Oracle.
@@ -88,9 +192,16 @@ def connect_oracle(cfg: AppConfig):
     Returns:
         Conexão com o banco de dados
     """
-    init_oracle_client(cfg.instant_client_dir)
+    import oracledb
+    init_driver(cfg)
     dsn = oracledb.makedsn(cfg.db_host, cfg.db_port, sid=cfg.db_sid)
-    conn = oracledb.connect(user=cfg.db_user, password=cfg.db_pass, dsn=dsn)
+    try:
+        conn = oracledb.connect(user=cfg.db_user, password=cfg.db_pass, dsn=dsn)
+    except oracledb.Error as e:
+        err = _thin_error(cfg, e)
+        if err is e:
+            raise
+        raise err from e
     # tenta setar schema atual
     try:
         cur = conn.cursor()
@@ -100,13 +211,273 @@ def connect_oracle(cfg: AppConfig):
         pass
     return conn
 
-def fetch_df(conn, sql: str, **binds):
+class ConnectionPool:
+    """Pool mínimo sobre uma função de conexão (ex.: standin.connect), com a interface do pool do oracledb."""
+
+    def __init__(self, connect, cfg: AppConfig, size: int):
+        self._connect = connect
+        self._cfg = cfg
+        self._sem = threading.BoundedSemaphore(max(1, int(size)))
+        self._lock = threading.Lock()
+        self._idle: List[Any] = []
+        self._all: List[Any] = []
+
+    def acquire(self):
+        self._sem.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            conn = self._connect(self._cfg)
+        except Exception:
+            self._sem.release()
+            raise
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            self._idle.append(conn)
+        self._sem.release()
+
+    def close(self, force: bool = True):
+        with self._lock:
+            for conn in self._all:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._all.clear()
+            self._idle.clear()
+
+def create_pool(cfg: AppConfig, size: int, connect=None):
+    """
+    Cria um pool de sessões (uma por worker).
+    
+    Args:
+        cfg: Configuração da aplicação
+        size: Número máximo de sessões
+        connect: Função de conexão alternativa (ex.: standin.connect); padrão = pool do oracledb
+        
+    Returns:
+        Pool com acquire()/release(conn)/close()
+    """
+    if connect is not None:
+        return ConnectionPool(connect, cfg, size)
+    import oracledb
+    init_driver(cfg)
+    dsn = oracledb.makedsn(cfg.db_host, cfg.db_port, sid=cfg.db_sid)
+
+    def init_session(conn, requested_tag):
+        # mesmo ajuste de schema do connect_oracle, uma vez por sessão nova
+        try:
+            cur = conn.cursor()
+            cur.execute(f"ALTER SESSION SET CURRENT_SCHEMA={cfg.current_schema}")
+            cur.close()
+        except Exception:
+            pass
+
+    try:
+        return oracledb.create_pool(user=cfg.db_user, password=cfg.db_pass, dsn=dsn, min=1, max=max(1, int(size)),
+                                    increment=1, getmode=oracledb.POOL_GETMODE_WAIT, session_callback=init_session)
+    except oracledb.Error as e:
+        err = _thin_error(cfg, e)
+        if err is e:
+            raise
+        raise err from e
+
+FETCH_BACKENDS = ("auto", "arrow", "columns", "rows")
+
+def resolve_backend(conn, backend: str = "auto") -> str:
+    """
+    Caminho de leitura efetivo para a conexão.
+    - arrow: DataFrame do oracledb (fetch_df_all) convertido via pyarrow, sem objetos Python por célula
+    - columns: fetchmany em lotes, números direto em arrays float64/int64 (sem lista de tuplas)
+    - rows: fetchall + DataFrame.from_records (caminho original)
+    "auto"/"arrow" caem para "columns" quando o driver ou o pyarrow não suportam.
+    """
+    if backend not in FETCH_BACKENDS:
+        raise ValueError(f"Caminho de leitura inválido: {backend}")
+    if backend in ("auto", "arrow"):
+        if hasattr(conn, "fetch_df_all"):
+            try:
+                import pyarrow  # noqa: F401
+                return "arrow"
+            except ImportError:
+                pass
+        return "columns"
+    return backend
+
+def _fetch_arrow(conn, sql: str, binds: Dict[str, Any], arraysize: Optional[int]):
+    import pyarrow as pa
+    odf = conn.fetch_df_all(statement=sql, parameters=binds, arraysize=arraysize)
+    if hasattr(odf, "__arrow_c_stream__"):
+        table = pa.table(odf)
+    else:
+        table = pa.Table.from_arrays(odf.column_arrays(), names=odf.column_names())
+    return table.to_pandas()
+
+_NUMBER_TYPES = {int, float, Decimal}
+
+def _number_array(col):
+    """Lote de uma coluna numérica: int64 se todos inteiros sem NULL, senão float64 (NULL = NaN)."""
+    import numpy as np
+    arr = np.array(col)
+    if arr.dtype.kind in "iu":
+        return arr.astype(np.int64, copy=False)
+    return np.array(col, dtype=np.float64)
+
+def _fetch_columns(cur, cols: List[str], arraysize: int):
+    """Lê em lotes e monta uma coluna por vez; colunas numéricas viram arrays contíguos."""
+    import numpy as np
+    import pandas as pd
+    numeric: List[Optional[bool]] = [None] * len(cols)   # None = ainda sem valor para decidir
+    arrays: List[List[Any]] = [[] for _ in cols]
+    values: List[List[Any]] = [[] for _ in cols]
+    rows = 0
+    while True:
+        batch = cur.fetchmany(arraysize)
+        if not batch:
+            break
+        rows += len(batch)
+        for i, col in enumerate(zip(*batch)):
+            if numeric[i] is not False:
+                kinds = set(map(type, col))
+                kinds.discard(type(None))
+                if kinds and kinds <= _NUMBER_TYPES:
+                    numeric[i] = True
+                elif kinds:
+                    # apareceu texto: a coluna volta a ser de objetos (lotes anteriores inclusos)
+                    numeric[i] = False
+                    values[i] = [v for arr in arrays[i] for v in arr.tolist()] + values[i]
+                    arrays[i] = []
+            if numeric[i] is not False:
+                arrays[i].append(_number_array(col))
+            else:
+                values[i].extend(col)
+    if not rows:
+        return pd.DataFrame(columns=cols)
+    data: Dict[str, Any] = {}
+    for i, c in enumerate(cols):
+        if numeric[i]:
+            data[c] = np.concatenate(arrays[i])
+        elif numeric[i] is None:
+            data[c] = [None] * rows        # coluna inteira NULL
+        else:
+            # texto/datas: inferência do pandas (str, datetime64), como no from_records
+            data[c] = values[i]
+    return pd.DataFrame(data, columns=cols)
+
+# Tipos de saída por coluna (ver sql_prisma.QUERY_TYPES) e o valor que substitui o NULL
+TYPED_DEFAULTS = {"int": 0, "float": 0.0, "money": 0.0, "serie": "0", "code": "", "text": "", "date": ""}
+
+def output_type_handler(types: Dict[str, str]):
+    """
+    outputtypehandler do oracledb para as colunas tipadas: NUMBER de valores (float/money)
+    chega como BINARY_DOUBLE (float nativo, sem Decimal); o resto fica com o tipo padrão do driver.
+    
+    Args:
+        types: {coluna: tipo} da consulta
+        
+    Returns:
+        Função handler(cursor, metadata)
+    """
+    import oracledb
+
+    def handler(cursor, metadata):
+        if types.get(metadata.name) in ("float", "money") and metadata.type_code is oracledb.DB_TYPE_NUMBER:
+            return cursor.var(oracledb.DB_TYPE_BINARY_DOUBLE, arraysize=cursor.arraysize)
+    return handler
+
+def _round2(values):
+    """round(x, 2) do Python sobre um array: np.round e, perto do ",5", o round exato (mesmo resultado do build_payload original)."""
+    import numpy as np
+    out = np.round(values, 2)
+    c = values * 100
+    near = np.abs(np.abs(c - np.trunc(c)) - 0.5) < np.maximum(1e-6, np.abs(c) * 1e-12)
+    if near.any():
+        out[near] = [round(x, 2) for x in values[near].tolist()]
+    return out
+
+def _code_text(v) -> str:
+    """Código como texto: número inteiro sem ".0"; fracionário (ex.: 12.5) como veio."""
+    if isinstance(v, str):
+        return v
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return str(v)
+    return str(int(f)) if f.is_integer() else str(v)
+
+def apply_types(df, types: Optional[Dict[str, str]]):
+    """
+    Converte as colunas para os tipos do payload, de forma vetorizada, trocando NULL pelo padrão tipado:
+    int/float (NULL = 0), money (float arredondado em 2 casas), serie (inteiro como texto),
+    code (número como texto, sem ".0"), text (NULL = "") e date ("AAAA-MM-DD"). Colunas ausentes são criadas com o padrão.
+    Pode ser aplicada de novo sobre um DataFrame já tipado (ex.: vindo do cache).
+    
+    Args:
+        df: DataFrame de uma consulta
+        types: {coluna: tipo} (sql_prisma.QUERY_TYPES[nome])
+        
+    Returns:
+        Novo DataFrame (o original não é alterado)
+    """
+    import numpy as np
+    import pandas as pd
+    if not types:
+        return df
+    df = df.copy(deep=False)
+    for col, kind in types.items():
+        if col not in df.columns:
+            df[col] = TYPED_DEFAULTS[kind]
+            continue
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype) and kind not in ("int", "float", "money"):
+            continue    # já tipada e compactada (compact_frame)
+        if kind == "int":
+            if s.dtype.kind not in "iu":
+                s = pd.to_numeric(s, errors="coerce").fillna(0).astype(np.int64)
+        elif kind in ("float", "money"):
+            s = pd.to_numeric(s, errors="coerce").astype(np.float64).fillna(0.0)
+            if kind == "money":
+                s = pd.Series(_round2(s.to_numpy(copy=True)), index=s.index, name=col)
+        elif kind == "serie":
+            s = pd.to_numeric(s, errors="coerce").fillna(0).astype(np.int64).astype(str).astype(object)
+        elif kind == "code":
+            if pd.api.types.is_float_dtype(s) and bool((s.dropna() % 1 == 0).all()):
+                s = s.astype("Int64")
+            if pd.api.types.infer_dtype(s, skipna=True) != "string":
+                # valor a valor: um fracionário (sem Int64) não derruba a coluna
+                s = s.astype(object).map(_code_text, na_action="ignore")
+            s = s.astype(object).where(s.notna(), "")
+        elif kind == "date":
+            if not pd.api.types.is_datetime64_any_dtype(s) and pd.api.types.infer_dtype(s, skipna=True) != "string":
+                s = pd.to_datetime(s, errors="coerce")
+            if pd.api.types.is_datetime64_any_dtype(s):
+                s = s.dt.strftime("%Y-%m-%d")
+            else:
+                s = s.str.slice(0, 10)
+            s = s.astype(object).where(s.notna(), "")
+        elif s.isna().any():
+            s = s.astype(object).where(s.notna(), "")
+        df[col] = s
+    return df
+
+def fetch_df(conn, sql: str, query_name: Optional[str] = None, stats=None, backend: str = "rows",
+             arraysize: Optional[int] = None, types: Optional[Dict[str, str]] = None, **binds):
     """
     Executa uma consulta SQL e retorna os resultados como DataFrame.
     
     Args:
         conn: Conexão com o banco de dados
         sql: Consulta SQL
+        query_name: Nome da consulta nas estatísticas (ex.: SQL_MOV)
+        stats: QueryStats para registrar tempos, linhas, bytes e round trips (opcional)
+        backend: Caminho de leitura: "rows", "columns", "arrow" ou "auto" (ver resolve_backend)
+        arraysize: Linhas por round trip (padrão: o do driver)
+        types: {coluna: tipo} para entregar as colunas já tipadas (ver apply_types)
         **binds: Parâmetros para bind na consulta
         
     Returns:
@@ -115,15 +486,103 @@ def fetch_df(conn, sql: str, **binds):
     Raises:
         RuntimeError: Se pandas não estiver instalado
     """
-    cur = conn.cursor()
-    cur.execute(sql, binds)
-    cols = [c[0] for c in cur.description]
-    rows = cur.fetchall()
     try:
         import pandas as pd
-        return pd.DataFrame.from_records(rows, columns=cols)
     except ImportError:
         raise RuntimeError("Pandas não instalado. pip install pandas")
+    # só os binds usados pelo texto (o Oracle rejeita binds sobrando, ex.: SCN sem AS OF SCN)
+    binds = {k: v for k, v in binds.items() if re.search(rf":{k}\b", sql)}
+    throttle = getattr(stats, "throttle", None)
+    # controle de carga (throttle.py): espera a vez da consulta antes do execute
+    with (throttle.slot(query_name or "SQL") if throttle is not None else nullcontext()):
+        backend = resolve_backend(conn, backend)
+        before = stats.snapshot(conn) if stats is not None else None
+
+        if backend == "arrow":
+            # execute e fetch acontecem juntos no driver: o tempo vai todo para o fetch
+            t0 = time.perf_counter()
+            df = _fetch_arrow(conn, sql, binds, arraysize)
+            exec_s, fetch_s = 0.0, time.perf_counter() - t0
+            size = arraysize or 100
+        else:
+            cur = conn.cursor()
+            try:
+                if arraysize:
+                    cur.arraysize = arraysize
+                if types and hasattr(cur, "outputtypehandler"):
+                    cur.outputtypehandler = output_type_handler(types)
+                t0 = time.perf_counter()
+                cur.execute(sql, binds)
+                t1 = time.perf_counter()
+                cols = [c[0] for c in cur.description]
+                if backend == "columns":
+                    df = _fetch_columns(cur, cols, cur.arraysize)
+                else:
+                    df = pd.DataFrame.from_records(cur.fetchall(), columns=cols)
+                exec_s, fetch_s = t1 - t0, time.perf_counter() - t1
+                size = getattr(cur, "arraysize", 100)
+            finally:
+                # também no erro (ex.: prazo estourado no meio do fetch): o cursor não fica aberto na sessão
+                cur.close()
+        if stats is not None:
+            stats.record(conn, query_name or "SQL", before, exec_s, fetch_s, len(df), binds, arraysize=size)
+    return apply_types(restore_none(df), types)
+
+def compact_frame(df, max_ratio: float = 0.5):
+    """
+    Representação compacta de um DataFrame extraído (os valores lidos pelo build_payload não mudam):
+    - texto com poucos valores distintos (filial, cidade, UF, fornecedor...) vira categoria;
+    - o restante do texto é "internado": linhas com o mesmo valor apontam para o mesmo objeto str;
+    - inteiros vão para o menor tipo que cabe (int8/16/32). Floats ficam em float64 (preços e ICMS
+      com 2 casas não podem perder precisão).
+    
+    Args:
+        df: DataFrame de uma consulta
+        max_ratio: Distintos/linhas máximo para virar categoria
+        
+    Returns:
+        Novo DataFrame compactado
+    """
+    import numpy as np
+    import pandas as pd
+    df = df.copy(deep=False)
+    n = len(df)
+    for col in df.columns:
+        s = df[col]
+        if s.dtype.kind in "iu":
+            df[col] = pd.to_numeric(s, downcast="integer")
+        elif s.dtype.kind == "O" or pd.api.types.is_string_dtype(s.dtype):
+            if isinstance(s.dtype, pd.CategoricalDtype) or not n:
+                continue
+            codes, uniques = pd.factorize(s)
+            if len(uniques) and pd.api.types.infer_dtype(uniques, skipna=True) not in ("string", "empty"):
+                continue    # datas/números como objeto: ficam como estão
+            if codes.min() >= 0 and len(uniques) <= max_ratio * n:
+                df[col] = pd.Categorical.from_codes(codes, categories=pd.Index(uniques, dtype=object))
+            else:
+                values = np.asarray(uniques, dtype=object)[codes]
+                if codes.min() < 0:
+                    values[codes < 0] = None
+                df[col] = pd.Series(values, index=df.index, dtype=object)
+    return df
+
+def restore_none(df):
+    """
+    Troca NaN por None nas colunas de texto (in-place), como o driver entrega os NULLs.
+    Parquet e o pandas 3 (dtype str) representam texto ausente como NaN, que é "verdadeiro"
+    nos `valor or ""` do build_payload.
+    
+    Args:
+        df: DataFrame
+        
+    Returns:
+        O próprio DataFrame
+    """
+    import pandas as pd
+    for c in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_datetime64_any_dtype(df[c]):
+            df[c] = df[c].astype(object).where(df[c].notna(), None)
+    return df
 
 def test_connection(cfg: AppConfig) -> str:
     """
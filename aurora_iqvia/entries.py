@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Índice local da última entrada (EAN/preço) por produto: <saída>/entradas/F<filial>.parquet (+ .json).
+- Substitui a varredura de 365 dias do SQL_ENTRADA_PRODUTOS feita a cada dia processado.
+- Atualização incremental: só as notas com NUMTRANSENT acima da marca d'água (uma consulta por execução).
+- Conferência abaixo da marca d'água: COUNT/SUM por dia (SQL_ENTRADA_CONFERE) comparados com os registrados;
+  dias que mudaram (nota gravada fora de sequência, alterada ou cancelada) são relidos inteiros.
+- Entradas anteriores a D-365 do primeiro dia pedido são descartadas (o índice não cresce sem limite).
+- Consulta por data: para o dia D, a entrada mais recente de cada produto entre D-365 e o fim de D.
+- Guarda no máximo uma entrada por produto e dia (a mais recente), o suficiente para a consulta por data.
+"""
+
+from __future__ import annotations
+import json
+import math
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+try:
+    from .db import fetch_df, restore_none
+    from .sql_prisma import SQL_ENTRADA_DELTA, SQL_ENTRADA_CONFERE, SQL_ENTRADA_DIAS
+except ImportError:
+    from aurora_iqvia.db import fetch_df, restore_none
+    from aurora_iqvia.sql_prisma import SQL_ENTRADA_DELTA, SQL_ENTRADA_CONFERE, SQL_ENTRADA_DIAS
+
+INDEX_DIRNAME = "entradas"
+WINDOW_DAYS = 365
+COLUMNS = ["NUMTRANSENT", "DTENT", "CODPROD", "CODAUXILIAR", "PUNIT"]
+# conferência por dia: [QTDE, SOMA_NUMTRANSENT, SOMA_CODPROD, SOMA_PUNIT]
+CHECK_COLUMNS = ["QTDE", "SOMA_NUMTRANSENT", "SOMA_CODPROD", "SOMA_PUNIT"]
+
+def _midnight(d: date) -> datetime:
+    return datetime.combine(d, datetime.min.time())
+
+def _same(a, b) -> bool:
+    return (a is not None and b is not None and len(a) == len(b)
+            and all(math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-4) for x, y in zip(a, b)))
+
+def _day_checks(rows) -> Dict[str, list]:
+    """COUNT/SUM por dia de linhas do SQL_ENTRADA_DELTA/SQL_ENTRADA_DIAS (mesma conta do SQL_ENTRADA_CONFERE)."""
+    import pandas as pd
+    if not len(rows):
+        return {}
+    g = pd.DataFrame({"DIA": pd.to_datetime(rows["DTENT"]).dt.strftime("%Y-%m-%d"),
+                      "NUMTRANSENT": rows["NUMTRANSENT"].astype("int64"), "CODPROD": rows["CODPROD"].astype("int64"),
+                      "PUNIT": pd.to_numeric(rows["PUNIT"], errors="coerce").fillna(0.0)})
+    agg = g.groupby("DIA").agg(QTDE=("NUMTRANSENT", "size"), SOMA_NUMTRANSENT=("NUMTRANSENT", "sum"),
+                               SOMA_CODPROD=("CODPROD", "sum"), SOMA_PUNIT=("PUNIT", "sum"))
+    return {dia: [float(v) for v in row] for dia, row in zip(agg.index, agg[CHECK_COLUMNS].itertuples(index=False))}
+
+class EntryIndex:
+    def __init__(self, out_dir: Path, codfilial: int):
+        self.root = Path(out_dir) / INDEX_DIRNAME
+        self.path = self.root / f"F{codfilial}.parquet"
+        self.meta_path = self.root / f"F{codfilial}.json"
+        self.codfilial = codfilial
+        self.meta: Dict[str, Any] = {"watermark": 0, "from": None, "rows": 0, "checks": {}}
+        self.df = None
+        self._load()
+
+    def _load(self):
+        import pandas as pd
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+            df = pd.read_parquet(self.path)
+        except Exception:
+            return
+        self.meta.update(meta)
+        self.df = df
+
+    def _empty(self):
+        import pandas as pd
+        return pd.DataFrame({"NUMTRANSENT": pd.Series(dtype="int64"), "DTENT": pd.Series(dtype="datetime64[us]"),
+                             "CODPROD": pd.Series(dtype="int64"), "CODAUXILIAR": pd.Series(dtype=object),
+                             "PUNIT": pd.Series(dtype="float64")})
+
+    def refresh(self, conn, d0: date, stats=None, rebuild: bool = False,
+                logger: Optional[Callable[[str], None]] = None) -> int:
+        """
+        Traz do Oracle as entradas novas desde a última marca d'água e relê os dias abaixo dela cuja
+        conferência (COUNT/SUM por dia) mudou. Descarta o que ficou antes de d0 - 365.
+        Se o período pedido começa antes do que o índice cobre (ou rebuild), refaz o índice do zero.
+
+        Args:
+            conn: Conexão com o banco de dados
+            d0: Primeiro dia do período a processar (o índice cobre a partir de d0 - 365)
+            stats: QueryStats para instrumentar a consulta (opcional)
+            rebuild: Ignora o índice gravado (ex.: --refresh)
+            logger: Função para log
+
+        Returns:
+            Linhas lidas do Oracle (novas e relidas)
+        """
+        import pandas as pd
+        need_from = d0 - timedelta(days=WINDOW_DAYS)
+        covered = date.fromisoformat(self.meta["from"]) if self.meta.get("from") else None
+        if rebuild or self.df is None or covered is None or need_from < covered:
+            self.df = self._empty()
+            self.meta = {"watermark": 0, "from": need_from.isoformat(), "rows": 0, "checks": {}}
+        elif need_from > covered:
+            # fora da janela de 365 dias do período: não é mais consultado
+            self.df = self.df[self.df["DTENT"] >= pd.Timestamp(need_from)].reset_index(drop=True)
+            self.meta["from"] = need_from.isoformat()
+            self.meta["checks"] = {k: v for k, v in self.meta.get("checks", {}).items() if k >= self.meta["from"]}
+        dtent_min = _midnight(date.fromisoformat(self.meta["from"]))
+        watermark = int(self.meta["watermark"])
+        checks: Dict[str, list] = dict(self.meta.get("checks") or {})
+
+        # conferência abaixo da marca d'água: dias que mudaram desde a última leitura
+        changed: list = []
+        if watermark:
+            conf = fetch_df(conn, SQL_ENTRADA_CONFERE, query_name="SQL_ENTRADA_CONFERE", stats=stats,
+                            CODFILIAL=self.codfilial, NUMTRANSENT=watermark, DTENT_MIN=dtent_min)
+            server = {pd.Timestamp(r["DTENT"]).strftime("%Y-%m-%d"): [float(r[c] or 0) for c in CHECK_COLUMNS]
+                      for _, r in conf.iterrows()}
+            changed = sorted(d for d in set(server) | set(checks) if not _same(server.get(d), checks.get(d)))
+            checks = server
+        reread = self._empty()
+        if changed:
+            reread = fetch_df(conn, SQL_ENTRADA_DIAS, query_name="SQL_ENTRADA_DIAS", stats=stats,
+                              CODFILIAL=self.codfilial, DTENT_MIN=_midnight(date.fromisoformat(changed[0])),
+                              DTENT_MAX=_midnight(date.fromisoformat(changed[-1]) + timedelta(days=1)))
+            reread = reread[pd.to_datetime(reread["DTENT"]).dt.strftime("%Y-%m-%d").isin(changed)]
+
+        delta = fetch_df(conn, SQL_ENTRADA_DELTA, query_name="SQL_ENTRADA_DELTA", stats=stats,
+                         CODFILIAL=self.codfilial, NUMTRANSENT=watermark, DTENT_MIN=dtent_min)
+        for dia, vals in _day_checks(delta).items():
+            checks[dia] = [a + b for a, b in zip(checks.get(dia, [0.0] * len(CHECK_COLUMNS)), vals)]
+
+        new = [f for f in (reread, delta) if len(f)]
+        if new or changed:
+            df = self.df
+            if changed:
+                df = df[~df["DTENT"].dt.strftime("%Y-%m-%d").isin(changed)]
+            if new:
+                rows = pd.concat([f[COLUMNS] for f in new], ignore_index=True)
+                rows = rows.astype({"NUMTRANSENT": "int64", "CODPROD": "int64", "PUNIT": "float64"})
+                rows["DTENT"] = pd.to_datetime(rows["DTENT"])
+                df = pd.concat([df, rows], ignore_index=True) if len(df) else rows
+            # uma entrada por produto e dia: a mais recente (DTENT e, no empate, a maior transação)
+            df = df.sort_values(["CODPROD", "DTENT", "NUMTRANSENT"], ascending=[True, False, False], kind="stable")
+            df = df[~df.assign(DIA=df["DTENT"].dt.normalize()).duplicated(["CODPROD", "DIA"])].reset_index(drop=True)
+            self.df = df
+        if len(delta):
+            self.meta["watermark"] = int(max(watermark, pd.to_numeric(delta["NUMTRANSENT"]).max()))
+        self.meta["checks"] = dict(sorted(checks.items()))
+        self.meta["rows"] = len(self.df)
+        self.meta["updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._save()
+        if logger:
+            if changed:
+                logger(f"📥 Índice de entradas: {len(changed)} dia(s) alterado(s) abaixo da marca d'água "
+                       f"relido(s) ({len(reread)} linha(s))")
+            logger(f"📥 Índice de entradas: {len(delta)} linha(s) nova(s), {len(self.df)} no índice "
+                   f"(desde {self.meta['from']})")
+        return len(delta) + len(reread)
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        self.df.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+        tmp = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+
+    def frame(self, dia: date):
+        """
+        Entradas do dia no formato do SQL_ENTRADA_PRODUTOS: a mais recente de cada produto
+        entre dia - 365 e o fim do dia (uma linha por CODPROD, RN = 1).
+
+        Args:
+            dia: Dia de referência
+
+        Returns:
+            DataFrame CODPROD, CODAUXILIAR, PUNIT, DTENT, RN
+        """
+        import pandas as pd
+        df = self.df if self.df is not None else self._empty()
+        ini = pd.Timestamp(dia - timedelta(days=WINDOW_DAYS))
+        fim = pd.Timestamp(dia + timedelta(days=1))
+        win = df[(df["DTENT"] >= ini) & (df["DTENT"] < fim)]
+        # já ordenado por CODPROD e DTENT decrescente: a primeira de cada produto é a mais recente
+        win = win[~win["CODPROD"].duplicated()]
+        out = win[["CODPROD", "CODAUXILIAR", "PUNIT", "DTENT"]].reset_index(drop=True)
+        out["RN"] = 1
+        return restore_none(out)
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import os
+import sys
 from pathlib import Path
 from datetime import date, datetime, timedelta
 import ttkbootstrap as tb
@@ -11,10 +12,13 @@ from tkinter.scrolledtext import ScrolledText
 import json
 
 from .db import AppConfig, connect_oracle, test_connection
-from .controller import run_period, build_payload, save_json, get_layout_version, get_layout_changes
+from .controller import (
+    run_period, build_payload, save_json, get_layout_version, get_layout_changes,
+    extract_day, build_dados_entrada, open_cache, prepare_sources, current_scn, is_flashback_error
+)
 from .utils import parse_br_date, beautify_json
 from .iqvia_api import test_comm, check_upload_status, get_token
-from .sql_prisma import SQL_MOV, SQL_DEVOLUCOES, SQL_FILIAL, SQL_CLIENTES, SQL_ESTOQUE, SQL_PRODUTOS_UNICOS, SQL_ENTRADA_PRODUTOS
+from . import startup
 
 APP_TITLE = "GDDI – Gerador de dados IQVIA — by Aurora Business Intelligence"
 
@@ -29,6 +33,10 @@ class App(tb.Window):
         self.protocol("WM_DELETE_WINDOW", self._on_close)
         self._build_ui()
         self._load_cfg()
+        startup.mark("janela montada")
+        self._map_bind = None
+        if startup.current() is not None:
+            self._map_bind = self.bind("<Map>", self._on_first_map, add="+")
 
     def _center(self, w:int, h:int):
         self.update_idletasks()
@@ -73,6 +81,12 @@ class App(tb.Window):
         self.var_upload = tb.BooleanVar(value=self.cfg.upload_default)
         tb.Checkbutton(r1, text="Enviar para IQVIA após processar", variable=self.var_upload,
                        bootstyle="success-round-toggle").pack(side=LEFT, padx=12)
+        self.var_refresh = tb.BooleanVar(value=False)
+        tb.Checkbutton(r1, text="Atualizar do Oracle (ignorar cache)", variable=self.var_refresh,
+                       bootstyle="info-round-toggle").pack(side=LEFT, padx=12)
+        self.var_profile = tb.BooleanVar(value=False)
+        tb.Checkbutton(r1, text="Perfilar etapas", variable=self.var_profile,
+                       bootstyle="secondary-round-toggle").pack(side=LEFT, padx=12)
 
         r2 = tb.Frame(self.tab_run)
         r2.pack(fill=X, pady=6)
@@ -103,6 +117,12 @@ class App(tb.Window):
         lf_db = tb.Labelframe(fc, text="Oracle / Instant Client")
         lf_db.pack(fill=X, padx=4, pady=4)
         self.ic_var = self._row(lf_db, "Instant Client", self.cfg.instant_client_dir, picker=True)
+        r = tb.Frame(lf_db)
+        r.pack(fill=X, pady=2)
+        tb.Label(r, text="Modo do driver:").pack(side=LEFT, padx=(6,6))
+        self.driver_var = tb.StringVar(value=self.cfg.oracle_driver_mode or "thick")
+        tb.Combobox(r, textvariable=self.driver_var, values=["thick", "thin"], state="readonly", width=10).pack(side=LEFT)
+        tb.Label(r, text="(thin: sem Instant Client, Oracle 12.1+)").pack(side=LEFT, padx=6)
         self.host_var = self._row(lf_db, "Host", self.cfg.db_host)
         self.port_var = self._row(lf_db, "Porta", str(self.cfg.db_port))
         self.sid_var = self._row(lf_db, "SID", self.cfg.db_sid)
@@ -125,6 +145,23 @@ class App(tb.Window):
         tb.Checkbutton(lf_pref, text="Validar JSON (leve) antes de salvar", variable=self.val_enabled,
                        bootstyle="warning-round-toggle").pack(anchor="w", padx=6, pady=4)
         self.layout_path_var = self._row(lf_pref, "Layout JSON oficial (opcional)", self.cfg.layout_example_path, picker=True)
+        self.cache_enabled = tb.BooleanVar(value=self.cfg.cache_enabled)
+        tb.Checkbutton(lf_pref, text="Reaproveitar consultas (cache de extração na pasta de saída)", variable=self.cache_enabled,
+                       bootstyle="info-round-toggle").pack(anchor="w", padx=6, pady=4)
+        self.skip_unchanged = tb.BooleanVar(value=self.cfg.skip_unchanged_days)
+        tb.Checkbutton(lf_pref, text="Pular dias sem alterações na origem (manifest.json)", variable=self.skip_unchanged,
+                       bootstyle="info-round-toggle").pack(anchor="w", padx=6, pady=4)
+        self.consistent_read = tb.BooleanVar(value=self.cfg.consistent_read)
+        tb.Checkbutton(lf_pref, text="Leitura consistente das consultas do dia (AS OF SCN)", variable=self.consistent_read,
+                       bootstyle="info-round-toggle").pack(anchor="w", padx=6, pady=4)
+        self.compact_frames = tb.BooleanVar(value=self.cfg.compact_frames)
+        tb.Checkbutton(lf_pref, text="Dados do dia em memória compacta (categorias/downcast)", variable=self.compact_frames,
+                       bootstyle="info-round-toggle").pack(anchor="w", padx=6, pady=4)
+        self.cache_ttl_var = self._row(lf_pref, "Validade do cache (horas)", str(self.cfg.cache_ttl_hours))
+        self.cache_max_var = self._row(lf_pref, "Tamanho máximo do cache (MB)", str(self.cfg.cache_max_mb))
+        self.slow_query_var = self._row(lf_pref, "Consulta lenta a partir de (s)", str(self.cfg.slow_query_seconds))
+        self.workers_var = self._row(lf_pref, "Dias em paralelo (sessões Oracle)", str(self.cfg.parallel_workers))
+        self.query_sessions_var = self._row(lf_pref, "Consultas simultâneas por dia", str(self.cfg.query_sessions))
         tb.Label(lf_pref, text="Tema:").pack(side=LEFT, padx=(6,2))
         self.theme_var = tb.StringVar(value=self.cfg.theme or "darkly")
         self.theme_combo = tb.Combobox(lf_pref, textvariable=self.theme_var, values=sorted(tb.Style().theme_names()), width=22)
@@ -241,6 +278,7 @@ Função: extrair dados do WinThor (Oracle), montar JSON diário no layout IQVIA
     def _save_cfg(self):
         try:
             self.cfg.instant_client_dir = self.ic_var.get().strip()
+            self.cfg.oracle_driver_mode = self.driver_var.get().strip() or "thick"
             self.cfg.db_host = self.host_var.get().strip()
             self.cfg.db_port = int(self.port_var.get().strip() or "1521")
             self.cfg.db_sid = self.sid_var.get().strip()
@@ -258,6 +296,15 @@ Função: extrair dados do WinThor (Oracle), montar JSON diário no layout IQVIA
             self.cfg.upload_default = bool(self.var_upload.get())
             self.cfg.validation_enabled = bool(self.val_enabled.get())
             self.cfg.layout_example_path = self.layout_path_var.get().strip()
+            self.cfg.cache_enabled = bool(self.cache_enabled.get())
+            self.cfg.skip_unchanged_days = bool(self.skip_unchanged.get())
+            self.cfg.consistent_read = bool(self.consistent_read.get())
+            self.cfg.compact_frames = bool(self.compact_frames.get())
+            self.cfg.cache_ttl_hours = float(self.cache_ttl_var.get().strip().replace(",", ".") or "12")
+            self.cfg.cache_max_mb = int(self.cache_max_var.get().strip() or "1024")
+            self.cfg.slow_query_seconds = float(self.slow_query_var.get().strip().replace(",", ".") or "30")
+            self.cfg.parallel_workers = max(1, int(self.workers_var.get().strip() or "1"))
+            self.cfg.query_sessions = max(1, int(self.query_sessions_var.get().strip() or "1"))
             self.cfg.theme = self.theme_var.get().strip() or self.cfg.theme
 
             self.cfg.last_ini = self.dt_ini.entry.get().strip()
@@ -313,12 +360,34 @@ Função: extrair dados do WinThor (Oracle), montar JSON diário no layout IQVIA
         
         try:
             run_period(self.cfg, d0, d1, upload=bool(self.var_upload.get()), logger=logger,
-                       validate=bool(self.val_enabled.get()), example_layout=self.layout_path_var.get().strip())
+                       validate=bool(self.val_enabled.get()), example_layout=self.layout_path_var.get().strip(),
+                       refresh=bool(self.var_refresh.get()), profile=bool(self.var_profile.get()))
         except Exception as e:
             self._log("❌ ERRO: " + str(e))
         finally:
             self.pbar.configure(value=total_days)  # Completar barra
 
+    def _on_first_map(self, event=None):
+        """Fecha o relatório de abertura quando a janela principal aparece na tela"""
+        if event is not None and event.widget is not self:
+            return
+        if self._map_bind is None:
+            return
+        # só o próprio handler: antes do Python 3.13 o unbind com funcid apaga todos os binds da sequência,
+        # então os outros são regravados
+        prefix = f'if {{"[{self._map_bind} '
+        keep = "\n".join(line for line in self.bind("<Map>").split("\n") if line.strip() and not line.startswith(prefix))
+        self.unbind("<Map>", self._map_bind)
+        if keep:
+            self.bind("<Map>", keep)
+        self._map_bind = None
+        report = startup.current()
+        startup.mark("janela visível")
+        report.finish()
+        text = report.render()
+        self._log(text)
+        print(text, file=sys.stderr)
+
     def _on_close(self):
         try:
             self._save_cfg()
@@ -337,25 +406,23 @@ Função: extrair dados do WinThor (Oracle), montar JSON diário no layout IQVIA
             # Conecta ao Oracle e gera o payload para um único dia
             conn = connect_oracle(self.cfg)
             try:
-                # Consultas para um único dia
-                from .db import fetch_df
-                
-                # Carregar dados
-                mov = fetch_df(conn, SQL_MOV, DIA=d0, CODFILIAL=self.cfg.codfilial)
-                dev = fetch_df(conn, SQL_DEVOLUCOES, DIA=d0, CODFILIAL=self.cfg.codfilial)
-                fil = fetch_df(conn, SQL_FILIAL, DIA=d0, CODFILIAL=self.cfg.codfilial)
-                cli = fetch_df(conn, SQL_CLIENTES, DIA=d0, CODFILIAL=self.cfg.codfilial)
-                est = fetch_df(conn, SQL_ESTOQUE, DIA=d0, CODFILIAL=self.cfg.codfilial)
-                produtos_unicos = fetch_df(conn, SQL_PRODUTOS_UNICOS, DIA=d0, CODFILIAL=self.cfg.codfilial)
-                entradas = fetch_df(conn, SQL_ENTRADA_PRODUTOS, DIA=d0, CODFILIAL=self.cfg.codfilial)
-                
-                # Preparar dados de entrada
-                dados_entrada = {}
-                for r in entradas.itertuples(index=False):
-                    dados_entrada[int(getattr(r, "CODPROD"))] = {
-                        "ean": getattr(r, "CODAUXILIAR", "") or "",
-                        "preco": float(getattr(r, "PTABELA", 0.0) or 0.0)
-                    }
+                # Consultas para um único dia (gravadas no cache para reaproveitar no "Processar"),
+                # com o mesmo preparo do run_period: índice de entradas, tabela temporária e SCN do dia
+                refresh = bool(self.var_refresh.get())
+                sources = prepare_sources(conn, self.cfg, d0, d0, refresh=refresh, logger=self._log)
+                scn = current_scn(conn) if self.cfg.consistent_read else None
+                try:
+                    frames = extract_day(conn, self.cfg, d0, self._log, cache=open_cache(self.cfg), refresh=refresh,
+                                         scn=scn, entries=sources["entries"], staged=sources["staged"])
+                except Exception as e:
+                    if scn is None or not is_flashback_error(e):
+                        raise
+                    self._log(f"⚠️ Leitura AS OF SCN falhou ({e}); repetindo o dia sem leitura consistente")
+                    frames = extract_day(conn, self.cfg, d0, self._log, cache=open_cache(self.cfg), refresh=refresh,
+                                         entries=sources["entries"], staged=sources["staged"])
+                mov, dev, fil, cli = frames["mov"], frames["dev"], frames["fil"], frames["cli"]
+                est, produtos_unicos = frames["est"], frames["produtos_unicos"]
+                dados_entrada = build_dados_entrada(frames["entradas"])
                 
                 # Gerar payload
                 payload = build_payload(
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Extração incremental intradiária (marca d'água): <saída>/intradia/F<filial>_<aaaammdd>_*.parquet (+ .json).
+- Para regerar o dia corrente várias vezes (ex.: de hora em hora) sem reler todas as notas desde a meia-noite.
+- Guarda, por filial e dia, as maiores NUMTRANSVENDA/NUMTRANSENT já lidas e o resultado acumulado de
+  SQL_MOV, SQL_DEVOLUCOES, SQL_CLIENTES e da parte de vendas/devoluções do SQL_PRODUTOS_UNICOS.
+- A cada execução, essas consultas leem só as notas entre a marca anterior e a atual (watermark_delta) e o
+  resultado é juntado ao acumulado, na ordem do ORDER BY de cada uma. Filial, estoque e entradas são relidos.
+- Conferência: os agregados das notas/itens até a marca anterior (SQL_WATERMARK) são comparados com os
+  gravados na execução anterior; se mudarem (cancelamento, nota com transação menor gravada depois), o dia
+  é relido por inteiro.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+try:
+    from .db import restore_none
+    from .sql_prisma import SQL_WATERMARK, ORDER_PREFIX
+except ImportError:
+    from aurora_iqvia.db import restore_none
+    from aurora_iqvia.sql_prisma import SQL_WATERMARK, ORDER_PREFIX
+
+STATE_DIRNAME = "intradia"
+KEEP_DAYS = 7
+# (chave do frame, consulta); o acumulado é ordenado pelas colunas ORDEM_* (ORDER BY da consulta, order_columns)
+DELTA_QUERIES = [
+    ("mov", "SQL_MOV"),
+    ("dev", "SQL_DEVOLUCOES"),
+    ("cli", "SQL_CLIENTES"),
+    ("produtos_mov", "SQL_PRODUTOS_MOVIMENTO"),
+]
+# consultas com SELECT DISTINCT sobre a união de vendas e devoluções: a mesma linha pode vir em dois deltas
+DISTINCT = {"cli", "produtos_mov"}
+CHECK_COLUMNS = ["SAIDA_QT", "SAIDA_VLTOTAL", "SAIDA_CANCEL", "ENT_QT", "ENT_VLTOTAL", "MOV_QT", "MOV_SUMQT",
+                 "MOV_CANCEL"]
+
+def _check_row(df) -> Dict[str, float]:
+    row = df.iloc[0] if len(df) else {}
+    return {c: round(float(row.get(c) or 0), 4) for c in CHECK_COLUMNS}
+
+class IntradayState:
+    def __init__(self, out_dir: Path, codfilial: int, dia: date):
+        self.root = Path(out_dir) / STATE_DIRNAME
+        self.stem = f"F{codfilial}_{dia.strftime('%Y%m%d')}"
+        self.meta_path = self.root / f"{self.stem}.json"
+        self.codfilial = codfilial
+        self.dia = dia
+        self.meta: Dict[str, Any] = {"wm_venda": 0, "wm_ent": 0, "check": None, "rows": {}}
+        self.frames: Dict[str, Any] = {}
+        self.last: Dict[str, Any] = {}
+        self._load()
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{self.stem}_{key}.parquet"
+
+    def _load(self):
+        import pandas as pd
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+            frames = {key: restore_none(pd.read_parquet(self._path(key))) for key, _ in DELTA_QUERIES}
+        except Exception:
+            return
+        self.meta.update(meta)
+        self.frames = frames
+
+    def extract(self, fetch: Callable[..., Any], queries: Dict[str, str], refresh: bool = False,
+                logger: Optional[Callable[[str], None]] = None, watermark_sql: str = SQL_WATERMARK) -> Dict[str, Any]:
+        """
+        Lê só as notas novas desde a última marca d'água e junta ao acumulado do dia.
+        Sem estado gravado, com refresh ou se a conferência abaixo da marca divergir, lê o dia inteiro (marca 0).
+
+        Args:
+            fetch: Executa uma consulta: fetch(name, sql, **binds) -> DataFrame (DIA/CODFILIAL/SCN já inclusos)
+            queries: Nome da consulta de DELTA_QUERIES -> SQL já com watermark_delta e order_columns
+                     (e projeção/sargable/AS OF SCN)
+            refresh: Ignora o estado gravado
+            logger: Função para log
+            watermark_sql: SQL_WATERMARK como as consultas (com AS OF SCN na leitura consistente): a marca
+                           e a conferência têm de ver as mesmas notas que os deltas
+
+        Returns:
+            {mov, dev, cli, produtos_mov} acumulados até a marca atual (sem as colunas ORDEM_*)
+        """
+        import pandas as pd
+        head = fetch("SQL_WATERMARK", watermark_sql, WM_VENDA=int(self.meta["wm_venda"]),
+                     WM_ENT=int(self.meta["wm_ent"]))
+        wm_venda = int(head["MAX_VENDA"].iloc[0] or 0) if len(head) else 0
+        wm_ent = int(head["MAX_ENT"].iloc[0] or 0) if len(head) else 0
+        # consultas diferentes (ex.: projeção/devoluções enxutas mudaram na configuração): colunas não batem
+        signature = hashlib.md5("\n".join(queries[name] for _, name in DELTA_QUERIES).encode("utf-8")).hexdigest()
+        full = (refresh or not self.frames or self.meta.get("check") is None
+                or self.meta.get("queries") != signature)
+        if not full and _check_row(head) != self.meta["check"]:
+            if logger:
+                logger("⚠️ Notas do dia alteradas abaixo da marca d'água (cancelamento ou transação gravada "
+                       "fora de ordem); relendo o dia inteiro")
+            full = True
+        if full:
+            self.meta.update(wm_venda=0, wm_ent=0)
+            self.frames = {}
+        # marcas só avançam: uma nota excluída depois da leitura não faz reler o que já foi lido
+        wm_venda, wm_ent = max(wm_venda, int(self.meta["wm_venda"])), max(wm_ent, int(self.meta["wm_ent"]))
+        binds = {"WM_VENDA_INI": int(self.meta["wm_venda"]), "WM_VENDA_FIM": wm_venda,
+                 "WM_ENT_INI": int(self.meta["wm_ent"]), "WM_ENT_FIM": wm_ent}
+        new_rows: Dict[str, int] = {}
+        for key, name in DELTA_QUERIES:
+            delta = fetch(name, queries[name], **binds)
+            new_rows[key] = len(delta)
+            old = self.frames.get(key)
+            if old is None or not len(old):
+                df = delta
+            elif not len(delta):
+                df = old
+            else:
+                df = pd.concat([old, delta[list(old.columns)]], ignore_index=True)
+                if key in DISTINCT:
+                    df = df.drop_duplicates()
+                # estável: no empate, o que já estava (transação menor) vem antes
+                df = df.sort_values([c for c in df.columns if c.startswith(ORDER_PREFIX)], kind="stable")
+            self.frames[key] = df.reset_index(drop=True)
+
+        tail = fetch("SQL_WATERMARK", watermark_sql, WM_VENDA=wm_venda, WM_ENT=wm_ent)
+        self.meta.update(wm_venda=wm_venda, wm_ent=wm_ent, check=_check_row(tail), queries=signature,
+                         rows={key: len(df) for key, df in self.frames.items()},
+                         updated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self._save()
+        self.last = {"full": full, "wm_venda": wm_venda, "wm_ent": wm_ent, "new_rows": new_rows}
+        if logger:
+            logger(f"💧 Marca d'água do dia: {'leitura completa' if full else 'só notas novas'} até "
+                   f"NUMTRANSVENDA {wm_venda} / NUMTRANSENT {wm_ent}; {new_rows['mov']} venda(s) e "
+                   f"{new_rows['dev']} devolução(ões) nova(s), {len(self.frames['mov'])} venda(s) no dia")
+        return {key: df.drop(columns=[c for c in df.columns if c.startswith(ORDER_PREFIX)])
+                for key, df in self.frames.items()}
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        for key, df in self.frames.items():
+            path = self._path(key)
+            tmp = path.with_name(path.name + ".tmp")
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, path)
+        tmp = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.meta, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.meta_path)
+        self._prune()
+
+    def _prune(self):
+        # estado de dias antigos não é mais regerado de hora em hora
+        limit = (self.dia - timedelta(days=KEEP_DAYS)).strftime("%Y%m%d")
+        for path in self.root.glob(f"F{self.codfilial}_*"):
+            stamp = path.name.split("_")[1][:8]
+            if stamp.isdigit() and stamp < limit:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 from typing import Optional, Dict, Any
-import requests
+# requests é importado sob demanda (primeiro uso), para não atrasar a abertura da janela
 
 def _looks_like_jwt(s: str) -> bool:
     """
@@ -32,6 +32,7 @@ def get_token(token_url: str, client_id: str, client_secret: str, logger=print,
     Returns:
         Token JWT ou None se falhar
     """
+    import requests
     payload = {"client_id": client_id.lower(), "client_secret": client_secret}
     # Tentativa JSON
     try:
@@ -88,6 +89,7 @@ def upload_zip(upload_url: str, zip_path, token: str, logger=print) -> Dict[str,
     Returns:
         Resposta da API em formato dict
     """
+    import requests
     headers = {"Authorization": f"Bearer {token}"}
     with open(zip_path, "rb") as f:
         files = {"file": (zip_path.name, f, "application/zip")}
@@ -110,6 +112,7 @@ def check_upload_status(upload_url_base: str, guid: str, token: str) -> Dict[str
     Returns:
         Status do upload em formato dict
     """
+    import requests
     status_url = f"{upload_url_base}/status/{guid}"
     headers = {"Authorization": f"Bearer {token}"}
     
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Estoque histórico por movimentação (stock_mode = "ledger"), para backfills de vários dias.
+- O SQL_ESTOQUE chama o PKG_ESTOQUE.ESTOQUE_DISPONIVEL para cada produto do PCEST em cada dia
+  (um mês = 30 × produtos chamadas PL/SQL).
+- Aqui o saldo é lido uma vez só, no último dia do período (SQL_ESTOQUE_SALDO), junto com o saldo das
+  movimentações do PCMOV por produto/dia no período (SQL_ESTOQUE_MOVIMENTO, uma consulta).
+- Saldo no dia D = saldo no último dia - movimentações depois de D (recuado em memória, dia a dia).
+- Saldo e movimentações lidos no mesmo SCN (AS OF SCN), quando a leitura consistente está ligada.
+- Conferência por amostra: a cada dia, alguns produtos são comparados com o valor do PKG_ESTOQUE
+  (SQL_ESTOQUE_AMOSTRA); na primeira divergência, esse dia e o restante do período voltam para o SQL_ESTOQUE
+  (o PCMOV não registra reservas e bloqueios: uma divergência tende a se repetir nos outros dias).
+"""
+
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Callable
+
+try:
+    from .db import fetch_df
+    from .sql_prisma import (SQL_ESTOQUE_SALDO, SQL_ESTOQUE_MOVIMENTO, SQL_ESTOQUE_AMOSTRA,
+                             QUERY_TYPES, in_batches, as_of_scn)
+except ImportError:
+    from aurora_iqvia.db import fetch_df
+    from aurora_iqvia.sql_prisma import (SQL_ESTOQUE_SALDO, SQL_ESTOQUE_MOVIMENTO, SQL_ESTOQUE_AMOSTRA,
+                                         QUERY_TYPES, in_batches, as_of_scn)
+
+COLUMNS = ["CODFILIAL", "CODPROD", "CODAUXILIAR", "NBM", "DESCRICAO", "CODFORNEC", "FORNECEDOR", "PTABELA",
+           "DT", "ESTOQUEATUAL"]
+# arredonda antes do TRUNC: a soma de quantidades fracionadas não pode virar 4,9999 → 4
+DECIMALS = 6
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+class StockLedger:
+    def __init__(self, codfilial: int, d0: date, d1: date, sample: int = 20):
+        self.codfilial = codfilial
+        self.d0 = _day(d0)
+        self.d1 = _day(d1)
+        self.sample = max(0, int(sample))
+        self.saldo = None
+        self.after = None
+        self.days: List[date] = []
+        self.checks: Dict[str, Dict[str, Any]] = {}
+        self.scn: Optional[int] = None
+        # dia da primeira divergência na conferência: dali em diante, SQL_ESTOQUE
+        self.disabled: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        """Se o estoque ainda sai do saldo recuado (nenhuma divergência na conferência até agora)."""
+        return self.saldo is not None and self.disabled is None
+
+    def load(self, conn, stats=None, logger: Optional[Callable[[str], None]] = None,
+             scn: Optional[int] = None) -> int:
+        """
+        Lê o saldo no último dia do período e as movimentações dos dias seguintes ao primeiro.
+
+        Args:
+            conn: Conexão com o banco de dados
+            stats: QueryStats para instrumentar as consultas (opcional)
+            logger: Função para log
+            scn: Lê as duas consultas AS OF SCN (mesmo instante), se informado
+
+        Returns:
+            Linhas de movimentação (produto/dia) lidas
+        """
+        import numpy as np
+        import pandas as pd
+        q_saldo, q_mov = SQL_ESTOQUE_SALDO, SQL_ESTOQUE_MOVIMENTO
+        if scn:
+            q_saldo, q_mov = as_of_scn(q_saldo), as_of_scn(q_mov)
+        saldo = fetch_df(conn, q_saldo, query_name="SQL_ESTOQUE_SALDO", stats=stats,
+                         types=QUERY_TYPES["SQL_ESTOQUE_SALDO"], DIA=self.d1, CODFILIAL=self.codfilial, SCN=scn)
+        mov = fetch_df(conn, q_mov, query_name="SQL_ESTOQUE_MOVIMENTO", stats=stats,
+                       types=QUERY_TYPES["SQL_ESTOQUE_MOVIMENTO"], CODFILIAL=self.codfilial,
+                       DIA_INI=self.d0, DIA_FIM=self.d1, SCN=scn)
+        self.scn = scn
+        self.saldo = saldo.drop_duplicates("CODPROD").set_index("CODPROD", drop=False)
+        # movimentação por produto (linhas) e dia (colunas), acumulada do fim para o começo:
+        # coluna D = tudo o que entrou/saiu depois do fim do dia D
+        self.days = [self.d0 + timedelta(days=i) for i in range((self.d1 - self.d0).days + 1)]
+        after = pd.DataFrame(0.0, index=self.saldo.index, columns=range(len(self.days)))
+        if len(mov):
+            dias = pd.to_datetime(mov["DIA"]).dt.date
+            pos = dias.map(lambda d: (d - self.d0).days - 1)
+            ok = mov["CODPROD"].isin(self.saldo.index) & (pos >= 0) & (pos < len(self.days))
+            net = (mov[ok].assign(POS=pos[ok]).pivot_table(index="CODPROD", columns="POS", values="QT", aggfunc="sum")
+                   .reindex(index=self.saldo.index, columns=range(len(self.days)), fill_value=0.0).fillna(0.0))
+            after = pd.DataFrame(np.cumsum(net.to_numpy()[:, ::-1], axis=1)[:, ::-1], index=net.index,
+                                 columns=net.columns)
+        self.after = after
+        if logger:
+            logger(f"📦 Estoque por movimentação: saldo de {len(self.saldo)} produto(s) em "
+                   f"{self.d1.strftime('%d/%m/%Y')} e {len(mov)} movimento(s) produto/dia no período")
+        return len(mov)
+
+    def quantities(self, dia: date):
+        """
+        Saldo truncado de todos os produtos no fim do dia (o que o PKG_ESTOQUE devolveria).
+
+        Args:
+            dia: Dia do período
+
+        Returns:
+            Series CODPROD -> quantidade (int64, inclusive zeros e negativos)
+        """
+        import numpy as np
+        import pandas as pd
+        i = (_day(dia) - self.d0).days
+        if self.saldo is None or not 0 <= i < len(self.days):
+            raise ValueError(f"Dia fora do período do estoque por movimentação: {dia}")
+        qt = self.saldo["SALDO"].to_numpy(dtype="float64") - self.after[i].to_numpy()
+        return pd.Series(np.trunc(np.round(qt, DECIMALS)).astype("int64"), index=self.saldo.index)
+
+    def frame(self, dia: date):
+        """
+        Estoque do dia no formato do SQL_ESTOQUE (só os produtos com saldo > 0, por CODPROD).
+
+        Args:
+            dia: Dia do período
+
+        Returns:
+            DataFrame com as colunas do SQL_ESTOQUE
+        """
+        import pandas as pd
+        qt = self.quantities(dia)
+        keep = (qt > 0).to_numpy()
+        out = self.saldo.loc[keep].drop(columns="SALDO").reset_index(drop=True)
+        out["DT"] = pd.Timestamp(_day(dia))
+        out["ESTOQUEATUAL"] = qt.to_numpy()[keep]
+        return out[COLUMNS]
+
+    def sample_products(self, dia: date) -> List[int]:
+        """
+        Produtos conferidos no dia: metade entre os que movimentaram depois do dia (onde o recuo
+        pode errar), o resto entre todos; escolha fixa por dia (mesma amostra ao refazer).
+        """
+        import numpy as np
+        if not self.sample or self.saldo is None or not len(self.saldo):
+            return []
+        i = (_day(dia) - self.d0).days
+        rng = np.random.default_rng(_day(dia).toordinal())
+        codprods = self.saldo["CODPROD"].to_numpy()
+        moved = codprods[(self.after[i].to_numpy() != 0)]
+        pick = list(rng.choice(moved, min(len(moved), self.sample // 2 or 1), replace=False)) if len(moved) else []
+        rest = np.setdiff1d(codprods, pick)
+        n = min(len(rest), self.sample - len(pick))
+        if n > 0:
+            pick += list(rng.choice(rest, n, replace=False))
+        return sorted(int(c) for c in pick)
+
+    def reconcile(self, fetch: Callable[..., Any], dia: date,
+                  logger: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Compara o saldo recuado com o PKG_ESTOQUE numa amostra de produtos do dia.
+
+        Args:
+            fetch: Executa uma consulta do dia: fetch(sql, **binds) -> DataFrame (SQL_ESTOQUE_AMOSTRA)
+            dia: Dia do período
+            logger: Função para log
+
+        Returns:
+            {sample, diff, examples}; diff > 0 = o dia (e o restante do período) deve usar o SQL_ESTOQUE
+        """
+        import pandas as pd
+        ids = self.sample_products(dia)
+        parts = [fetch(SQL_ESTOQUE_AMOSTRA.replace("{CODPRODS}", codprods), **binds)
+                 for codprods, binds in in_batches(ids)]
+        plsql = (pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["CODPROD", "ESTOQUEATUAL"]))
+        plsql = {int(c): int(q) for c, q in zip(plsql["CODPROD"], plsql["ESTOQUEATUAL"])}
+        ledger = self.quantities(dia)
+        diffs = [(c, int(ledger.get(c, 0)), plsql.get(c)) for c in ids if plsql.get(c) != int(ledger.get(c, 0))]
+        check = {"sample": len(ids), "diff": len(diffs),
+                 "examples": [{"CODPROD": c, "ledger": l, "plsql": p} for c, l, p in diffs[:5]]}
+        self.checks[_day(dia).strftime("%Y-%m-%d")] = check
+        if diffs and self.disabled is None:
+            self.disabled = _day(dia).strftime("%Y-%m-%d")
+        if logger and diffs:
+            ex = ", ".join(f"{c}: {l} × {p}" for c, l, p in diffs[:5])
+            logger(f"⚠️ Estoque por movimentação diverge do PKG_ESTOQUE em {len(diffs)} de {len(ids)} "
+                   f"produto(s) da amostra ({ex}); usando SQL_ESTOQUE no dia e no restante do período")
+        elif logger:
+            logger(f"🔎 Estoque por movimentação conferido com o PKG_ESTOQUE: {len(ids)} produto(s) da amostra")
+        return check
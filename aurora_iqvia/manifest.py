@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Manifesto das execuções (out_dir/manifest.json).
+- Um registro por filial/dia: impressão digital da origem, versão do layout, hash do payload,
+  linhas por seção, tempos por etapa e arquivos gerados.
+- Na reexecução, dias com a mesma impressão digital, versão de layout e configuração que afeta o payload
+  (e arquivos ainda presentes) não são refeitos.
+- A impressão digital só cobre PCNFSAID/PCNFENT/PCMOV: alterações de cadastro (PCPRODUT, PCCLIENT, PCFILIAL)
+  e de estoque que não passam pelo PCMOV (reservas, bloqueios) não são detectadas.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+MANIFEST_FILE = "manifest.json"
+
+def fingerprint_hash(row: Dict[str, Any]) -> str:
+    """
+    Hash estável dos agregados de origem (SQL_FINGERPRINT) de um dia.
+
+    Args:
+        row: Colunas do SQL_FINGERPRINT (nome -> valor)
+
+    Returns:
+        Hash hexadecimal
+    """
+    norm = {str(k).upper(): (float(v) if v is not None else None) for k, v in row.items()}
+    return hashlib.sha1(json.dumps(norm, sort_keys=True).encode("utf-8")).hexdigest()
+
+# configurações que mudam o conteúdo do payload (ou a forma de ler a origem)
+PAYLOAD_SETTINGS = ("codfilial", "iqvia_client_id", "codiqvia", "project_columns", "lean_devolucoes",
+                    "stock_mode", "entry_lookup", "sargable_queries", "stage_day_keys", "intraday_watermark",
+                    "fetch_backend", "compact_frames")
+
+def config_hash(cfg) -> str:
+    """
+    Hash das configurações de PAYLOAD_SETTINGS: dia gerado com outra configuração é refeito.
+
+    Args:
+        cfg: AppConfig
+
+    Returns:
+        Hash hexadecimal
+    """
+    norm = {k: getattr(cfg, k, None) for k in PAYLOAD_SETTINGS}
+    return hashlib.sha1(json.dumps(norm, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class RunManifest:
+    def __init__(self, out_dir: Path):
+        self.path = Path(out_dir) / MANIFEST_FILE
+        self.data: Dict[str, Any] = {"days": {}}
+        if self.path.is_file():
+            try:
+                self.data = json.loads(self.path.read_text(encoding="utf-8"))
+                self.data.setdefault("days", {})
+            except Exception:
+                self.data = {"days": {}}
+
+    @staticmethod
+    def _key(codfilial: int, dia: date) -> str:
+        return f"{codfilial}:{dia.strftime('%Y-%m-%d')}"
+
+    def get(self, codfilial: int, dia: date) -> Optional[Dict[str, Any]]:
+        return self.data["days"].get(self._key(codfilial, dia))
+
+    def is_current(self, codfilial: int, dia: date, fingerprint: str, layout_version: str,
+                   output_format: str = "both", upload: bool = False, config: Optional[str] = None) -> bool:
+        """
+        Indica se o dia já foi gerado com a mesma origem, layout e configuração, e se existem
+        todos os arquivos que a execução atual precisa.
+
+        Args:
+            codfilial: Código da filial
+            dia: Dia de referência
+            fingerprint: Hash da impressão digital atual da origem
+            layout_version: Versão atual do layout
+            output_format: Formato da execução atual ("both" exige JSON e ZIP, "json" o JSON, "zip" o ZIP)
+            upload: Se a execução atual envia (exige o ZIP)
+            config: Hash das configurações que afetam o payload (config_hash); None = não compara
+
+        Returns:
+            True se o dia pode ser pulado
+        """
+        entry = self.get(codfilial, dia)
+        if not entry:
+            return False
+        if entry.get("fingerprint") != fingerprint or entry.get("layout_version") != layout_version:
+            return False
+        if config is not None and entry.get("config") != config:
+            return False
+        needed = []
+        if output_format in ("both", "json"):
+            needed.append("json")
+        if output_format in ("both", "zip") or upload:
+            needed.append("zip")
+        files = [entry.get(k) for k in needed]
+        return bool(files) and all(f and Path(f).is_file() for f in files)
+
+    def record(self, codfilial: int, dia: date, **info):
+        entry = dict(info)
+        entry["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.data["days"][self._key(codfilial, dia)] = entry
+
+    def update(self, codfilial: int, dia: date, **info):
+        entry = self.data["days"].setdefault(self._key(codfilial, dia), {})
+        entry.update(info)
+
+    def save(self):
+        """Grava o manifesto de forma atômica (arquivo temporário + rename)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Planos de execução das consultas de sql_prisma (EXPLAIN PLAN + DBMS_XPLAN), sem executar as consultas.
+
+    python -m aurora_iqvia plan --dia 01/07/2025 --filial 1
+    python -m aurora_iqvia plan --dia 01/07/2025 --query SQL_MOV --query SQL_FINGERPRINT
+
+- Cada SQL_* é explicado na forma original e, quando houver `TRUNC(coluna) = :DIA`, na forma sargable
+  (sql_prisma.sargable), lado a lado. O plano não depende dos binds: o EXPLAIN PLAN não espia os valores
+  (todo bind vira VARCHAR2 de valor desconhecido), então eles vão vazios. O dia só identifica o relatório.
+- Marca os acessos completos (TABLE ACCESS FULL, INDEX FULL/FAST FULL SCAN) com a cardinalidade estimada.
+- Relatório em <saída>/plans/plans_<data>_<hora>.txt (texto do DBMS_XPLAN) e .json (resumo).
+- Exige um PLAN_TABLE acessível (padrão no Oracle 10g+); o DBMS_XPLAN é opcional (sem ele, o plano sai do PLAN_TABLE).
+- --compare: executa a consulta original e a variante enxuta (VARIANTS) no dia e compara tempo e linhas.
+"""
+
+from __future__ import annotations
+import json
+import re
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+
+try:
+    from .db import fetch_df
+    from .sql_prisma import (QUERIES, SQL_FINGERPRINT, SQL_ENTRADA_DELTA, SQL_ENTRADA_CONFERE,
+                             SQL_ENTRADA_DIAS, SQL_ENTRADA_PRODUTOS_ALVO, SQL_ESTOQUE_SALDO, SQL_ESTOQUE_MOVIMENTO,
+                             SQL_ESTOQUE_AMOSTRA, SQL_DEVOLUCOES_ENXUTA, sargable)
+except ImportError:
+    from aurora_iqvia.db import fetch_df
+    from aurora_iqvia.sql_prisma import (QUERIES, SQL_FINGERPRINT, SQL_ENTRADA_DELTA, SQL_ENTRADA_CONFERE,
+                                         SQL_ENTRADA_DIAS, SQL_ENTRADA_PRODUTOS_ALVO, SQL_ESTOQUE_SALDO,
+                                         SQL_ESTOQUE_MOVIMENTO, SQL_ESTOQUE_AMOSTRA, SQL_DEVOLUCOES_ENXUTA, sargable)
+
+PLANS_DIRNAME = "plans"
+# consultas explicadas: as do dia, a impressão digital e as auxiliares (índice de entradas, estoque por movimentação)
+PLAN_QUERIES = dict(QUERIES, SQL_FINGERPRINT=SQL_FINGERPRINT, SQL_ENTRADA_DELTA=SQL_ENTRADA_DELTA,
+                    SQL_ENTRADA_CONFERE=SQL_ENTRADA_CONFERE, SQL_ENTRADA_DIAS=SQL_ENTRADA_DIAS,
+                    SQL_ENTRADA_PRODUTOS_ALVO=SQL_ENTRADA_PRODUTOS_ALVO.replace("{CODPRODS}", ":P0"),
+                    SQL_ESTOQUE_SALDO=SQL_ESTOQUE_SALDO, SQL_ESTOQUE_MOVIMENTO=SQL_ESTOQUE_MOVIMENTO,
+                    SQL_ESTOQUE_AMOSTRA=SQL_ESTOQUE_AMOSTRA.replace("{CODPRODS}", ":P0"),
+                    SQL_DEVOLUCOES_ENXUTA=SQL_DEVOLUCOES_ENXUTA)
+# variantes enxutas: consulta original -> (nome, SQL) com a mesma saída nas colunas em comum
+VARIANTS = {"SQL_DEVOLUCOES": ("SQL_DEVOLUCOES_ENXUTA", SQL_DEVOLUCOES_ENXUTA)}
+
+SQL_PLAN_ROWS = """
+SELECT ID, PARENT_ID, DEPTH, OPERATION, OPTIONS, OBJECT_NAME, CARDINALITY, COST
+FROM PLAN_TABLE
+WHERE STATEMENT_ID = :ID
+ORDER BY ID
+"""
+SQL_XPLAN = "SELECT PLAN_TABLE_OUTPUT FROM TABLE(DBMS_XPLAN.DISPLAY('PLAN_TABLE', :ID, 'TYPICAL'))"
+SQL_PLAN_DELETE = "DELETE FROM PLAN_TABLE WHERE STATEMENT_ID = :ID"
+
+_RE_BIND = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+def placeholders(sql: str) -> Dict[str, Any]:
+    """Binds do texto com valor vazio: o EXPLAIN PLAN não os lê, mas o driver exige todos."""
+    return {name: None for name in dict.fromkeys(_RE_BIND.findall(sql))}
+
+def is_full_scan(operation: Optional[str], options: Optional[str]) -> bool:
+    operation, options = (operation or "").upper(), (options or "").upper()
+    if operation == "TABLE ACCESS":
+        return "FULL" in options
+    return operation == "INDEX" and options in ("FULL SCAN", "FAST FULL SCAN")
+
+def _render(rows: List[Dict[str, Any]]) -> List[str]:
+    """Plano indentado a partir do PLAN_TABLE (quando o DBMS_XPLAN não está disponível)."""
+    lines = []
+    for r in rows:
+        op = " ".join(x for x in (r["OPERATION"], r["OPTIONS"]) if x)
+        extra = f" {r['OBJECT_NAME']}" if r["OBJECT_NAME"] else ""
+        card = f" (linhas {r['CARDINALITY']}, custo {r['COST']})" if r["CARDINALITY"] is not None else ""
+        flag = "  <-- acesso completo" if is_full_scan(r["OPERATION"], r["OPTIONS"]) else ""
+        lines.append(f"{r['ID']:>3} {'  ' * (r['DEPTH'] or 0)}{op}{extra}{card}{flag}")
+    return lines
+
+def explain(conn, name: str, sql: str, binds: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Explica uma consulta (EXPLAIN PLAN) e lê o plano do PLAN_TABLE.
+
+    Args:
+        conn: Conexão com o banco de dados
+        name: Nome da consulta (vira o STATEMENT_ID)
+        sql: Texto da consulta
+        binds: Binds do texto (placeholders); os valores não mudam o plano
+
+    Returns:
+        {cost, full_scans: [{object, operation, cardinality}], plan: [linhas]}
+    """
+    statement_id = f"GDDI_{name}"[:30]
+    binds = {k: v for k, v in binds.items() if re.search(rf":{k}\b", sql)}
+    cur = conn.cursor()
+    try:
+        cur.execute(SQL_PLAN_DELETE, {"ID": statement_id})
+        cur.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}", binds)
+        cur.execute(SQL_PLAN_ROWS, {"ID": statement_id})
+        cols = [c[0] for c in cur.description]
+        rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+        try:
+            cur.execute(SQL_XPLAN, {"ID": statement_id})
+            text = [r[0] for r in cur.fetchall()]
+        except Exception:
+            text = _render(rows)
+        cur.execute(SQL_PLAN_DELETE, {"ID": statement_id})
+        if hasattr(conn, "commit"):
+            conn.commit()
+    finally:
+        cur.close()
+    full = [{"object": r["OBJECT_NAME"], "operation": f"{r['OPERATION']} {r['OPTIONS']}",
+             "cardinality": r["CARDINALITY"]} for r in rows if is_full_scan(r["OPERATION"], r["OPTIONS"])]
+    return {"cost": rows[0]["COST"] if rows else None, "full_scans": full, "plan": text}
+
+def capture_plans(conn, dia: date, codfilial: int, names: Optional[List[str]] = None,
+                  logger: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Explica cada consulta na forma original e na sargable (quando muda o texto).
+
+    Args:
+        conn: Conexão com o banco de dados
+        dia: Dia do relatório (o plano não depende dos binds)
+        codfilial: Filial do relatório
+        names: Consultas a explicar (padrão: todas de PLAN_QUERIES)
+        logger: Função para log
+
+    Returns:
+        Documento {dia, codfilial, queries: {nome: {original, sargable?}}}
+    """
+    log = logger or (lambda m: None)
+    doc: Dict[str, Any] = {"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                           "dia": dia.strftime("%Y-%m-%d"), "codfilial": codfilial, "queries": {}}
+    for name in names or list(PLAN_QUERIES):
+        if name not in PLAN_QUERIES:
+            raise ValueError(f"Consulta desconhecida: {name} (use {', '.join(PLAN_QUERIES)})")
+        sql = PLAN_QUERIES[name]
+        variants = {"original": sql}
+        if sargable(sql) != sql:
+            variants["sargable"] = sargable(sql)
+        out: Dict[str, Any] = {}
+        for variant, text in variants.items():
+            try:
+                out[variant] = explain(conn, name if variant == "original" else name + "_S", text,
+                                       placeholders(text))
+            except Exception as e:
+                out[variant] = {"error": str(e), "full_scans": [], "plan": []}
+        doc["queries"][name] = out
+        log(f"🔍 {name}: " + " | ".join(
+            f"{v} {len(r['full_scans'])} acesso(s) completo(s)" + (f", custo {r['cost']}" if r.get("cost") is not None else "")
+            if "error" not in r else f"{v} erro: {r['error']}" for v, r in out.items()))
+    return doc
+
+def render(doc: Dict[str, Any]) -> str:
+    lines = [f"Planos de execução {doc['timestamp']} (dia {doc['dia']}, filial {doc['codfilial']})"]
+    for name, out in doc["queries"].items():
+        for variant, r in out.items():
+            lines.append("")
+            lines.append(f"=== {name} [{variant}]")
+            if "error" in r:
+                lines.append(f"erro: {r['error']}")
+                continue
+            for f in r["full_scans"]:
+                lines.append(f"!! acesso completo: {f['operation']} {f['object'] or ''} (linhas {f['cardinality']})")
+            lines.extend(r["plan"])
+    return "\n".join(lines)
+
+def save_report(doc: Dict[str, Any], out_dir: Path) -> Path:
+    """Grava o relatório (.txt) e o resumo sem os planos (.json) em <saída>/plans; devolve o .txt."""
+    root = Path(out_dir) / PLANS_DIRNAME
+    root.mkdir(parents=True, exist_ok=True)
+    stem = f"plans_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    txt = root / f"{stem}.txt"
+    txt.write_text(render(doc), encoding="utf-8")
+    brief = dict(doc, queries={n: {v: {k: x for k, x in r.items() if k != "plan"} for v, r in out.items()}
+                              for n, out in doc["queries"].items()})
+    (root / f"{stem}.json").write_text(json.dumps(brief, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    return txt
+
+def _row_counts(df, columns: List[str]):
+    """Quantas vezes cada linha (só as colunas dadas, como texto) aparece."""
+    if not len(df):
+        return {}
+    keys = df[columns].astype(object).where(df[columns].notna(), None).map(repr).agg("|".join, axis=1)
+    return keys.value_counts().to_dict()
+
+def compare_variant(conn, name: str, dia: date, codfilial: int, repeat: int = 3,
+                    logger: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Executa a consulta original e a variante enxuta no dia e compara tempo e resultado.
+
+    Args:
+        conn: Conexão com o banco de dados
+        name: Consulta original com variante em VARIANTS (ex.: SQL_DEVOLUCOES)
+        dia: Dia dos binds
+        codfilial: Filial dos binds
+        repeat: Execuções de cada uma (vale o melhor tempo)
+        logger: Função para log
+
+    Returns:
+        {dia, rows, best_s, only_original, only_variant, same_count, same_rows, same_distinct}; only_* conta
+        linhas (nas colunas em comum) que sobram de um lado; same_distinct ignora repetições idênticas
+    """
+    import time
+    if name not in VARIANTS:
+        raise ValueError(f"Consulta sem variante: {name} (use {', '.join(VARIANTS)})")
+    variant, lean_sql = VARIANTS[name]
+    frames, best = {}, {}
+    for label, sql in (("original", QUERIES[name]), ("variant", lean_sql)):
+        times = []
+        for _ in range(max(1, repeat)):
+            t = time.perf_counter()
+            frames[label] = fetch_df(conn, sql, DIA=dia, CODFILIAL=codfilial)
+            times.append(time.perf_counter() - t)
+        best[label] = round(min(times), 4)
+    common = [c for c in frames["original"].columns if c in set(frames["variant"].columns)]
+    a, b = _row_counts(frames["original"], common), _row_counts(frames["variant"], common)
+    only_a = sum(max(0, n - b.get(k, 0)) for k, n in a.items())
+    only_b = sum(max(0, n - a.get(k, 0)) for k, n in b.items())
+    out = {
+        "query": name, "variant": variant, "dia": dia.strftime("%Y-%m-%d"),
+        "rows": {"original": len(frames["original"]), "variant": len(frames["variant"])},
+        "best_s": best, "columns": len(common),
+        "only_original": only_a, "only_variant": only_b,
+        "same_count": len(frames["original"]) == len(frames["variant"]),
+        "same_rows": only_a == 0 and only_b == 0, "same_distinct": set(a) == set(b),
+    }
+    if logger:
+        detail = ("mesmas linhas distintas, repetições diferentes" if out["same_distinct"] else
+                  f"{only_a} linha(s) só na original, {only_b} só na variante")
+        status = ("✅ mesmas linhas" if out["same_rows"] else
+                  f"❌ quantidade de linhas diferente; {detail}" if not out["same_count"] else
+                  f"⚠️ {detail}" if out["same_distinct"] else f"❌ {detail}")
+        logger(f"⚖️ {name} × {variant} em {out['dia']}: {best['original']:.3f}s × {best['variant']:.3f}s, "
+               f"{out['rows']['original']} × {out['rows']['variant']} linha(s); {status}")
+    return out
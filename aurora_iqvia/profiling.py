@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Perfilamento opcional por dia e por etapa (build_payload, validate_payload, save_json, create_daily_zip...).
+- cProfile: dump binário <stem>.<etapa>.prof (abre com snakeviz / pstats) e as N funções mais caras.
+- tracemalloc: pico de memória da etapa e os N maiores pontos de alocação.
+- Resumo em <stem>.profile.json, ao lado do JSON/ZIP do dia.
+"""
+
+from __future__ import annotations
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+def _top_functions(profile: cProfile.Profile, top_n: int) -> List[Dict[str, Any]]:
+    st = pstats.Stats(profile, stream=io.StringIO())
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _callers) in st.stats.items():
+        rows.append({
+            "func": f"{Path(filename).name}:{line}({func})",
+            "ncalls": nc,
+            "tottime": round(tt, 6),
+            "cumtime": round(ct, 6),
+        })
+    rows.sort(key=lambda r: r["cumtime"], reverse=True)
+    return rows[:top_n]
+
+class StageProfiler:
+    def __init__(self, out_dir: Path, stem: str, top_n: int = 25):
+        self.out_dir = Path(out_dir)
+        self.stem = stem
+        self.top_n = int(top_n)
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Perfila o bloco como uma etapa (tempo, cProfile e tracemalloc).
+
+        Args:
+            name: Nome da etapa (usado no nome do .prof)
+        """
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        profile = cProfile.Profile()
+        t = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - t
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            if started_tracing:
+                tracemalloc.stop()
+            prof_path = self.out_dir / f"{self.stem}.{name}.prof"
+            try:
+                profile.dump_stats(str(prof_path))
+            except OSError:
+                prof_path = None
+            self.stages[name] = {
+                "seconds": round(elapsed, 4),
+                "mem_peak_mb": round((peak - base) / 1_048_576, 3),
+                "mem_retained_mb": round((current - base) / 1_048_576, 3),
+                "prof": prof_path.name if prof_path else None,
+                "top_functions": _top_functions(profile, self.top_n),
+                "top_allocations": [
+                    {"where": str(s.traceback[0]), "size_kb": round(s.size / 1024, 1), "count": s.count}
+                    for s in snapshot.statistics("lineno")[:self.top_n]
+                ],
+            }
+
+    def write(self) -> Path:
+        """
+        Grava o resumo de todas as etapas do dia.
+
+        Returns:
+            Path do <stem>.profile.json
+        """
+        path = self.out_dir / f"{self.stem}.profile.json"
+        path.write_text(json.dumps({"stem": self.stem, "stages": self.stages}, ensure_ascii=False, indent=2),
+                        encoding="utf-8")
+        return path
+
+    def summary_line(self) -> str:
+        parts = [f"{k} {v['seconds']:.2f}s/{v['mem_peak_mb']:.1f}MB" for k, v in self.stages.items()]
+        return " | ".join(parts)
+
+def stage(profiler: Optional[StageProfiler], name: str):
+    """Contexto da etapa: perfila se houver profiler; caso contrário, não faz nada."""
+    return profiler.stage(name) if profiler is not None else nullcontext()
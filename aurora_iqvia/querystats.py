@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentação das consultas ao Oracle (SQL_MOV, SQL_ESTOQUE, ...).
+- Por consulta: tempo de execute, tempo de fetch, linhas, bytes e round trips.
+- Bytes/round trips vêm do V$MYSTAT (estatísticas da sessão) quando o usuário tem acesso;
+  caso contrário, os round trips são estimados pelo arraysize do cursor e os bytes ficam em branco.
+- Consultas acima do limite vão para <saída>/slow_queries.log, com os binds.
+- Com um Throttle (throttle.py), cada consulta registrada também alimenta a pausa adaptativa.
+"""
+
+from __future__ import annotations
+import json
+import math
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+
+SLOW_LOG = "slow_queries.log"
+
+SQL_SESSION_STATS = """
+SELECT N.NAME, S.VALUE
+FROM V$MYSTAT S
+INNER JOIN V$STATNAME N ON N.STATISTIC# = S.STATISTIC#
+WHERE N.NAME IN ('SQL*Net roundtrips to/from client', 'bytes sent via SQL*Net to client')
+"""
+STAT_KEYS = {"SQL*Net roundtrips to/from client": "round_trips", "bytes sent via SQL*Net to client": "bytes"}
+
+def _bind_repr(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    return v
+
+class QueryStats:
+    def __init__(self, out_dir: Optional[Path] = None, slow_seconds: float = 10.0,
+                 logger: Optional[Callable[[str], None]] = None, session_stats: bool = True, throttle=None):
+        self.out_dir = Path(out_dir) if out_dir else None
+        # controle de carga: fetch_df reserva a vez da consulta nele e record() informa o tempo medido
+        self.throttle = throttle
+        self.slow_seconds = float(slow_seconds)
+        self.logger = logger
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        # por conexão: None = não testado, False = V$MYSTAT indisponível, dict = custo da própria leitura
+        self._session: Dict[int, Any] = {} if session_stats else None
+
+    def _read_session(self, conn) -> Optional[Dict[str, int]]:
+        cur = conn.cursor()
+        try:
+            cur.execute(SQL_SESSION_STATS)
+            return {STAT_KEYS[name]: int(value) for name, value in cur.fetchall() if name in STAT_KEYS}
+        finally:
+            cur.close()
+
+    def snapshot(self, conn) -> Optional[Dict[str, int]]:
+        """
+        Lê as estatísticas da sessão antes de uma consulta.
+
+        Returns:
+            {round_trips, bytes} ou None se o V$MYSTAT não estiver acessível
+        """
+        if self._session is None:
+            return None
+        key = id(conn)
+        state = self._session.get(key)
+        if state is False:
+            return None
+        try:
+            snap = self._read_session(conn)
+            if state is None:
+                # calibra: duas leituras seguidas medem o custo da própria leitura
+                again = self._read_session(conn)
+                self._session[key] = {k: again[k] - snap[k] for k in again}
+                snap = again
+            return snap
+        except Exception:
+            self._session[key] = False
+            return None
+
+    def record(self, conn, name: str, before: Optional[Dict[str, int]], exec_s: float, fetch_s: float,
+               rows: int, binds: Dict[str, Any], arraysize: int = 100) -> Dict[str, Any]:
+        """
+        Registra uma consulta executada e grava no log de lentas se passar do limite.
+
+        Args:
+            conn: Conexão usada (para ler o V$MYSTAT depois da consulta)
+            name: Nome da consulta (ex.: SQL_MOV)
+            before: Resultado de snapshot() antes do execute
+            exec_s: Segundos no execute
+            fetch_s: Segundos no fetch
+            rows: Linhas retornadas
+            binds: Binds usados
+            arraysize: arraysize do cursor (estimativa de round trips sem V$MYSTAT)
+
+        Returns:
+            Registro gravado
+        """
+        rec: Dict[str, Any] = {
+            "query": name,
+            "exec_s": round(exec_s, 4),
+            "fetch_s": round(fetch_s, 4),
+            "total_s": round(exec_s + fetch_s, 4),
+            "rows": int(rows),
+            "bytes": None,
+            "round_trips": 1 + math.ceil(rows / max(1, arraysize)),
+            "source": "estimate",
+            "binds": {k: _bind_repr(v) for k, v in binds.items()},
+        }
+        if before is not None:
+            try:
+                after = self._read_session(conn)
+                overhead = self._session.get(id(conn)) or {}
+                for k in ("round_trips", "bytes"):
+                    rec[k] = max(0, after[k] - before[k] - overhead.get(k, 0))
+                rec["source"] = "v$mystat"
+            except Exception:
+                pass
+        with self._lock:
+            self.records.append(rec)
+        if rec["total_s"] >= self.slow_seconds > 0:
+            self._log_slow(rec)
+        if self.throttle is not None:
+            self.throttle.observe(name, exec_s + fetch_s, rows)
+        return rec
+
+    def _log_slow(self, rec: Dict[str, Any]):
+        line = (f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {rec['query']} {rec['total_s']:.2f}s "
+                f"(execute {rec['exec_s']:.2f}s, fetch {rec['fetch_s']:.2f}s) {rec['rows']} linha(s) "
+                f"round trips {rec['round_trips']} binds={json.dumps(rec['binds'], ensure_ascii=False)}")
+        if self.logger:
+            self.logger(f"🐢 Consulta lenta: {rec['query']} em {rec['total_s']:.1f}s ({rec['rows']} linhas)")
+        if self.out_dir is None:
+            return
+        try:
+            with self._lock, (self.out_dir / SLOW_LOG).open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Totais por consulta no período.
+
+        Returns:
+            {nome: {calls, exec_s, fetch_s, rows, bytes, round_trips, max_s}}
+        """
+        out: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            records = list(self.records)
+        for r in records:
+            s = out.setdefault(r["query"], {"calls": 0, "exec_s": 0.0, "fetch_s": 0.0, "rows": 0,
+                                            "bytes": None, "round_trips": 0, "max_s": 0.0})
+            s["calls"] += 1
+            s["exec_s"] = round(s["exec_s"] + r["exec_s"], 4)
+            s["fetch_s"] = round(s["fetch_s"] + r["fetch_s"], 4)
+            s["rows"] += r["rows"]
+            s["round_trips"] += r["round_trips"]
+            s["max_s"] = max(s["max_s"], r["total_s"])
+            if r["bytes"] is not None:
+                s["bytes"] = (s["bytes"] or 0) + r["bytes"]
+        return out
+
+    def render(self) -> List[str]:
+        """Linhas de resumo para o log, da consulta mais cara para a mais barata."""
+        lines = []
+        items = sorted(self.summary().items(), key=lambda kv: kv[1]["exec_s"] + kv[1]["fetch_s"], reverse=True)
+        for name, s in items:
+            mb = f", {s['bytes'] / 1_048_576:.1f} MB" if s["bytes"] is not None else ""
+            lines.append(f"   {name}: {s['calls']}x, execute {s['exec_s']:.2f}s, fetch {s['fetch_s']:.2f}s, "
+                         f"{s['rows']} linhas, {s['round_trips']} round trips{mb}")
+        return lines
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Dias pesados (promoção, inventário): consulta que estoura o prazo (query_timeout_s) é refeita em pedaços.
+- Notas (SQL_MOV, SQL_DEVOLUCOES, SQL_CLIENTES): janelas de horário do dia sobre DTSAIDA/DTENT (window_split).
+  Se a data das notas do dia não tem hora (uma hora distinta só, SQL_NOTAS_FAIXA), faixas de
+  NUMTRANSVENDA/NUMTRANSENT (numtrans_split).
+- Estoque/produtos (SQL_ESTOQUE, SQL_PRODUTOS_UNICOS e partes): faixas de CODPROD do PCPRODUT (codprod_split).
+- O dia começa em split_parts pedaços; pedaço que ainda estoura o prazo é dividido ao meio, até MAX_HALVINGS
+  vezes (ou 15 minutos/um só CODPROD); o pedaço mínimo que ainda estoura o prazo roda então sem prazo.
+  Os pedaços são juntados e reordenados pelo ORDER BY da consulta (colunas ORDEM_*).
+- ORA-01555 (snapshot too old) sem AS OF SCN é tratado da mesma forma: pedaços menores terminam antes do undo
+  expirar. Com AS OF SCN, os pedaços leriam o mesmo SCN já expirado: o erro sobe e o dia é refeito sem
+  leitura consistente (run_period).
+"""
+
+from __future__ import annotations
+import re
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Any, List, Optional, Callable
+
+try:
+    from .sql_prisma import (SQL_CODPROD_FAIXA, SQL_NOTAS_FAIXA, ORDER_PREFIX, window_split, numtrans_split,
+                             codprod_split, order_columns, day_columns)
+except ImportError:
+    from aurora_iqvia.sql_prisma import (SQL_CODPROD_FAIXA, SQL_NOTAS_FAIXA, ORDER_PREFIX, window_split, numtrans_split,
+                                         codprod_split, order_columns, day_columns)
+
+# consulta -> forma de dividir (o ORDER BY de todas é ascendente: os pedaços são reordenados pelas colunas ORDEM_*)
+SPLIT_BY = {
+    "SQL_MOV": "janela",
+    "SQL_DEVOLUCOES": "janela",
+    "SQL_CLIENTES": "janela",
+    "SQL_ESTOQUE": "codprod",
+    "SQL_PRODUTOS_UNICOS": "codprod",
+    "SQL_PRODUTOS_ESTOQUE": "codprod",
+    "SQL_PRODUTOS_MOVIMENTO": "codprod",
+}
+# SELECT DISTINCT sem a coluna da janela: o mesmo cliente pode vir em duas janelas
+DISTINCT = {"SQL_CLIENTES"}
+MIN_WINDOW = timedelta(minutes=15)
+# divisões ao meio por pedaço inicial (4 = até 16 pedaços menores; janelas de 6 h chegam a 22,5 minutos)
+MAX_HALVINGS = 4
+
+_RE_DEADLINE = re.compile(r"DPY-4024|DPI-1067|ORA-01013|ORA-03156|ORA-01555")
+_RE_SNAPSHOT = re.compile(r"ORA-01555")
+_RE_AS_OF_SCN = re.compile(r"\bAS\s+OF\s+SCN\b", re.IGNORECASE)
+
+def is_deadline_error(e: BaseException) -> bool:
+    """
+    Erro de prazo da consulta: call_timeout do oracledb (DPY-4024/DPI-1067/ORA-01013/ORA-03156)
+    ou snapshot too old (ORA-01555).
+    """
+    return bool(_RE_DEADLINE.search(str(e)))
+
+def _stale_snapshot(e: BaseException, sql: str) -> bool:
+    # ORA-01555 numa leitura AS OF SCN: dividir não adianta, todo pedaço lê o mesmo SCN
+    return bool(_RE_SNAPSHOT.search(str(e))) and bool(_RE_AS_OF_SCN.search(sql))
+
+def _windows(dia: date, parts: int) -> List[tuple]:
+    start = datetime(dia.year, dia.month, dia.day)
+    step = timedelta(days=1) / max(1, int(parts))
+    return [(start + step * i, start + step * (i + 1)) for i in range(max(1, int(parts)))]
+
+def _ranges(lo: int, hi: int, parts: int) -> List[tuple]:
+    n = max(1, min(int(parts), hi - lo + 1))
+    size = (hi - lo + 1) / n
+    cuts = [lo + round(size * i) for i in range(n)] + [hi + 1]
+    return [(a, b - 1) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+def _halve(kind: str, piece: tuple) -> Optional[List[tuple]]:
+    a, b = piece
+    if kind == "janela":
+        if b - a <= MIN_WINDOW:
+            return None
+        mid = a + (b - a) / 2
+        return [(a, mid), (mid, b)]
+    if b <= a:
+        return None
+    mid = (a + b) // 2
+    return [(a, mid), (mid + 1, b)]
+
+def _label(kind: str, piece: tuple) -> str:
+    a, b = piece
+    if kind == "janela":
+        return f"{a.strftime('%H:%M')}-{b.strftime('%H:%M') if b.time() else '24:00'}"
+    return f"{'NUMTRANS' if kind == 'numtrans' else 'CODPROD'} {a}-{b}"
+
+# pedaços de cada forma de dividir, para o log
+_PIECES = {"janela": "janela(s) de horário", "numtrans": "faixa(s) de transação (data sem hora)",
+           "codprod": "faixa(s) de CODPROD"}
+
+def split_fetch(fetch: Callable[..., Any], name: str, sql: str, dia: date, parts: int, error: BaseException,
+                logger: Optional[Callable[[str], None]] = None, unbounded: Optional[Callable[..., Any]] = None):
+    """
+    Refaz em pedaços uma consulta do dia que estourou o prazo.
+
+    Args:
+        fetch: Executa uma consulta: fetch(name, sql, **binds) -> DataFrame (DIA/CODFILIAL/SCN e o prazo já inclusos)
+        name: Nome da consulta (chave de SPLIT_BY)
+        sql: SQL que estourou o prazo (já com projeção/sargable/AS OF SCN)
+        dia: Dia de referência
+        parts: Pedaços iniciais (janelas do dia, faixas de transação ou de CODPROD)
+        error: Erro da consulta inteira (relançado se a consulta não puder ser dividida)
+        logger: Função para log
+        unbounded: Como fetch, mas sem prazo: último recurso para o pedaço mínimo que ainda estoura o prazo
+                   e para a consulta que não tem como ser dividida
+
+    Returns:
+        DataFrame igual ao da consulta inteira
+
+    Raises:
+        Sem unbounded: o erro original, se a consulta não tiver como ser dividida (ex.: lendo de
+        GDDI_DIA_ITENS), ou o do pedaço mínimo. ORA-01555 com AS OF SCN: sempre relançado
+    """
+    import pandas as pd
+    if _stale_snapshot(error, sql):
+        raise error
+    kind = SPLIT_BY.get(name)
+    piece_sql = window_split(sql) if kind == "janela" else codprod_split(sql) if kind == "codprod" else sql
+    if piece_sql == sql:
+        if unbounded is None:
+            raise error
+        if logger:
+            logger(f"⏱️ {name}: prazo estourado e a consulta não tem como ser dividida; rodando sem prazo")
+        return unbounded(name, sql)
+    if kind == "janela":
+        # DTSAIDA/DTENT gravadas só com a data (00:00): a primeira janela traria o dia inteiro
+        notas = (unbounded or fetch)("SQL_NOTAS_FAIXA", SQL_NOTAS_FAIXA).iloc[0]
+        cols = day_columns(sql)
+        if any(int(notas[f"HORAS_{c}"] or 0) <= 1 for c in cols):
+            kind, piece_sql = "numtrans", numtrans_split(sql)
+            lo = min(int(notas[f"MIN_{c}"] or 0) for c in cols)
+            hi = max(int(notas[f"MAX_{c}"] or 0) for c in cols)
+    added: tuple = ()
+    if f"{ORDER_PREFIX}1" not in piece_sql:
+        piece_sql, added = order_columns(piece_sql)
+
+    if kind == "janela":
+        pieces = _windows(dia, parts)
+        binds = lambda p: {"JANELA_INI": p[0], "JANELA_FIM": p[1]}
+    elif kind == "numtrans":
+        pieces = _ranges(lo, hi, parts)
+        binds = lambda p: {"NUMTRANS_INI": p[0], "NUMTRANS_FIM": p[1]}
+    else:
+        # MIN/MAX pela chave do PCPRODUT: leve, não precisa de prazo
+        faixa = (unbounded or fetch)("SQL_CODPROD_FAIXA", SQL_CODPROD_FAIXA)
+        lo, hi = (int(faixa["MIN_CODPROD"].iloc[0] or 0), int(faixa["MAX_CODPROD"].iloc[0] or 0)) if len(faixa) else (0, 0)
+        pieces = _ranges(lo, hi, parts)
+        binds = lambda p: {"CODPROD_INI": p[0], "CODPROD_FIM": p[1]}
+    if logger:
+        logger(f"⏱️ {name}: prazo estourado ({str(error).splitlines()[0][:80]}); refazendo em {len(pieces)} "
+               f"{_PIECES[kind]}")
+
+    queue, out, halved = deque((p, 0) for p in pieces), [], 0
+    while queue:
+        piece, depth = queue.popleft()
+        try:
+            out.append(fetch(name, piece_sql, **binds(piece)))
+        except Exception as e:
+            if not is_deadline_error(e) or _stale_snapshot(e, piece_sql):
+                raise
+            halves = _halve(kind, piece) if depth < MAX_HALVINGS else None
+            if halves:
+                halved += 1
+                if logger:
+                    logger(f"⏱️ {name}: {_label(kind, piece)} estourou o prazo; dividindo ao meio")
+                queue.extendleft((h, depth + 1) for h in reversed(halves))
+                continue
+            if unbounded is None:
+                raise
+            if logger:
+                logger(f"⏱️ {name}: {_label(kind, piece)} estourou o prazo no tamanho mínimo; rodando sem prazo")
+            out.append(unbounded(name, piece_sql, **binds(piece)))
+
+    df = pd.concat(out, ignore_index=True) if out else pd.DataFrame()
+    if name in DISTINCT:
+        df = df.drop_duplicates()
+    order = [c for c in df.columns if c.startswith(ORDER_PREFIX)]
+    if order:
+        # estável: no empate vale a ordem dos pedaços (janela/faixa anterior antes)
+        df = df.sort_values(order, kind="stable")
+    if logger:
+        logger(f"⏱️ {name}: {len(df)} linha(s) em {len(out)} pedaço(s)"
+               + (f" ({halved} divisão(ões) extra)" if halved else ""))
+    return df.drop(columns=list(added)).reset_index(drop=True)
+
+def deadline_fetch(fetch: Callable[..., Any], session, name: str, sql: str, dia: date, timeout_ms: int,
+                   parts: int = 4, logger: Optional[Callable[[str], None]] = None, **extra):
+    """
+    Executa uma consulta do dia com prazo (call_timeout da sessão); estourado, refaz em pedaços (split_fetch).
+
+    Args:
+        fetch: Executa uma consulta: fetch(session, name, sql, **binds) -> DataFrame
+        session: Conexão/sessão do Oracle (o call_timeout anterior é restaurado no fim)
+        name: Nome da consulta (só as de SPLIT_BY têm prazo)
+        sql: SQL da consulta
+        dia: Dia de referência
+        timeout_ms: Prazo em milissegundos (0 = sem prazo)
+        parts: Pedaços iniciais
+        logger: Função para log
+        **extra: Binds adicionais da consulta
+
+    Returns:
+        DataFrame da consulta
+
+    Raises:
+        O erro da consulta, se não for de prazo, ou ORA-01555 numa leitura AS OF SCN
+    """
+    if not timeout_ms or name not in SPLIT_BY:
+        return fetch(session, name, sql, **extra)
+    previous = getattr(session, "call_timeout", 0)
+    session.call_timeout = timeout_ms
+    try:
+        try:
+            return fetch(session, name, sql, **extra)
+        except Exception as e:
+            if not is_deadline_error(e) or _stale_snapshot(e, sql):
+                raise
+            error = e
+
+        def unbounded(part, piece, **binds):
+            session.call_timeout = 0
+            try:
+                return fetch(session, part, piece, **extra, **binds)
+            finally:
+                session.call_timeout = timeout_ms
+
+        return split_fetch(lambda part, piece, **binds: fetch(session, part, piece, **extra, **binds),
+                           name, sql, dia, parts, error, logger, unbounded)
+    finally:
+        session.call_timeout = previous
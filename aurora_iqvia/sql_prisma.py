@@ -6,6 +6,10 @@ Versão: 3.1 - CORRIGIDA para resolver inconsistência IQVIA
 CORREÇÃO: 611 produtos no estoque que não apareciam na seção produtos
 """
 
+import re
+from typing import Any, Dict, List, Tuple
+from functools import lru_cache
+
 # =====================================================================================
 # QUERY PRINCIPAL DE VENDAS - MANTIDA INALTERADA
 # =====================================================================================
@@ -173,6 +177,92 @@ WHERE 1=1
 ORDER BY PCNFENT.DTENT, PCNFENT.NUMNOTA
 """
 
+# =====================================================================================
+# DEVOLUÇÕES ENXUTAS (lean_devolucoes) - mesmo resultado do SQL_DEVOLUCOES com 4 tabelas em vez de 10
+# - PCESTCOM/PCNFSAID só filtram (CONDVENDA): viram EXISTS e não multiplicam os itens;
+# - PCDEVCONSUM (nada selecionado), PCTABDEV (motivo) e as colunas de PCFORNEC saem: o payload não as lê;
+#   PCFORNEC continua exigido (EXISTS), como no INNER JOIN original.
+# O DISTINCT fica: dois itens idênticos da mesma nota continuam fundidos, como no original. As colunas que
+# saíram dependem só da nota e do produto, então o DISTINCT funde as mesmas linhas, agora sem o leque do
+# PCESTCOM para ordenar.
+# =====================================================================================
+SQL_DEVOLUCOES_ENXUTA = """
+SELECT DISTINCT
+    -- Dados da Filial
+    PCNFENT.CODFILIAL,
+    
+    -- Dados do Cliente (com fallback para não identificados)
+    COALESCE(PCCLIENT.CLIENTE, 'CLIENTE NAO IDENTIFICADO') AS CLIENTE,
+    COALESCE(PCCLIENT.CODCLI, 0) AS CODCLI,
+    COALESCE(PCCLIENT.CGCENT, '') AS CGCENT,
+    COALESCE(PCCLIENT.FANTASIA, PCCLIENT.CLIENTE) AS FANTASIA_CLIENT,
+    PCCLIENT.ENDERENT || ',' || NVL(PCCLIENT.NUMEROENT, '0') AS ENDERECOCLI,
+    PCCLIENT.CEPENT, 
+    PCCLIENT.MUNICENT, 
+    PCCLIENT.ESTENT, 
+    PCCLIENT.TELENT,
+    
+    -- Dados do Produto
+    PCMOV.CODPROD,
+    PCPRODUT.CODAUXILIAR,
+    PCPRODUT.NBM,
+    PCPRODUT.DESCRICAO,
+    
+    -- Tratamento de Preços
+    CASE 
+        WHEN NVL(PCMOV.PTABELA, 0) = 0 THEN NVL(PCPRODUT.PVENDA, 0) 
+        ELSE NVL(PCMOV.PTABELA, 0) 
+    END AS PTABELA,
+    
+    CASE 
+        WHEN NVL(PCMOV.PUNIT, 0) = 0 THEN NVL(PCMOV.PTABELA, 0) 
+        ELSE NVL(PCMOV.PUNIT, 0) 
+    END AS PUNIT,
+    
+    -- Dados da Movimentação
+    PCMOV.QT,
+    PCMOV.PERCICM,
+    PCMOVCOMPLE.VLICMS,
+    PCMOV.SITTRIBUT,
+    
+    -- Dados da Nota Fiscal
+    PCNFENT.NUMNOTA,
+    PCNFENT.SERIE,
+    PCNFENT.VLTOTAL,
+    PCNFENT.CHAVENFE,
+    PCNFENT.DTENT AS DTSAIDA,
+    
+    -- Controle de Tipo
+    'DEVOLUCAO' AS TIPO_OPERACAO,
+    'N' AS BRINDE
+
+FROM PRISMA.PCNFENT
+INNER JOIN PRISMA.PCMOV ON PCMOV.NUMTRANSENT = PCNFENT.NUMTRANSENT
+INNER JOIN PRISMA.PCPRODUT ON PCMOV.CODPROD = PCPRODUT.CODPROD
+INNER JOIN PRISMA.PCMOVCOMPLE ON PCMOV.NUMTRANSITEM = PCMOVCOMPLE.NUMTRANSITEM
+LEFT JOIN PRISMA.PCCLIENT ON PCNFENT.CODFORNEC = PCCLIENT.CODCLI
+
+WHERE 1=1
+    AND NVL(PCNFENT.CODFILIALNF, PCNFENT.CODFILIAL) = :CODFILIAL
+    AND PCNFENT.TIPODESCARGA IN ('6', '7', 'T')
+    AND NVL(PCNFENT.OBS, 'X') <> 'NF CANCELADA'
+    AND PCNFENT.CODFISCAL IN ('131', '132', '231', '232', '199', '299')
+    AND PCMOV.DTCANCEL IS NULL
+    AND PCPRODUT.CODAUXILIAR IS NOT NULL
+    AND PCPRODUT.CODEPTO <> 196
+    AND EXISTS (SELECT 1 FROM PRISMA.PCFORNEC WHERE PCFORNEC.CODFORNEC = PCPRODUT.CODFORNEC)
+    AND EXISTS (
+        SELECT 1
+        FROM PRISMA.PCESTCOM
+        LEFT JOIN PRISMA.PCNFSAID ON PCESTCOM.NUMTRANSVENDA = PCNFSAID.NUMTRANSVENDA
+        WHERE PCESTCOM.NUMTRANSENT = PCNFENT.NUMTRANSENT
+            AND NVL(PCNFSAID.CONDVENDA, 0) NOT IN (4, 8, 10, 13, 20, 98, 99)
+    )
+    AND TRUNC(PCNFENT.DTENT) = :DIA
+
+ORDER BY PCNFENT.DTENT, PCNFENT.NUMNOTA
+"""
+
 # =====================================================================================
 # QUERY DE ESTOQUE - MANTIDA INALTERADA
 # =====================================================================================
@@ -208,6 +298,60 @@ WHERE 1=1
 ORDER BY P.CODPROD
 """
 
+# =====================================================================================
+# ESTOQUE POR MOVIMENTAÇÃO (stock_mode = "ledger", ledger.StockLedger)
+# Saldo de todos os produtos uma vez só (:DIA = último dia do período, sem TRUNC nem filtro > 0)
+# e o saldo das movimentações por produto/dia no período; os dias anteriores são recuados em memória.
+# =====================================================================================
+SQL_ESTOQUE_SALDO = """
+SELECT 
+    E.CODFILIAL,
+    P.CODPROD,
+    P.CODAUXILIAR,
+    P.NBM,
+    P.DESCRICAO,
+    FORN.CODFORNEC,
+    FORN.FORNECEDOR,
+    NVL(P.PVENDA, 0) AS PTABELA,
+    PRISMA.PKG_ESTOQUE.ESTOQUE_DISPONIVEL(P.CODPROD, E.CODFILIAL, 'VA', :DIA) AS SALDO
+
+FROM PRISMA.PCEST E
+INNER JOIN PRISMA.PCPRODUT P ON P.CODPROD = E.CODPROD
+INNER JOIN PRISMA.PCFORNEC FORN ON P.CODFORNEC = FORN.CODFORNEC
+
+WHERE 1=1
+    AND E.CODFILIAL = :CODFILIAL
+    AND P.CODEPTO <> 196
+
+ORDER BY P.CODPROD
+"""
+
+# Entradas (CODOPER E*) somam e saídas (S*) subtraem; DIA_INI exclusivo, DIA_FIM inclusivo
+SQL_ESTOQUE_MOVIMENTO = """
+SELECT 
+    M.CODPROD,
+    TRUNC(M.DTMOV) AS DIA,
+    SUM(CASE WHEN M.CODOPER LIKE 'E%' THEN M.QT WHEN M.CODOPER LIKE 'S%' THEN -M.QT ELSE 0 END) AS QT
+FROM PRISMA.PCMOV M
+WHERE 1=1
+    AND M.CODFILIAL = :CODFILIAL
+    AND M.DTMOV >= TRUNC(:DIA_INI) + 1
+    AND M.DTMOV < TRUNC(:DIA_FIM) + 1
+    AND M.DTCANCEL IS NULL
+GROUP BY M.CODPROD, TRUNC(M.DTMOV)
+"""
+
+# Conferência por amostra: o valor do PKG_ESTOQUE no dia para poucos produtos ({CODPRODS} = binds de um lote)
+SQL_ESTOQUE_AMOSTRA = """
+SELECT 
+    E.CODPROD,
+    TRUNC(PRISMA.PKG_ESTOQUE.ESTOQUE_DISPONIVEL(E.CODPROD, E.CODFILIAL, 'VA', :DIA)) AS ESTOQUEATUAL
+FROM PRISMA.PCEST E
+WHERE 1=1
+    AND E.CODFILIAL = :CODFILIAL
+    AND E.CODPROD IN ({CODPRODS})
+"""
+
 # =====================================================================================
 # QUERY DE PRODUTOS ÚNICOS - ✅ CORRIGIDA PARA RESOLVER INCONSISTÊNCIA IQVIA
 # Esta correção resolve o problema dos 611 produtos faltando
@@ -313,9 +457,125 @@ WHERE 1=1
     AND N.CODFILIAL = :CODFILIAL
     AND (P.CODAUXILIAR IS NOT NULL OR NVL(M.PUNIT, 0) > 0)
     AND N.DTENT >= TRUNC(:DIA) - 365
+    AND N.DTENT < TRUNC(:DIA) + 1
 ORDER BY M.CODPROD, N.DTENT DESC
 """
 
+# =====================================================================================
+# EAN/PREÇO DE ENTRADA SÓ DOS PRODUTOS QUE PRECISAM (entry_lookup = "targeted")
+# {CODPRODS} = lista de binds (:P0, :P1, ...) de um lote; a última entrada de cada produto sai do servidor (RN = 1)
+# =====================================================================================
+SQL_ENTRADA_PRODUTOS_ALVO = """
+SELECT CODPROD, CODAUXILIAR, PUNIT, DTENT, RN
+FROM (
+    SELECT 
+        M.CODPROD,
+        P.CODAUXILIAR,
+        M.PUNIT,
+        N.DTENT,
+        ROW_NUMBER() OVER (PARTITION BY M.CODPROD ORDER BY N.DTENT DESC) AS RN
+    FROM PRISMA.PCNFENT N
+    INNER JOIN PRISMA.PCESTCOM EC ON EC.NUMTRANSENT = N.NUMTRANSENT  
+    INNER JOIN PRISMA.PCMOV M ON EC.NUMTRANSENT = M.NUMTRANSENT
+    INNER JOIN PRISMA.PCPRODUT P ON M.CODPROD = P.CODPROD
+    WHERE 1=1
+        AND N.CODFILIAL = :CODFILIAL
+        AND M.CODPROD IN ({CODPRODS})
+        AND (P.CODAUXILIAR IS NOT NULL OR NVL(M.PUNIT, 0) > 0)
+        AND N.DTENT >= TRUNC(:DIA) - 365
+        AND N.DTENT < TRUNC(:DIA) + 1
+)
+WHERE RN = 1
+ORDER BY CODPROD
+"""
+
+IN_LIMIT = 1000
+
+def in_batches(values, prefix: str = "P", limit: int = IN_LIMIT) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Divide valores em lotes para `IN (...)` com binds (o Oracle aceita até 1000 itens por lista).
+    Cada lote é completado até a próxima potência de 2 repetindo o último valor, para que poucos
+    textos SQL diferentes se repitam no shared pool.
+
+    Args:
+        values: Valores da lista
+        prefix: Prefixo dos binds (:P0, :P1, ...)
+        limit: Itens por lote
+
+    Returns:
+        [(texto dos binds, {nome: valor}), ...]
+    """
+    values = list(values)
+    out = []
+    for i in range(0, len(values), limit):
+        chunk = values[i:i + limit]
+        size = min(limit, 1 << (len(chunk) - 1).bit_length())
+        chunk = chunk + [chunk[-1]] * (size - len(chunk))
+        names = [f"{prefix}{j}" for j in range(len(chunk))]
+        out.append((", ".join(f":{n}" for n in names), dict(zip(names, chunk))))
+    return out
+
+# =====================================================================================
+# ENTRADAS NOVAS PARA O ÍNDICE LOCAL (entries.EntryIndex) - só acima da marca d'água (+ conferência abaixo dela)
+# =====================================================================================
+SQL_ENTRADA_DELTA = """
+SELECT 
+    N.NUMTRANSENT,
+    N.DTENT,
+    M.CODPROD,
+    P.CODAUXILIAR,
+    M.PUNIT
+FROM PRISMA.PCNFENT N
+INNER JOIN PRISMA.PCESTCOM EC ON EC.NUMTRANSENT = N.NUMTRANSENT  
+INNER JOIN PRISMA.PCMOV M ON EC.NUMTRANSENT = M.NUMTRANSENT
+INNER JOIN PRISMA.PCPRODUT P ON M.CODPROD = P.CODPROD
+WHERE 1=1
+    AND N.CODFILIAL = :CODFILIAL
+    AND (P.CODAUXILIAR IS NOT NULL OR NVL(M.PUNIT, 0) > 0)
+    AND N.NUMTRANSENT > :NUMTRANSENT
+    AND N.DTENT >= :DTENT_MIN
+"""
+
+# Conferência abaixo da marca d'água: COUNT/SUM por dia das mesmas linhas do SQL_ENTRADA_DELTA já lidas.
+# Dia que diverge do que o índice registrou (nota fora de sequência, alterada ou cancelada) é relido.
+SQL_ENTRADA_CONFERE = """
+SELECT 
+    TRUNC(N.DTENT) AS DTENT,
+    COUNT(*) AS QTDE,
+    SUM(N.NUMTRANSENT) AS SOMA_NUMTRANSENT,
+    SUM(M.CODPROD) AS SOMA_CODPROD,
+    SUM(NVL(M.PUNIT, 0)) AS SOMA_PUNIT
+FROM PRISMA.PCNFENT N
+INNER JOIN PRISMA.PCESTCOM EC ON EC.NUMTRANSENT = N.NUMTRANSENT  
+INNER JOIN PRISMA.PCMOV M ON EC.NUMTRANSENT = M.NUMTRANSENT
+INNER JOIN PRISMA.PCPRODUT P ON M.CODPROD = P.CODPROD
+WHERE 1=1
+    AND N.CODFILIAL = :CODFILIAL
+    AND (P.CODAUXILIAR IS NOT NULL OR NVL(M.PUNIT, 0) > 0)
+    AND N.NUMTRANSENT <= :NUMTRANSENT
+    AND N.DTENT >= :DTENT_MIN
+GROUP BY TRUNC(N.DTENT)
+"""
+
+# Releitura dos dias divergentes (todas as notas entre DTENT_MIN e DTENT_MAX)
+SQL_ENTRADA_DIAS = """
+SELECT 
+    N.NUMTRANSENT,
+    N.DTENT,
+    M.CODPROD,
+    P.CODAUXILIAR,
+    M.PUNIT
+FROM PRISMA.PCNFENT N
+INNER JOIN PRISMA.PCESTCOM EC ON EC.NUMTRANSENT = N.NUMTRANSENT  
+INNER JOIN PRISMA.PCMOV M ON EC.NUMTRANSENT = M.NUMTRANSENT
+INNER JOIN PRISMA.PCPRODUT P ON M.CODPROD = P.CODPROD
+WHERE 1=1
+    AND N.CODFILIAL = :CODFILIAL
+    AND (P.CODAUXILIAR IS NOT NULL OR NVL(M.PUNIT, 0) > 0)
+    AND N.DTENT >= :DTENT_MIN
+    AND N.DTENT < :DTENT_MAX
+"""
+
 # =====================================================================================
 # QUERY DE FILIAIS - MANTIDA INALTERADA
 # =====================================================================================
@@ -454,4 +714,619 @@ WHERE 1=1
     AND CODCLI > 0
 
 ORDER BY CODCLI
-"""
\ No newline at end of file
+"""
+
+# =====================================================================================
+# IMPRESSÃO DIGITAL DO DIA - agregados baratos para detectar dias sem alteração
+# (notas de saída, notas de entrada e itens movimentados da filial no dia)
+# =====================================================================================
+SQL_FINGERPRINT = """
+SELECT
+    (SELECT COUNT(*) FROM PRISMA.PCNFSAID N
+      WHERE TRUNC(N.DTSAIDA) = :DIA AND N.CODFILIAL = :CODFILIAL) AS SAIDA_QT,
+    (SELECT NVL(SUM(N.VLTOTAL), 0) FROM PRISMA.PCNFSAID N
+      WHERE TRUNC(N.DTSAIDA) = :DIA AND N.CODFILIAL = :CODFILIAL) AS SAIDA_VLTOTAL,
+    (SELECT NVL(MAX(N.NUMTRANSVENDA), 0) FROM PRISMA.PCNFSAID N
+      WHERE TRUNC(N.DTSAIDA) = :DIA AND N.CODFILIAL = :CODFILIAL) AS SAIDA_MAXTRANS,
+    (SELECT COUNT(N.DTCANCEL) FROM PRISMA.PCNFSAID N
+      WHERE TRUNC(N.DTSAIDA) = :DIA AND N.CODFILIAL = :CODFILIAL) AS SAIDA_CANCEL,
+    (SELECT COUNT(*) FROM PRISMA.PCNFENT E
+      WHERE TRUNC(E.DTENT) = :DIA AND NVL(E.CODFILIALNF, E.CODFILIAL) = :CODFILIAL) AS ENT_QT,
+    (SELECT NVL(SUM(E.VLTOTAL), 0) FROM PRISMA.PCNFENT E
+      WHERE TRUNC(E.DTENT) = :DIA AND NVL(E.CODFILIALNF, E.CODFILIAL) = :CODFILIAL) AS ENT_VLTOTAL,
+    (SELECT NVL(MAX(E.NUMTRANSENT), 0) FROM PRISMA.PCNFENT E
+      WHERE TRUNC(E.DTENT) = :DIA AND NVL(E.CODFILIALNF, E.CODFILIAL) = :CODFILIAL) AS ENT_MAXTRANS,
+    (SELECT COUNT(*) FROM PRISMA.PCMOV M
+      WHERE TRUNC(M.DTMOV) = :DIA AND M.CODFILIAL = :CODFILIAL) AS MOV_QT,
+    (SELECT NVL(SUM(M.QT), 0) FROM PRISMA.PCMOV M
+      WHERE TRUNC(M.DTMOV) = :DIA AND M.CODFILIAL = :CODFILIAL) AS MOV_SUMQT,
+    (SELECT NVL(MAX(M.NUMTRANSITEM), 0) FROM PRISMA.PCMOV M
+      WHERE TRUNC(M.DTMOV) = :DIA AND M.CODFILIAL = :CODFILIAL) AS MOV_MAXITEM,
+    (SELECT COUNT(M.DTCANCEL) FROM PRISMA.PCMOV M
+      WHERE TRUNC(M.DTMOV) = :DIA AND M.CODFILIAL = :CODFILIAL) AS MOV_CANCEL
+FROM DUAL
+"""
+
+# =====================================================================================
+# MARCA D'ÁGUA DO DIA (modo incremental intradiário) - maiores transações de saída/entrada do dia e os
+# agregados das notas/itens até a marca anterior (se mudarem, algo abaixo da marca foi alterado/cancelado;
+# no PCMOV só contam os itens de notas de saída/entrada, ajustes de estoque do dia não fazem reler)
+# =====================================================================================
+SQL_WATERMARK = """
+SELECT
+    (SELECT NVL(MAX(N.NUMTRANSVENDA), 0) FROM PRISMA.PCNFSAID N
+      WHERE TRUNC(N.DTSAIDA) = :DIA AND N.CODFILIAL = :CODFILIAL) AS MAX_VENDA,
+    (SELECT NVL(MAX(E.NUMTRANSENT), 0) FROM PRISMA.PCNFENT E
+      WHERE TRUNC(E.DTENT) = :DIA AND NVL(E.CODFILIALNF, E.CODFILIAL) = :CODFILIAL) AS MAX_ENT,
+    (SELECT COUNT(*) FROM PRISMA.PCNFSAID N
+      WHERE TRUNC(N.DTSAIDA) = :DIA AND N.CODFILIAL = :CODFILIAL AND N.NUMTRANSVENDA <= :WM_VENDA) AS SAIDA_QT,
+    (SELECT NVL(SUM(N.VLTOTAL), 0) FROM PRISMA.PCNFSAID N
+      WHERE TRUNC(N.DTSAIDA) = :DIA AND N.CODFILIAL = :CODFILIAL AND N.NUMTRANSVENDA <= :WM_VENDA) AS SAIDA_VLTOTAL,
+    (SELECT COUNT(N.DTCANCEL) FROM PRISMA.PCNFSAID N
+      WHERE TRUNC(N.DTSAIDA) = :DIA AND N.CODFILIAL = :CODFILIAL AND N.NUMTRANSVENDA <= :WM_VENDA) AS SAIDA_CANCEL,
+    (SELECT COUNT(*) FROM PRISMA.PCNFENT E
+      WHERE TRUNC(E.DTENT) = :DIA AND NVL(E.CODFILIALNF, E.CODFILIAL) = :CODFILIAL
+        AND E.NUMTRANSENT <= :WM_ENT) AS ENT_QT,
+    (SELECT NVL(SUM(E.VLTOTAL), 0) FROM PRISMA.PCNFENT E
+      WHERE TRUNC(E.DTENT) = :DIA AND NVL(E.CODFILIALNF, E.CODFILIAL) = :CODFILIAL
+        AND E.NUMTRANSENT <= :WM_ENT) AS ENT_VLTOTAL,
+    (SELECT COUNT(*) FROM PRISMA.PCMOV M
+      WHERE TRUNC(M.DTMOV) = :DIA AND M.CODFILIAL = :CODFILIAL
+        AND (M.NUMTRANSVENDA BETWEEN 1 AND :WM_VENDA OR M.NUMTRANSENT BETWEEN 1 AND :WM_ENT)) AS MOV_QT,
+    (SELECT NVL(SUM(M.QT), 0) FROM PRISMA.PCMOV M
+      WHERE TRUNC(M.DTMOV) = :DIA AND M.CODFILIAL = :CODFILIAL
+        AND (M.NUMTRANSVENDA BETWEEN 1 AND :WM_VENDA OR M.NUMTRANSENT BETWEEN 1 AND :WM_ENT)) AS MOV_SUMQT,
+    (SELECT COUNT(M.DTCANCEL) FROM PRISMA.PCMOV M
+      WHERE TRUNC(M.DTMOV) = :DIA AND M.CODFILIAL = :CODFILIAL
+        AND (M.NUMTRANSVENDA BETWEEN 1 AND :WM_VENDA OR M.NUMTRANSENT BETWEEN 1 AND :WM_ENT)) AS MOV_CANCEL
+FROM DUAL
+"""
+
+# SQL_PRODUTOS_UNICOS em duas partes: os produtos com estoque (relidos a cada execução, o saldo muda) e os
+# produtos das vendas/devoluções do dia (incrementais pela marca d'água); a união das duas é o SQL_PRODUTOS_UNICOS
+_PRODUTOS_PARTES = SQL_PRODUTOS_UNICOS.split("\n    UNION\n")
+assert len(_PRODUTOS_PARTES) == 3
+SQL_PRODUTOS_ESTOQUE = _PRODUTOS_PARTES[0] + "\n)\nORDER BY CODPROD\n"
+SQL_PRODUTOS_MOVIMENTO = (_PRODUTOS_PARTES[0][:_PRODUTOS_PARTES[0].index("FROM (") + len("FROM (")] + "\n"
+                          + "\n    UNION\n".join(_PRODUTOS_PARTES[1:]))
+DAY_QUERY_PARTS = {
+    "SQL_PRODUTOS_ESTOQUE": SQL_PRODUTOS_ESTOQUE,
+    "SQL_PRODUTOS_MOVIMENTO": SQL_PRODUTOS_MOVIMENTO,
+}
+
+# =====================================================================================
+# CHAVES DO DIA EM TABELA TEMPORÁRIA (stage_day_keys) - os filtros de vendas/devoluções rodam uma vez por dia
+# GDDI_DIA_ITENS é uma GLOBAL TEMPORARY TABLE (dados privados da sessão), criada uma vez pelo comando
+# setup-staging (STAGING_DDL). As consultas *_STG leem dela; ela não é lida AS OF SCN (os INSERTs são).
+# TIPO: V = item de venda (NUMTRANS = NUMTRANSVENDA, CODCLI = N.CODCLI)
+#       D = item de devolução (NUMTRANS = NUMTRANSENT, CODCLI = PCNFENT.CODFORNEC, CONDVENDA_OK = alguma
+#           venda de origem fora das condições excluídas, como o filtro NVL(CONDVENDA, 0) NOT IN (...))
+# =====================================================================================
+STAGING_TABLE = "GDDI_DIA_ITENS"
+
+STAGING_DDL = [
+    """
+CREATE GLOBAL TEMPORARY TABLE GDDI_DIA_ITENS (
+    TIPO CHAR(1) NOT NULL,
+    NUMTRANS NUMBER(10) NOT NULL,
+    NUMTRANSITEM NUMBER(12) NOT NULL,
+    CODPROD NUMBER(10),
+    CODCLI NUMBER(10),
+    CONDVENDA_OK NUMBER(1)
+) ON COMMIT PRESERVE ROWS
+""",
+    "CREATE INDEX GDDI_DIA_ITENS_IX ON GDDI_DIA_ITENS (TIPO, NUMTRANSITEM)",
+]
+
+SQL_STAGE_CHECK = "SELECT COUNT(*) AS N FROM GDDI_DIA_ITENS WHERE 1=0"
+SQL_STAGE_CLEAR = "DELETE FROM GDDI_DIA_ITENS"
+
+SQL_STAGE_VENDAS = """
+INSERT INTO GDDI_DIA_ITENS (TIPO, NUMTRANS, NUMTRANSITEM, CODPROD, CODCLI, CONDVENDA_OK)
+SELECT 'V', N.NUMTRANSVENDA, M.NUMTRANSITEM, M.CODPROD, N.CODCLI, 1
+FROM PRISMA.PCNFSAID N
+INNER JOIN PRISMA.PCMOV M ON N.NUMTRANSVENDA = M.NUMTRANSVENDA
+INNER JOIN PRISMA.PCPRODUT P ON M.CODPROD = P.CODPROD
+WHERE 1=1
+    AND P.CODAUXILIAR IS NOT NULL
+    AND P.CODEPTO <> 196
+    AND TRUNC(N.DTSAIDA) = :DIA
+    AND N.CODFILIAL = :CODFILIAL
+"""
+
+SQL_STAGE_DEVOLUCOES = """
+INSERT INTO GDDI_DIA_ITENS (TIPO, NUMTRANS, NUMTRANSITEM, CODPROD, CODCLI, CONDVENDA_OK)
+SELECT 
+    'D', PCNFENT.NUMTRANSENT, PCMOV.NUMTRANSITEM, PCMOV.CODPROD, PCNFENT.CODFORNEC,
+    MAX(CASE WHEN NVL(PCNFSAID.CONDVENDA, 0) NOT IN (4, 8, 10, 13, 20, 98, 99) THEN 1 ELSE 0 END)
+FROM PRISMA.PCNFENT
+INNER JOIN PRISMA.PCESTCOM ON PCESTCOM.NUMTRANSENT = PCNFENT.NUMTRANSENT
+INNER JOIN PRISMA.PCMOV ON PCESTCOM.NUMTRANSENT = PCMOV.NUMTRANSENT
+INNER JOIN PRISMA.PCPRODUT ON PCMOV.CODPROD = PCPRODUT.CODPROD
+LEFT JOIN PRISMA.PCNFSAID ON PCESTCOM.NUMTRANSVENDA = PCNFSAID.NUMTRANSVENDA
+WHERE 1=1
+    AND NVL(PCNFENT.CODFILIALNF, PCNFENT.CODFILIAL) = :CODFILIAL
+    AND PCNFENT.TIPODESCARGA IN ('6', '7', 'T')
+    AND NVL(PCNFENT.OBS, 'X') <> 'NF CANCELADA'
+    AND PCNFENT.CODFISCAL IN ('131', '132', '231', '232', '199', '299')
+    AND PCMOV.DTCANCEL IS NULL
+    AND PCPRODUT.CODAUXILIAR IS NOT NULL
+    AND PCPRODUT.CODEPTO <> 196
+    AND TRUNC(PCNFENT.DTENT) = :DIA
+GROUP BY PCNFENT.NUMTRANSENT, PCMOV.NUMTRANSITEM, PCMOV.CODPROD, PCNFENT.CODFORNEC
+"""
+
+def _staged(sql: str, *edits) -> str:
+    """Aplica as trocas (trecho, novo) ao SQL do dia; cada trecho tem que existir no original."""
+    for old, new in edits:
+        assert old in sql, f"trecho não encontrado no SQL original: {old.strip().splitlines()[0]}"
+        sql = sql.replace(old, new)
+    return sql
+
+SQL_MOV_STG = _staged(SQL_MOV, ("""FROM PRISMA.PCNFSAID N
+INNER JOIN PRISMA.PCMOV M ON N.NUMTRANSVENDA = M.NUMTRANSVENDA
+""", """FROM GDDI_DIA_ITENS K
+INNER JOIN PRISMA.PCNFSAID N ON N.NUMTRANSVENDA = K.NUMTRANS
+INNER JOIN PRISMA.PCMOV M ON M.NUMTRANSITEM = K.NUMTRANSITEM
+"""), ("""    AND NVL(M.QT, 0) > 0
+    AND P.CODAUXILIAR IS NOT NULL
+    AND P.CODEPTO <> 196
+    AND TRUNC(N.DTSAIDA) = :DIA
+    AND N.CODFILIAL = :CODFILIAL
+""", """    AND K.TIPO = 'V'
+    AND NVL(M.QT, 0) > 0
+"""))
+
+# Sem PCESTCOM/PCNFSAID na junção, cada item aparece uma vez; o DISTINCT fica para a saída ser a do original
+SQL_DEVOLUCOES_STG = _staged(SQL_DEVOLUCOES, ("""FROM PRISMA.PCNFENT
+INNER JOIN PRISMA.PCESTCOM ON PCESTCOM.NUMTRANSENT = PCNFENT.NUMTRANSENT
+INNER JOIN PRISMA.PCMOV ON PCESTCOM.NUMTRANSENT = PCMOV.NUMTRANSENT
+""", """FROM GDDI_DIA_ITENS K
+INNER JOIN PRISMA.PCNFENT ON PCNFENT.NUMTRANSENT = K.NUMTRANS
+INNER JOIN PRISMA.PCMOV ON PCMOV.NUMTRANSITEM = K.NUMTRANSITEM
+"""), ("""LEFT JOIN PRISMA.PCDEVCONSUM ON PCNFENT.NUMTRANSENT = PCDEVCONSUM.NUMTRANSENT
+LEFT JOIN PRISMA.PCNFSAID ON PCESTCOM.NUMTRANSVENDA = PCNFSAID.NUMTRANSVENDA
+""", ""), ("""    AND NVL(PCNFENT.CODFILIALNF, PCNFENT.CODFILIAL) = :CODFILIAL
+    AND PCNFENT.TIPODESCARGA IN ('6', '7', 'T')
+    AND NVL(PCNFENT.OBS, 'X') <> 'NF CANCELADA'
+    AND PCNFENT.CODFISCAL IN ('131', '132', '231', '232', '199', '299')
+    AND PCMOV.DTCANCEL IS NULL
+    AND PCPRODUT.CODAUXILIAR IS NOT NULL
+    AND PCPRODUT.CODEPTO <> 196
+    AND NVL(PCNFSAID.CONDVENDA, 0) NOT IN (4, 8, 10, 13, 20, 98, 99)
+    AND TRUNC(PCNFENT.DTENT) = :DIA
+""", """    AND K.TIPO = 'D'
+    AND K.CONDVENDA_OK = 1
+"""))
+
+# As duas partes do original devolvem a própria filial (:CODFILIAL) quando o dia tem algum item
+SQL_FILIAL_STG = """
+SELECT 
+    F.CODIGO AS CODFILIAL, 
+    F.RAZAOSOCIAL, 
+    F.CGC, 
+    F.FANTASIA AS FANTASIA_FILIAL,
+    F.ENDERECO || ',' || NVL(F.NUMERO, '0') AS ENDERECOFILIAL,
+    F.CEP, 
+    F.CIDADE, 
+    F.UF, 
+    F.TELEFONE
+FROM PRISMA.PCFILIAL F
+WHERE 1=1
+    AND F.CODIGO = :CODFILIAL
+    AND EXISTS (SELECT 1 FROM GDDI_DIA_ITENS)
+"""
+
+SQL_CLIENTES_STG = """
+SELECT DISTINCT 
+    CODCLI, 
+    CLIENTE, 
+    CGCENT, 
+    FANTASIA_CLIENT,
+    ENDERECOCLI, 
+    CEPENT, 
+    MUNICENT, 
+    ESTENT, 
+    TELENT
+FROM (
+    -- ===== CLIENTES DAS VENDAS =====
+    SELECT 
+        C.CODCLI, 
+        C.CLIENTE, 
+        C.CGCENT,
+        NVL(C.FANTASIA, C.CLIENTE) AS FANTASIA_CLIENT,
+        C.ENDERENT || ',' || NVL(C.NUMEROENT, '0') AS ENDERECOCLI,
+        C.CEPENT, 
+        C.MUNICENT, 
+        C.ESTENT, 
+        C.TELENT
+    FROM (SELECT DISTINCT CODCLI FROM GDDI_DIA_ITENS WHERE TIPO = 'V') K
+    INNER JOIN PRISMA.PCCLIENT C ON C.CODCLI = K.CODCLI
+        
+    UNION
+    
+    -- ===== CLIENTES DAS DEVOLUÇÕES =====
+    SELECT 
+        PCCLIENT.CODCLI,
+        COALESCE(PCCLIENT.CLIENTE, 'CLIENTE NAO IDENTIFICADO') AS CLIENTE,
+        COALESCE(PCCLIENT.CGCENT, '') AS CGCENT,
+        COALESCE(PCCLIENT.FANTASIA, PCCLIENT.CLIENTE) AS FANTASIA_CLIENT,
+        PCCLIENT.ENDERENT || ',' || NVL(PCCLIENT.NUMEROENT, '0') AS ENDERECOCLI,
+        PCCLIENT.CEPENT, 
+        PCCLIENT.MUNICENT, 
+        PCCLIENT.ESTENT, 
+        PCCLIENT.TELENT
+    FROM (SELECT DISTINCT CODCLI FROM GDDI_DIA_ITENS WHERE TIPO = 'D' AND CONDVENDA_OK = 1) K
+    INNER JOIN PRISMA.PCCLIENT ON PCCLIENT.CODCLI = K.CODCLI
+)
+WHERE 1=1
+    AND REPLACE(REPLACE(REPLACE(CGCENT,'.',''),'/',''),'-','') <> '06112992000125'
+    AND CODCLI > 0
+
+ORDER BY CODCLI
+"""
+
+SQL_PRODUTOS_UNICOS_STG = _staged(SQL_PRODUTOS_UNICOS, ("""    FROM PRISMA.PCNFSAID N
+    INNER JOIN PRISMA.PCMOV M ON N.NUMTRANSVENDA = M.NUMTRANSVENDA
+""", """    FROM GDDI_DIA_ITENS K
+    INNER JOIN PRISMA.PCMOV M ON M.NUMTRANSITEM = K.NUMTRANSITEM
+"""), ("""        AND NVL(M.QT, 0) > 0
+        AND P.CODAUXILIAR IS NOT NULL
+        AND P.CODEPTO <> 196
+        AND TRUNC(N.DTSAIDA) = :DIA
+        AND N.CODFILIAL = :CODFILIAL
+""", """        AND K.TIPO = 'V'
+        AND NVL(M.QT, 0) > 0
+"""), ("""    FROM PRISMA.PCNFENT
+    INNER JOIN PRISMA.PCESTCOM ON PCESTCOM.NUMTRANSENT = PCNFENT.NUMTRANSENT
+    INNER JOIN PRISMA.PCMOV ON PCESTCOM.NUMTRANSENT = PCMOV.NUMTRANSENT
+""", """    FROM GDDI_DIA_ITENS K
+    INNER JOIN PRISMA.PCMOV ON PCMOV.NUMTRANSITEM = K.NUMTRANSITEM
+"""), ("""    LEFT JOIN PRISMA.PCNFSAID ON PCESTCOM.NUMTRANSVENDA = PCNFSAID.NUMTRANSVENDA
+    WHERE 1=1
+        AND NVL(PCNFENT.CODFILIALNF, PCNFENT.CODFILIAL) = :CODFILIAL
+        AND PCNFENT.TIPODESCARGA IN ('6', '7', 'T')
+        AND NVL(PCNFENT.OBS, 'X') <> 'NF CANCELADA'
+        AND PCNFENT.CODFISCAL IN ('131', '132', '231', '232', '199', '299')
+        AND PCMOV.DTCANCEL IS NULL
+        AND PCPRODUT.CODAUXILIAR IS NOT NULL
+        AND PCPRODUT.CODEPTO <> 196
+        AND NVL(PCNFSAID.CONDVENDA, 0) NOT IN (4, 8, 10, 13, 20, 98, 99)
+        AND TRUNC(PCNFENT.DTENT) = :DIA
+""", """    WHERE 1=1
+        AND K.TIPO = 'D'
+        AND K.CONDVENDA_OK = 1
+"""))
+
+# consulta do dia -> versão que lê as chaves de GDDI_DIA_ITENS
+STAGED_QUERIES = {
+    "SQL_MOV": SQL_MOV_STG,
+    "SQL_DEVOLUCOES": SQL_DEVOLUCOES_STG,
+    "SQL_FILIAL": SQL_FILIAL_STG,
+    "SQL_CLIENTES": SQL_CLIENTES_STG,
+    "SQL_PRODUTOS_UNICOS": SQL_PRODUTOS_UNICOS_STG,
+}
+
+# =====================================================================================
+# REGISTRO DAS QUERIES DO DIA (nome -> SQL)
+# =====================================================================================
+QUERIES = {
+    "SQL_MOV": SQL_MOV,
+    "SQL_DEVOLUCOES": SQL_DEVOLUCOES,
+    "SQL_FILIAL": SQL_FILIAL,
+    "SQL_CLIENTES": SQL_CLIENTES,
+    "SQL_ESTOQUE": SQL_ESTOQUE,
+    "SQL_PRODUTOS_UNICOS": SQL_PRODUTOS_UNICOS,
+    "SQL_ENTRADA_PRODUTOS": SQL_ENTRADA_PRODUTOS,
+}
+
+# =====================================================================================
+# TIPOS DE SAÍDA POR QUERY (db.apply_types) - colunas usadas pelo build_payload
+# int/float: NULL = 0 | money: float com 2 casas | serie: inteiro como texto
+# code: código como texto, sem ".0" | text: NULL = "" | date: "AAAA-MM-DD"
+# =====================================================================================
+_TYPES_FILIAL = {
+    "CODFILIAL": "code", "RAZAOSOCIAL": "text", "CGC": "text", "FANTASIA_FILIAL": "text",
+    "ENDERECOFILIAL": "text", "CEP": "text", "CIDADE": "text", "UF": "text", "TELEFONE": "text",
+}
+_TYPES_CLIENTE = {
+    "CODCLI": "code", "CLIENTE": "text", "CGCENT": "text", "FANTASIA_CLIENT": "text",
+    "ENDERECOCLI": "text", "CEPENT": "text", "MUNICENT": "text", "ESTENT": "text", "TELENT": "text",
+}
+QUERY_TYPES = {
+    "SQL_MOV": {
+        "CODFILIAL": "code", "CODCLI": "code", "CODPROD": "int", "PTABELA": "money", "PUNIT": "money",
+        "QT": "int", "PERCICM": "money", "VLICMS": "money", "SITTRIBUT": "text",
+        "NUMNOTA": "int", "SERIE": "serie", "CHAVENFE": "text", "DTSAIDA": "date", "BRINDE": "text",
+    },
+    "SQL_DEVOLUCOES": {"CODFILIAL": "code", "CODCLI": "code", "CODPROD": "int", "QT": "int", "DTSAIDA": "date"},
+    "SQL_DEVOLUCOES_ENXUTA": {"CODFILIAL": "code", "CODCLI": "code", "CODPROD": "int", "QT": "int", "DTSAIDA": "date"},
+    "SQL_FILIAL": _TYPES_FILIAL,
+    "SQL_CLIENTES": _TYPES_CLIENTE,
+    "SQL_ESTOQUE": {"CODFILIAL": "code", "CODPROD": "int", "CODAUXILIAR": "text", "ESTOQUEATUAL": "int"},
+    "SQL_PRODUTOS_UNICOS": {
+        "CODPROD": "int", "CODAUXILIAR": "text", "NBM": "text", "DESCRICAO": "text",
+        "FORNECEDOR": "text", "PTABELA": "money",
+    },
+    "SQL_ENTRADA_PRODUTOS": {"CODPROD": "int", "CODAUXILIAR": "text", "PUNIT": "float"},
+    "SQL_ENTRADA_PRODUTOS_ALVO": {"CODPROD": "int", "CODAUXILIAR": "text", "PUNIT": "float"},
+    "SQL_ESTOQUE_SALDO": {"CODPROD": "int", "SALDO": "float"},
+    "SQL_ESTOQUE_MOVIMENTO": {"CODPROD": "int", "QT": "float"},
+    "SQL_ESTOQUE_AMOSTRA": {"CODPROD": "int", "ESTOQUEATUAL": "int"},
+}
+QUERY_TYPES["SQL_PRODUTOS_ESTOQUE"] = QUERY_TYPES["SQL_PRODUTOS_MOVIMENTO"] = QUERY_TYPES["SQL_PRODUTOS_UNICOS"]
+
+# =====================================================================================
+# LEITURA CONSISTENTE (FLASHBACK QUERY) - todas as queries do dia no mesmo SCN
+# Obs.: o PKG_ESTOQUE.ESTOQUE_DISPONIVEL lê as próprias tabelas no momento da chamada.
+# =====================================================================================
+SQL_CURRENT_SCN = "SELECT DBMS_FLASHBACK.GET_SYSTEM_CHANGE_NUMBER AS SCN FROM DUAL"
+SQL_CURRENT_SCN_VDB = "SELECT CURRENT_SCN AS SCN FROM V$DATABASE"
+
+_RE_TABLE_REF = re.compile(r"\b((?:FROM|JOIN)\s+PRISMA\.\w+)", re.IGNORECASE)
+
+def as_of_scn(sql: str, bind: str = "SCN") -> str:
+    """
+    Acrescenta `AS OF SCN :SCN` a cada tabela do PRISMA (FROM/JOIN), antes do alias.
+
+    Args:
+        sql: Query de sql_prisma
+        bind: Nome do bind com o SCN
+
+    Returns:
+        SQL com leitura consistente no SCN informado
+    """
+    return _RE_TABLE_REF.sub(lambda m: f"{m.group(1)} AS OF SCN :{bind}", sql)
+
+def without_scn(sql: str, bind: str = "SCN") -> str:
+    """Desfaz o as_of_scn: o mesmo texto com ou sem leitura consistente (chave do cache de extração)."""
+    return sql.replace(f" AS OF SCN :{bind}", "")
+
+# =====================================================================================
+# PREDICADOS DE DATA QUE USAM ÍNDICE (sargable) - TRUNC(coluna) = :DIA impede o range scan no índice da data
+# =====================================================================================
+_RE_TRUNC_EQ = re.compile(r"TRUNC\(\s*(\w+\.\w+)\s*\)\s*=\s*(:\w+)", re.IGNORECASE)
+
+def sargable(sql: str) -> str:
+    """
+    Troca `TRUNC(coluna) = :DIA` por `coluna >= TRUNC(:DIA) AND coluna < TRUNC(:DIA) + 1`
+    (mesmo resultado, mas o índice da coluna de data pode ser usado num range scan).
+
+    Args:
+        sql: Query de sql_prisma
+
+    Returns:
+        SQL com os predicados de data reescritos (igual ao original se não houver nenhum)
+    """
+    return _RE_TRUNC_EQ.sub(lambda m: f"({m.group(1)} >= TRUNC({m.group(2)}) AND {m.group(1)} < TRUNC({m.group(2)}) + 1)", sql)
+
+# =====================================================================================
+# DELTA PELA MARCA D'ÁGUA - só as notas de saída/entrada do dia com transação entre duas marcas
+# =====================================================================================
+_RE_DIA_SAIDA = re.compile(r"(TRUNC\(\s*(\w+)\.DTSAIDA\s*\)\s*=\s*:DIA)", re.IGNORECASE)
+_RE_DIA_ENTRADA = re.compile(r"(TRUNC\(\s*(\w+)\.DTENT\s*\)\s*=\s*:DIA)", re.IGNORECASE)
+
+def watermark_delta(sql: str) -> str:
+    """
+    Acrescenta a cada `TRUNC(N.DTSAIDA) = :DIA` o intervalo `N.NUMTRANSVENDA > :WM_VENDA_INI AND
+    N.NUMTRANSVENDA <= :WM_VENDA_FIM` (e o mesmo com NUMTRANSENT/:WM_ENT_* para `TRUNC(PCNFENT.DTENT)`).
+    Aplicar antes do sargable, que reescreve os mesmos predicados.
+
+    Args:
+        sql: Query de sql_prisma
+
+    Returns:
+        SQL restrito às notas entre as duas marcas
+    """
+    sql = _RE_DIA_SAIDA.sub(lambda m: f"{m.group(1)} AND {m.group(2)}.NUMTRANSVENDA > :WM_VENDA_INI "
+                                      f"AND {m.group(2)}.NUMTRANSVENDA <= :WM_VENDA_FIM", sql)
+    return _RE_DIA_ENTRADA.sub(lambda m: f"{m.group(1)} AND {m.group(2)}.NUMTRANSENT > :WM_ENT_INI "
+                                         f"AND {m.group(2)}.NUMTRANSENT <= :WM_ENT_FIM", sql)
+
+# =====================================================================================
+# DIVISÃO DE CONSULTAS PESADAS (query_timeout_s) - a mesma consulta restrita a uma janela de horário do dia
+# ou a uma faixa de NUMTRANSVENDA/NUMTRANSENT (notas de saída/entrada, quando a data não tem hora) ou a uma
+# faixa de CODPROD (estoque/produtos); os pedaços juntos dão o resultado inteiro
+# =====================================================================================
+SQL_CODPROD_FAIXA = "SELECT NVL(MIN(CODPROD), 0) AS MIN_CODPROD, NVL(MAX(CODPROD), 0) AS MAX_CODPROD FROM PRISMA.PCPRODUT"
+
+# horas distintas de DTSAIDA/DTENT no dia (1 = data gravada sem hora) e faixa de transações das notas do dia,
+# de todas as filiais (a faixa só precisa cobrir as notas da consulta)
+SQL_NOTAS_FAIXA = """
+SELECT
+    (SELECT COUNT(DISTINCT TRUNC(N.DTSAIDA, 'HH24')) FROM PRISMA.PCNFSAID N
+      WHERE N.DTSAIDA >= TRUNC(:DIA) AND N.DTSAIDA < TRUNC(:DIA) + 1) AS HORAS_DTSAIDA,
+    (SELECT NVL(MIN(N.NUMTRANSVENDA), 0) FROM PRISMA.PCNFSAID N
+      WHERE N.DTSAIDA >= TRUNC(:DIA) AND N.DTSAIDA < TRUNC(:DIA) + 1) AS MIN_DTSAIDA,
+    (SELECT NVL(MAX(N.NUMTRANSVENDA), 0) FROM PRISMA.PCNFSAID N
+      WHERE N.DTSAIDA >= TRUNC(:DIA) AND N.DTSAIDA < TRUNC(:DIA) + 1) AS MAX_DTSAIDA,
+    (SELECT COUNT(DISTINCT TRUNC(E.DTENT, 'HH24')) FROM PRISMA.PCNFENT E
+      WHERE E.DTENT >= TRUNC(:DIA) AND E.DTENT < TRUNC(:DIA) + 1) AS HORAS_DTENT,
+    (SELECT NVL(MIN(E.NUMTRANSENT), 0) FROM PRISMA.PCNFENT E
+      WHERE E.DTENT >= TRUNC(:DIA) AND E.DTENT < TRUNC(:DIA) + 1) AS MIN_DTENT,
+    (SELECT NVL(MAX(E.NUMTRANSENT), 0) FROM PRISMA.PCNFENT E
+      WHERE E.DTENT >= TRUNC(:DIA) AND E.DTENT < TRUNC(:DIA) + 1) AS MAX_DTENT
+FROM DUAL
+"""
+
+# TRUNC(N.DTSAIDA) = :DIA, ou a forma sargable (N.DTSAIDA >= TRUNC(:DIA) AND N.DTSAIDA < TRUNC(:DIA) + 1)
+_RE_DIA_NOTA = re.compile(r"TRUNC\(\s*(\w+)\.(DTSAIDA|DTENT)\s*\)\s*=\s*:DIA"
+                          r"|\((\w+)\.(DTSAIDA|DTENT) >= TRUNC\(:DIA\) AND \3\.\4 < TRUNC\(:DIA\) \+ 1\)", re.IGNORECASE)
+_RE_WHERE_1 = re.compile(r"\bWHERE\s+1\s*=\s*1\b", re.IGNORECASE)
+_RE_PCPRODUT = re.compile(r"\bPRISMA\.PCPRODUT\b(?:\s+AS\s+OF\s+SCN\s+:SCN)?(?:\s+(?!ON\b|INNER\b|LEFT\b|WHERE\b)(\w+))?",
+                          re.IGNORECASE)
+
+def window_split(sql: str) -> str:
+    """
+    Restringe cada predicado do dia das notas (DTSAIDA/DTENT, original ou sargable) à janela
+    `coluna >= :JANELA_INI AND coluna < :JANELA_FIM`.
+
+    Args:
+        sql: Query do dia
+
+    Returns:
+        SQL com as janelas (igual ao original se não houver predicado do dia)
+    """
+    def add(m):
+        alias, col = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+        return f"{m.group(0)} AND {alias}.{col} >= :JANELA_INI AND {alias}.{col} < :JANELA_FIM"
+    return _RE_DIA_NOTA.sub(add, sql)
+
+# coluna do dia -> transação da nota (mesma tabela)
+_NUMTRANS = {"DTSAIDA": "NUMTRANSVENDA", "DTENT": "NUMTRANSENT"}
+
+def day_columns(sql: str) -> List[str]:
+    """
+    Colunas de data (DTSAIDA/DTENT) dos predicados do dia das notas, na ordem em que aparecem.
+
+    Args:
+        sql: Query do dia
+
+    Returns:
+        Lista sem repetições (vazia se não houver predicado do dia)
+    """
+    cols = [(m.group(2) or m.group(4)).upper() for m in _RE_DIA_NOTA.finditer(sql)]
+    return list(dict.fromkeys(cols))
+
+def numtrans_split(sql: str) -> str:
+    """
+    Restringe cada predicado do dia das notas à faixa `NUMTRANSVENDA` (DTSAIDA) ou `NUMTRANSENT` (DTENT)
+    `BETWEEN :NUMTRANS_INI AND :NUMTRANS_FIM`, para dias em que a data não tem hora e as janelas de
+    horário não dividem nada.
+
+    Args:
+        sql: Query do dia
+
+    Returns:
+        SQL com as faixas (igual ao original se não houver predicado do dia)
+    """
+    def add(m):
+        alias, col = (m.group(1), m.group(2)) if m.group(1) else (m.group(3), m.group(4))
+        return f"{m.group(0)} AND {alias}.{_NUMTRANS[col.upper()]} BETWEEN :NUMTRANS_INI AND :NUMTRANS_FIM"
+    return _RE_DIA_NOTA.sub(add, sql)
+
+def codprod_split(sql: str) -> str:
+    """
+    Acrescenta `CODPROD BETWEEN :CODPROD_INI AND :CODPROD_FIM` (sobre o PCPRODUT do bloco) depois de
+    cada `WHERE 1=1` cujo FROM tem o PCPRODUT.
+
+    Args:
+        sql: Query do dia
+
+    Returns:
+        SQL restrito à faixa de produtos (igual ao original se nenhum bloco tiver o PCPRODUT)
+    """
+    out, last = [], 0
+    for m in _RE_WHERE_1.finditer(sql):
+        refs = list(_RE_PCPRODUT.finditer(sql, last, m.start()))
+        out.append(sql[last:m.end()])
+        if refs:
+            alias = refs[-1].group(1) or "PCPRODUT"
+            out.append(f"\n    AND {alias}.CODPROD BETWEEN :CODPROD_INI AND :CODPROD_FIM")
+        last = m.end()
+    return "".join(out) + sql[last:]
+
+# =====================================================================================
+# PROJEÇÃO - só as colunas que o build_payload lê, no SELECT externo
+# =====================================================================================
+def _top_level(sql: str):
+    """Posições (início, profundidade 0) fora de parênteses, literais e comentários."""
+    depth, i, n = 0, 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == "'":
+            i = sql.find("'", i + 1)
+            if i < 0:
+                return
+        elif sql.startswith("--", i):
+            i = sql.find("\n", i)
+            if i < 0:
+                return
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif depth == 0:
+            yield i
+        i += 1
+
+def _keyword_at(sql: str, keyword: str) -> List[int]:
+    pat = re.compile(rf"\b{keyword}\b", re.IGNORECASE)
+    return [i for i in _top_level(sql) if pat.match(sql, i) and (i == 0 or not (sql[i - 1].isalnum() or sql[i - 1] == "_"))]
+
+def _alias(item: str) -> str:
+    m = re.search(r"(\w+)\s*$", item)
+    return m.group(1).upper() if m else ""
+
+def _norm(expr: str) -> str:
+    return re.sub(r"\s+", "", expr).upper()
+
+@lru_cache(maxsize=None)
+def project(sql: str, columns: Tuple[str, ...]) -> str:
+    """
+    Reduz o SELECT externo às colunas informadas (pelo nome de saída), mantendo FROM/WHERE/ORDER BY.
+    Com SELECT DISTINCT a query original vira subconsulta (a unicidade continua sobre todas as
+    colunas) e só o SELECT externo é reduzido, reordenando pelos mesmos campos do ORDER BY.
+
+    Args:
+        sql: Query de sql_prisma
+        columns: Colunas de saída mantidas
+
+    Returns:
+        SQL com a lista de colunas reduzida
+
+    Raises:
+        ValueError: Coluna pedida não existe no SELECT
+    """
+    body = re.sub(r"--[^\n]*", "", sql).strip()
+    head = re.match(r"SELECT\s+(DISTINCT\s+)?", body, re.IGNORECASE)
+    froms = _keyword_at(body, "FROM")
+    if not head or not froms:
+        raise ValueError("SELECT sem FROM no nível externo")
+    select_list = body[head.end():froms[0]]
+    cuts = [i for i in _top_level(select_list) if select_list[i] == ","]
+    items = [x.strip() for x in (select_list[a:b] for a, b in zip([0] + [c + 1 for c in cuts], cuts + [len(select_list)]))]
+    aliases = [_alias(x) for x in items]
+    wanted = {c.upper() for c in columns}
+    missing = wanted - set(aliases)
+    if missing:
+        raise ValueError(f"Colunas fora do SELECT: {', '.join(sorted(missing))}")
+    kept = [(a, x) for a, x in zip(aliases, items) if a in wanted]
+
+    if not head.group(1):
+        return "SELECT\n    " + ",\n    ".join(x for _, x in kept) + "\n" + body[froms[0]:] + "\n"
+
+    orders = _keyword_at(body, "ORDER")
+    inner, order_by = (body[:orders[-1]].rstrip(), body[orders[-1]:]) if orders else (body, "")
+    outer_order = ""
+    if order_by:
+        # ORDER BY PCNFENT.DTENT -> ORDER BY DTSAIDA (nome de saída da mesma expressão)
+        by_expr = {_norm(re.sub(r"\s+AS\s+\w+\s*$", "", x, flags=re.IGNORECASE)): a for a, x in zip(aliases, items)}
+        exprs = re.sub(r"^ORDER\s+BY\s+", "", order_by, flags=re.IGNORECASE).split(",")
+        outer_order = "\nORDER BY " + ", ".join(by_expr.get(_norm(e), _alias(e)) for e in exprs)
+    return f"SELECT {', '.join(a for a, _ in kept)}\nFROM (\n{inner}\n){outer_order}\n"
+
+ORDER_PREFIX = "ORDEM_"
+
+def order_columns(sql: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Acrescenta ao SELECT externo cada expressão do ORDER BY como ORDEM_1, ORDEM_2... (valor cru, antes
+    dos tipos de QUERY_TYPES: DTSAIDA com hora, CODCLI numérico), para reordenar o resultado fora do banco.
+    Com SELECT DISTINCT as expressões do ORDER BY já estão no SELECT: a unicidade não muda.
+
+    Args:
+        sql: Query de sql_prisma (ORDER BY ascendente, como todas as do dia)
+
+    Returns:
+        (SQL com as colunas, nomes das colunas na ordem do ORDER BY); sem ORDER BY, o SQL original e ()
+    """
+    body = re.sub(r"--[^\n]*", "", sql).strip()
+    froms = _keyword_at(body, "FROM")
+    orders = _keyword_at(body, "ORDER")
+    if not froms or not orders:
+        return sql, ()
+    exprs = [e.strip() for e in re.sub(r"^ORDER\s+BY\s+", "", body[orders[-1]:], flags=re.IGNORECASE).split(",")]
+    names = tuple(f"{ORDER_PREFIX}{i}" for i in range(1, len(exprs) + 1))
+    extra = "".join(f",\n    {e} AS {n}" for e, n in zip(exprs, names))
+    return body[:froms[0]].rstrip() + extra + "\n" + body[froms[0]:] + "\n", names
+
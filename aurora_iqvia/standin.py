@@ -0,0 +1,525 @@
+# -*- coding: utf-8 -*-
+"""
+Banco local (SQLite) no lugar do schema PRISMA do WinThor, para rodar a extração sem Oracle.
+- Tabelas com as colunas usadas pelas queries de sql_prisma: PCNFSAID, PCMOV, PCMOVCOMPLE, PCNFENT,
+  PCESTCOM, PCPRODUT, PCFORNEC, PCCLIENT, PCFILIAL, PCEST, PCTABDEV, PCUSUARI, PCDEVCONSUM e DUAL.
+- Gerador com volume configurável (linhas de venda por dia), sobre os cadastros de synthetic.make_master.
+- Camada de dialeto: executa o texto das queries Oracle no SQLite (NVL, TRUNC, PRISMA., PKG_ESTOQUE,
+  aritmética de datas, '' = NULL, AS OF SCN ignorado) e devolve datas como datetime, como o driver.
+- GDDI_DIA_ITENS (chaves do dia, stage_day_keys): criada como tabela temporária em cada conexão, como se o
+  setup-staging já tivesse sido rodado (a GLOBAL TEMPORARY TABLE do Oracle vira CREATE TEMP TABLE).
+- call_timeout (ms) na conexão, como no oracledb: a consulta é interrompida no prazo e o erro traz o
+  DPY-4024 do driver (query_timeout_s).
+- EXPLAIN PLAN SET STATEMENT_ID = '...' FOR: grava o plano do SQLite num PLAN_TABLE temporário (sem DBMS_XPLAN).
+
+    python -m aurora_iqvia.standin --db prisma.db --ini 01/07/2025 --fim 07/07/2025 --scale 20000
+
+Limitações: PKG_ESTOQUE.ESTOQUE_DISPONIVEL devolve o saldo atual do PCEST (ignora a data) e o `||`
+do SQLite com NULL resulta NULL (no Oracle, NULL vira '').
+"""
+
+from __future__ import annotations
+import argparse
+import re
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+try:
+    from .sql_prisma import STAGING_DDL
+except ImportError:
+    from aurora_iqvia.sql_prisma import STAGING_DDL
+
+SCHEMA = """
+CREATE TABLE PCFILIAL (CODIGO INTEGER PRIMARY KEY, RAZAOSOCIAL TEXT, CGC TEXT, FANTASIA TEXT, ENDERECO TEXT,
+    NUMERO TEXT, CEP TEXT, CIDADE TEXT, UF TEXT, TELEFONE TEXT);
+CREATE TABLE PCCLIENT (CODCLI INTEGER PRIMARY KEY, CLIENTE TEXT, CGCENT TEXT, FANTASIA TEXT, ENDERENT TEXT,
+    NUMEROENT TEXT, CEPENT TEXT, MUNICENT TEXT, ESTENT TEXT, TELENT TEXT);
+CREATE TABLE PCFORNEC (CODFORNEC INTEGER PRIMARY KEY, FORNECEDOR TEXT);
+CREATE TABLE PCPRODUT (CODPROD INTEGER PRIMARY KEY, CODAUXILIAR TEXT, NBM TEXT, DESCRICAO TEXT,
+    CODFORNEC INTEGER, PVENDA REAL, CODEPTO INTEGER);
+CREATE TABLE PCUSUARI (CODUSUR INTEGER PRIMARY KEY, NOME TEXT);
+CREATE TABLE PCTABDEV (CODDEVOL INTEGER PRIMARY KEY, MOTIVO TEXT);
+CREATE TABLE PCEST (CODFILIAL INTEGER, CODPROD INTEGER, QTESTGER REAL, QTRESERV REAL, QTBLOQUEADA REAL,
+    PRIMARY KEY (CODFILIAL, CODPROD));
+CREATE TABLE PCNFSAID (NUMTRANSVENDA INTEGER PRIMARY KEY, CODFILIAL INTEGER, CODCLI INTEGER, CODUSUR INTEGER,
+    NUMNOTA INTEGER, SERIE TEXT, VLTOTAL REAL, CHAVENFE TEXT, DTSAIDA TEXT, CONDVENDA INTEGER, DTCANCEL TEXT);
+CREATE TABLE PCNFENT (NUMTRANSENT INTEGER PRIMARY KEY, CODFILIAL INTEGER, CODFILIALNF INTEGER, CODFORNEC INTEGER,
+    CODDEVOL INTEGER, TIPODESCARGA TEXT, OBS TEXT, CODFISCAL INTEGER, NUMNOTA INTEGER, SERIE TEXT,
+    VLTOTAL REAL, CHAVENFE TEXT, DTENT TEXT);
+CREATE TABLE PCESTCOM (NUMTRANSENT INTEGER, NUMTRANSVENDA INTEGER);
+CREATE TABLE PCMOV (NUMTRANSITEM INTEGER PRIMARY KEY, NUMTRANSVENDA INTEGER, NUMTRANSENT INTEGER,
+    CODFILIAL INTEGER, CODOPER TEXT, CODPROD INTEGER, QT REAL, PTABELA REAL, PUNIT REAL, PERCICM REAL,
+    SITTRIBUT TEXT, DTMOV TEXT, DTCANCEL TEXT);
+CREATE TABLE PCMOVCOMPLE (NUMTRANSITEM INTEGER PRIMARY KEY, VLICMS REAL);
+CREATE TABLE PCDEVCONSUM (NUMTRANSENT INTEGER);
+CREATE TABLE DUAL (DUMMY TEXT);
+INSERT INTO DUAL VALUES ('X');
+CREATE INDEX IX_NFSAID_DT ON PCNFSAID (CODFILIAL, DTSAIDA);
+CREATE INDEX IX_NFENT_DT ON PCNFENT (DTENT);
+CREATE INDEX IX_MOV_VENDA ON PCMOV (NUMTRANSVENDA);
+CREATE INDEX IX_MOV_ENT ON PCMOV (NUMTRANSENT);
+CREATE INDEX IX_MOV_DT ON PCMOV (CODFILIAL, DTMOV);
+CREATE INDEX IX_ESTCOM_ENT ON PCESTCOM (NUMTRANSENT);
+"""
+
+# Colunas devolvidas como datetime (o SQLite guarda texto ISO)
+DATE_COLUMNS = {"DTSAIDA", "DTENT", "DT", "DTMOV", "DTCANCEL"}
+
+MOTIVOS = [(1, "AVARIA"), (2, "VENCIDO"), (3, "DESISTENCIA DO CLIENTE"), (4, "ERRO DE PEDIDO")]
+CFOP_DEVOLUCAO = [131, 132, 231, 232, 199, 299]
+
+# --------------------------
+# Dialeto Oracle -> SQLite
+# --------------------------
+_RE_SCHEMA = re.compile(r"\bPRISMA\.", re.IGNORECASE)
+_RE_PACKAGE = re.compile(r"\bPKG_ESTOQUE\.", re.IGNORECASE)
+_RE_AS_OF = re.compile(r"\s+AS\s+OF\s+SCN\s+(:\w+|\d+)", re.IGNORECASE)
+_RE_GTT = re.compile(r"\bCREATE\s+GLOBAL\s+TEMPORARY\s+TABLE\b(.*?)\bON\s+COMMIT\s+PRESERVE\s+ROWS\b",
+                     re.IGNORECASE | re.DOTALL)
+_RE_DATE_SHIFT = re.compile(r"TRUNC\(\s*(:\w+)\s*\)\s*([-+])\s*(\d+)", re.IGNORECASE)
+
+def to_sqlite(sql: str) -> str:
+    """
+    Traduz o texto de uma query Oracle de sql_prisma para o SQLite.
+
+    Args:
+        sql: SQL no dialeto Oracle
+
+    Returns:
+        SQL executável no banco local
+    """
+    sql = _RE_SCHEMA.sub("", sql)
+    sql = _RE_PACKAGE.sub("", sql)
+    sql = sql.replace("DBMS_FLASHBACK.GET_SYSTEM_CHANGE_NUMBER", "GET_SYSTEM_CHANGE_NUMBER()")
+    sql = _RE_AS_OF.sub("", sql)
+    sql = _RE_GTT.sub(r"CREATE TEMP TABLE\1", sql)
+    sql = _RE_DATE_SHIFT.sub(lambda m: f"date({m.group(1)}, '{m.group(2)}{m.group(3)} days')", sql)
+    return sql
+
+# EXPLAIN PLAN: o plano do SQLite (EXPLAIN QUERY PLAN) vai para um PLAN_TABLE temporário com as operações
+# no vocabulário do Oracle (SCAN = TABLE ACCESS FULL, SEARCH ... USING INDEX = INDEX RANGE SCAN)
+_RE_EXPLAIN = re.compile(r"^\s*EXPLAIN\s+PLAN\s+SET\s+STATEMENT_ID\s*=\s*'([^']*)'\s+FOR\s+(.*)$",
+                         re.IGNORECASE | re.DOTALL)
+_RE_PLAN_STEP = re.compile(r"^(SCAN|SEARCH)\s+(\w+)(?:\s+AS\s+\w+)?(?:\s+USING\s+(COVERING\s+)?INDEX\s+(\w+))?"
+                           r"(?:\s+USING\s+INTEGER\s+PRIMARY\s+KEY)?", re.IGNORECASE)
+PLAN_TABLE = """
+CREATE TEMP TABLE IF NOT EXISTS PLAN_TABLE (STATEMENT_ID TEXT, ID INTEGER, PARENT_ID INTEGER, DEPTH INTEGER,
+    OPERATION TEXT, OPTIONS TEXT, OBJECT_NAME TEXT, CARDINALITY INTEGER, COST INTEGER)
+"""
+
+def _plan_step(detail: str):
+    m = _RE_PLAN_STEP.match(detail)
+    if not m:
+        return detail.upper(), None, None
+    kind, table, covering, index = m.groups()
+    if kind.upper() == "SCAN" and index:
+        return "INDEX", "FULL SCAN", index
+    if kind.upper() == "SCAN":
+        return "TABLE ACCESS", "FULL", table
+    if index:
+        return "INDEX", "RANGE SCAN", index
+    return "TABLE ACCESS", "BY INDEX ROWID", table
+
+def _bind(v):
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, date):
+        return v.strftime("%Y-%m-%d")
+    return v
+
+def _nvl(a, b):
+    return b if a is None or a == "" else a
+
+def _trunc(v):
+    if v is None:
+        return None
+    if isinstance(v, str):
+        return v[:10]
+    return int(v)
+
+def _trunc_fmt(v, fmt):
+    # TRUNC(data, 'HH24') (hora cheia); os demais formatos caem no dia
+    if isinstance(v, str) and v and str(fmt).upper() == "HH24":
+        return (v[:13] if len(v) > 10 else v[:10] + " 00") + ":00:00"
+    return _trunc(v)
+
+def _to_datetime(v):
+    if isinstance(v, str) and v:
+        return datetime.fromisoformat(v)
+    return v
+
+class StandinCursor:
+    def __init__(self, cursor: sqlite3.Cursor, owner: Optional["StandinConnection"] = None):
+        self._cur = cursor
+        self._owner = owner
+        self.arraysize = 100
+        self._dates: List[int] = []
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def execute(self, sql: str, binds: Optional[Dict[str, Any]] = None):
+        binds = {k: _bind(v) for k, v in (binds or {}).items()}
+        m = _RE_EXPLAIN.match(sql)
+        if m:
+            return self._explain(m.group(1), m.group(2), binds)
+        if self._owner is not None:
+            self._owner._arm()
+        self._call(self._cur.execute, to_sqlite(sql), binds)
+        cols = [c[0] for c in (self._cur.description or [])]
+        self._dates = [i for i, c in enumerate(cols) if c.upper() in DATE_COLUMNS]
+        return self
+
+    def _explain(self, statement_id: str, sql: str, binds: Dict[str, Any]):
+        rows = self._cur.execute("EXPLAIN QUERY PLAN " + to_sqlite(sql), binds).fetchall()
+        depth = {0: 0}
+        plan = [(statement_id, 0, None, 0, "SELECT STATEMENT", None, None, None, None)]
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, 0) + 1
+            plan.append((statement_id, node, parent, depth[node]) + _plan_step(detail) + (None, None))
+        self._cur.executemany("INSERT INTO PLAN_TABLE VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", plan)
+        self._dates = []
+        return self
+
+    def _call(self, fn, *args):
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e) and self._owner is not None:
+                raise sqlite3.OperationalError(
+                    f"DPY-4024: call timeout of {self._owner.call_timeout} ms exceeded") from e
+            raise
+
+    def _row(self, row):
+        # Oracle não distingue '' de NULL
+        row = [None if v == "" else v for v in row]
+        for i in self._dates:
+            row[i] = _to_datetime(row[i])
+        return tuple(row)
+
+    def fetchone(self):
+        row = self._call(self._cur.fetchone)
+        return None if row is None else self._row(row)
+
+    def fetchmany(self, size: Optional[int] = None):
+        return [self._row(r) for r in self._call(self._cur.fetchmany, size or self.arraysize)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._call(self._cur.fetchall)]
+
+    def __iter__(self):
+        for r in self._cur:
+            yield self._row(r)
+
+    def close(self):
+        self._cur.close()
+
+class StandinConnection:
+    """Conexão com a mesma interface usada do oracledb (cursor/close/version)."""
+
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.version = f"SQLite {sqlite3.sqlite_version} (stand-in PRISMA)"
+        # prazo por chamada em ms (0 = sem prazo), contado a partir do execute
+        self.call_timeout = 0
+        self._deadline: Optional[float] = None
+        self._conn.set_progress_handler(self._progress, 1000)
+        self._estoque: Optional[Dict[tuple, float]] = None
+        self._conn.execute(PLAN_TABLE)
+        # GDDI_DIA_ITENS (setup-staging): no SQLite a tabela temporária só existe na conexão que a cria
+        for ddl in STAGING_DDL:
+            self._conn.execute(to_sqlite(ddl))
+        self._conn.create_function("NVL", 2, _nvl, deterministic=True)
+        self._conn.create_function("TRUNC", 1, _trunc, deterministic=True)
+        self._conn.create_function("TRUNC", 2, _trunc_fmt, deterministic=True)
+        self._conn.create_function("ESTOQUE_DISPONIVEL", 4, self._estoque_disponivel, deterministic=True)
+        # DBMS_FLASHBACK.GET_SYSTEM_CHANGE_NUMBER: contador de alterações do arquivo
+        self._conn.create_function("GET_SYSTEM_CHANGE_NUMBER", 0, self._scn)
+
+    def _load_estoque(self):
+        rows = self._conn.execute(
+            "SELECT CODPROD, CODFILIAL, QTESTGER - NVL(QTRESERV, 0) - NVL(QTBLOQUEADA, 0) FROM PCEST")
+        self._estoque = {(int(p), int(f)): q for p, f, q in rows}
+
+    def _estoque_disponivel(self, codprod, codfilial, tipo, dia):
+        # stub do PKG_ESTOQUE: saldo atual disponível (QTESTGER - QTRESERV - QTBLOQUEADA)
+        if self._estoque is None:
+            # carga única do stub: fora do prazo da consulta que o chamou (senão a função falha no meio)
+            deadline, self._deadline = self._deadline, None
+            try:
+                self._load_estoque()
+            finally:
+                self._deadline = deadline
+        return self._estoque.get((int(codprod), int(codfilial)), 0)
+
+    def _arm(self):
+        self._deadline = time.perf_counter() + self.call_timeout / 1000 if self.call_timeout else None
+
+    def _progress(self):
+        return 1 if self._deadline is not None and time.perf_counter() > self._deadline else 0
+
+    def _scn(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0] + self._conn.total_changes
+
+    def cursor(self) -> StandinCursor:
+        return StandinCursor(self._conn.cursor(), self)
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+def connect(path: str | Path) -> StandinConnection:
+    """Abre o banco local gerado por build_database."""
+    if not Path(path).is_file():
+        raise FileNotFoundError(f"Banco local não encontrado: {path}")
+    return StandinConnection(path)
+
+# --------------------------
+# Gerador
+# --------------------------
+def _insert(conn: sqlite3.Connection, table: str, df):
+    cols = list(df.columns)
+    sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    conn.executemany(sql, rows)
+
+def _iso(ts) -> Any:
+    return ts.dt.strftime("%Y-%m-%d %H:%M:%S").astype(object)
+
+def populate(conn: sqlite3.Connection, d0: date, d1: date, scale: int = 10_000, seed: int = 0,
+             codfilial: int = 1, logger=None) -> Dict[str, int]:
+    """
+    Preenche o banco com cadastros e movimento diário.
+
+    Args:
+        conn: Conexão sqlite3 com o SCHEMA criado
+        d0: Primeiro dia
+        d1: Último dia
+        scale: Linhas de venda (PCMOV) por dia
+        seed: Semente do gerador
+        codfilial: Filial do movimento
+        logger: Função para log (opcional)
+
+    Returns:
+        Contagem de linhas por tabela de movimento
+    """
+    import numpy as np
+    import pandas as pd
+    from .synthetic import make_master, _digits
+
+    master = make_master(scale, seed, codfilial)
+    produtos, clientes = master["produtos"], master["clientes"]
+    _insert(conn, "PCFILIAL", master["filial"])
+    _insert(conn, "PCCLIENT", clientes)
+    _insert(conn, "PCFORNEC", master["fornecedores"])
+    _insert(conn, "PCPRODUT", produtos)
+    _insert(conn, "PCUSUARI", pd.DataFrame({"CODUSUR": np.arange(1, 21), "NOME": [f"RCA {i}" for i in range(1, 21)]}))
+    _insert(conn, "PCTABDEV", pd.DataFrame(MOTIVOS, columns=["CODDEVOL", "MOTIVO"]))
+
+    rng = np.random.default_rng(seed)
+    n_prod = len(produtos)
+    qtest = rng.integers(1, 5_000, n_prod).astype(float)
+    qtest[rng.random(n_prod) < 0.4] = 0.0
+    _insert(conn, "PCEST", pd.DataFrame({
+        "CODFILIAL": codfilial,
+        "CODPROD": produtos["CODPROD"].to_numpy(),
+        "QTESTGER": qtest,
+        "QTRESERV": np.where(qtest > 0, rng.integers(0, 5, n_prod), 0).astype(float),
+        "QTBLOQUEADA": 0.0,
+    }))
+
+    codprods = produtos["CODPROD"].to_numpy()
+    pvenda = produtos["PVENDA"].to_numpy()
+    codclis = clientes["CODCLI"].to_numpy()
+    counts = {"PCNFSAID": 0, "PCMOV": 0, "PCNFENT": 0}
+    next_venda, next_item, next_ent, next_nota = 1, 1, 1, 100_000
+    vendas_anteriores = np.zeros(0, dtype=np.int64)
+
+    dia = d0
+    while dia <= d1:
+        day_rng = np.random.default_rng(seed + dia.toordinal())
+        base = pd.Timestamp(dia)
+
+        # ----- vendas: notas de ~8 itens -----
+        n = scale
+        n_notas = max(1, n // 8)
+        trans = np.arange(next_venda, next_venda + n_notas, dtype=np.int64)
+        dt_nota = base + pd.to_timedelta(day_rng.integers(7 * 3600, 20 * 3600, n_notas), unit="s")
+        chave = _digits(day_rng, n_notas, 44)
+        chave[day_rng.random(n_notas) < 0.02] = None
+        item_nota = np.sort(day_rng.integers(0, n_notas, n))
+        idx = day_rng.integers(0, n_prod, n)
+        ptab = pvenda[idx] * np.where(day_rng.random(n) < 0.1, 0.0, 1.0)  # PTABELA zerada -> PVENDA
+        punit = np.round(pvenda[idx] * day_rng.uniform(0.85, 1.0, n), 2)
+        punit[day_rng.random(n) < 0.03] = 0.0                                # brindes
+        qt = day_rng.integers(1, 48, n).astype(float)
+        qt[day_rng.random(n) < 0.01] = 0.0
+        percicm = day_rng.choice([0.0, 7.0, 12.0, 17.0, 18.0], n)
+        items = np.arange(next_item, next_item + n, dtype=np.int64)
+        vl = np.round(punit * qt, 2)
+        nf = pd.DataFrame({
+            "NUMTRANSVENDA": trans,
+            "CODFILIAL": codfilial,
+            "CODCLI": codclis[day_rng.integers(0, len(codclis), n_notas)],
+            "CODUSUR": day_rng.integers(1, 21, n_notas),
+            "NUMNOTA": np.arange(next_nota, next_nota + n_notas),
+            "SERIE": "1",
+            "VLTOTAL": np.bincount(item_nota, weights=vl, minlength=n_notas).round(2),
+            "CHAVENFE": chave,
+            "DTSAIDA": _iso(pd.Series(dt_nota)),
+            "CONDVENDA": day_rng.choice([1, 1, 1, 1, 1, 7, 4, 10], n_notas),
+            "DTCANCEL": None,
+        })
+        mov = pd.DataFrame({
+            "NUMTRANSITEM": items,
+            "NUMTRANSVENDA": trans[item_nota],
+            "NUMTRANSENT": None,
+            "CODFILIAL": codfilial,
+            "CODOPER": "S",
+            "CODPROD": codprods[idx],
+            "QT": qt,
+            "PTABELA": ptab,
+            "PUNIT": punit,
+            "PERCICM": percicm,
+            "SITTRIBUT": day_rng.choice(np.array(["60", "00", "10", None], dtype=object), n),
+            "DTMOV": nf["DTSAIDA"].to_numpy()[item_nota],
+            "DTCANCEL": None,
+        })
+        compl = pd.DataFrame({"NUMTRANSITEM": items, "VLICMS": np.round(vl * percicm / 100.0, 2)})
+        _insert(conn, "PCNFSAID", nf)
+        _insert(conn, "PCMOV", mov)
+        _insert(conn, "PCMOVCOMPLE", compl)
+        counts["PCNFSAID"] += n_notas
+        counts["PCMOV"] += n
+        next_venda += n_notas
+        next_item += n
+        next_nota += n_notas
+        vendas_anteriores = np.concatenate([vendas_anteriores, trans])[-200_000:]
+
+        # ----- entradas: devoluções (PCESTCOM) e compras (sem PCESTCOM, filtradas pelas queries) -----
+        n_dev = max(1, n // 50)
+        n_dev_notas = max(1, n_dev // 4)
+        n_comp_notas = max(1, n // 2_000)
+        n_ent = n_dev_notas + n_comp_notas
+        ent_trans = np.arange(next_ent, next_ent + n_ent, dtype=np.int64)
+        is_dev = np.arange(n_ent) < n_dev_notas
+        dt_ent = base + pd.to_timedelta(day_rng.integers(8 * 3600, 18 * 3600, n_ent), unit="s")
+        ent_nota = np.concatenate([np.sort(day_rng.integers(0, n_dev_notas, n_dev)),
+                                   n_dev_notas + np.repeat(np.arange(n_comp_notas), 10)])
+        m = len(ent_nota)
+        eidx = day_rng.integers(0, n_prod, m)
+        epunit = np.round(pvenda[eidx] * np.where(ent_nota < n_dev_notas, 0.95, 0.55), 2)
+        eqt = day_rng.integers(1, 12, m).astype(float)
+        eitems = np.arange(next_item, next_item + m, dtype=np.int64)
+        evl = np.round(epunit * eqt, 2)
+        nfe = pd.DataFrame({
+            "NUMTRANSENT": ent_trans,
+            "CODFILIAL": codfilial,
+            "CODFILIALNF": None,
+            "CODFORNEC": np.where(is_dev, codclis[day_rng.integers(0, len(codclis), n_ent)],
+                                  day_rng.integers(1, len(master["fornecedores"]) + 1, n_ent)),
+            "CODDEVOL": np.where(is_dev, day_rng.integers(1, len(MOTIVOS) + 1, n_ent), None),
+            "TIPODESCARGA": np.where(is_dev, day_rng.choice(np.array(["6", "7", "T"], dtype=object), n_ent), "N"),
+            "OBS": np.where(day_rng.random(n_ent) < 0.02, "NF CANCELADA", None),
+            "CODFISCAL": np.where(is_dev, day_rng.choice(CFOP_DEVOLUCAO, n_ent), 102),
+            "NUMNOTA": day_rng.integers(1, 999_999, n_ent),
+            "SERIE": "1",
+            "VLTOTAL": np.bincount(ent_nota, weights=evl, minlength=n_ent).round(2),
+            "CHAVENFE": _digits(day_rng, n_ent, 44),
+            "DTENT": _iso(pd.Series(dt_ent)),
+        })
+        origem = (vendas_anteriores[day_rng.integers(0, len(vendas_anteriores), n_dev_notas)]
+                  if len(vendas_anteriores) else np.zeros(n_dev_notas, dtype=np.int64))
+        estcom = pd.DataFrame({"NUMTRANSENT": ent_trans[:n_dev_notas], "NUMTRANSVENDA": origem})
+        emov = pd.DataFrame({
+            "NUMTRANSITEM": eitems,
+            "NUMTRANSVENDA": None,
+            "NUMTRANSENT": ent_trans[ent_nota],
+            "CODFILIAL": codfilial,
+            "CODOPER": np.where(ent_nota < n_dev_notas, "ED", "E"),
+            "CODPROD": codprods[eidx],
+            "QT": eqt,
+            "PTABELA": pvenda[eidx],
+            "PUNIT": epunit,
+            "PERCICM": 0.0,
+            "SITTRIBUT": "60",
+            "DTMOV": nfe["DTENT"].to_numpy()[ent_nota],
+            "DTCANCEL": None,
+        })
+        _insert(conn, "PCNFENT", nfe)
+        _insert(conn, "PCESTCOM", estcom)
+        _insert(conn, "PCMOV", emov)
+        _insert(conn, "PCMOVCOMPLE", pd.DataFrame({"NUMTRANSITEM": eitems, "VLICMS": 0.0}))
+        counts["PCNFENT"] += n_ent
+        counts["PCMOV"] += m
+        next_ent += n_ent
+        next_item += m
+
+        conn.commit()
+        if logger:
+            logger(f"🧪 {dia.strftime('%d/%m/%Y')}: {n_notas} notas de saída, {n} itens, {n_ent} notas de entrada")
+        dia += timedelta(days=1)
+    return counts
+
+def build_database(path: str | Path, d0: date, d1: date, scale: int = 10_000, seed: int = 0,
+                   codfilial: int = 1, logger=None) -> Path:
+    """
+    Cria (ou recria) o banco local com o schema e o movimento do período.
+
+    Args:
+        path: Arquivo SQLite
+        d0: Primeiro dia
+        d1: Último dia
+        scale: Linhas de venda por dia
+        seed: Semente do gerador
+        codfilial: Filial do movimento
+        logger: Função para log (opcional)
+
+    Returns:
+        Path do banco
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(str(path))
+    try:
+        conn.executescript(SCHEMA)
+        populate(conn, d0, d1, scale=scale, seed=seed, codfilial=codfilial, logger=logger)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .cli import _parse_date
+    ap = argparse.ArgumentParser(prog="python -m aurora_iqvia.standin",
+                                 description="Gera o banco local (SQLite) no lugar do schema PRISMA")
+    ap.add_argument("--db", required=True, help="arquivo SQLite a criar")
+    ap.add_argument("--ini", type=_parse_date, required=True, help="data inicial (dd/mm/aaaa)")
+    ap.add_argument("--fim", type=_parse_date, help="data final (dd/mm/aaaa); padrão = data inicial")
+    ap.add_argument("--scale", type=int, default=10_000, help="linhas de venda por dia")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--filial", type=int, default=1)
+    args = ap.parse_args(argv)
+    log = lambda m: print(m, file=sys.stderr, flush=True)
+    path = build_database(args.db, args.ini, args.fim or args.ini, scale=args.scale, seed=args.seed,
+                          codfilial=args.filial, logger=log)
+    print(path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
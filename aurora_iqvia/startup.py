@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Medição do tempo de abertura do aplicativo.
+- Marcos (mark) desde o início do processo: imports, janela criada, janela visível.
+- Tempo de import por módulo no estilo `python -X importtime` (próprio e acumulado),
+  medido via gancho em builtins.__import__ enquanto o relatório estiver ligado.
+"""
+
+from __future__ import annotations
+import builtins
+import sys
+import time
+from importlib.util import resolve_name
+from typing import List, Tuple, Optional
+
+_T0 = time.perf_counter()
+
+class ImportTimer:
+    def __init__(self):
+        # (módulo, próprio em s, acumulado em s, profundidade)
+        self.records: List[Tuple[str, float, float, int]] = []
+        self._children: List[float] = []
+        self._orig = None
+
+    def install(self):
+        if self._orig is None:
+            self._orig = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._orig is not None:
+            builtins.__import__ = self._orig
+            self._orig = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        full = name
+        if level:
+            try:
+                full = resolve_name("." * level + name, (globals or {}).get("__package__") or "")
+            except Exception:
+                full = name
+        if full in sys.modules:
+            return self._orig(name, globals, locals, fromlist, level)
+        depth = len(self._children)
+        self._children.append(0.0)
+        t = time.perf_counter()
+        try:
+            return self._orig(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - t
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += cumulative
+            self.records.append((full, cumulative - children, cumulative, depth))
+
+class StartupReport:
+    def __init__(self, trace_imports: bool = True):
+        self.marks: List[Tuple[str, float]] = []
+        self.imports: Optional[ImportTimer] = ImportTimer() if trace_imports else None
+        if self.imports is not None:
+            self.imports.install()
+
+    def mark(self, label: str):
+        """Registra um marco (segundos desde o início do processo)."""
+        self.marks.append((label, time.perf_counter() - _T0))
+
+    def finish(self):
+        if self.imports is not None:
+            self.imports.uninstall()
+
+    def render(self, top: int = 25) -> str:
+        """
+        Monta o relatório em texto.
+
+        Args:
+            top: Quantidade de módulos mais lentos (acumulado) exibidos
+
+        Returns:
+            Relatório pronto para log
+        """
+        lines = ["⏱️ Tempo de abertura:"]
+        for label, t in self.marks:
+            lines.append(f"  {t*1000:8.1f} ms  {label}")
+        if self.imports is not None and self.imports.records:
+            lines.append("📦 Imports (próprio | acumulado, ms):")
+            recs = sorted(self.imports.records, key=lambda r: r[2], reverse=True)[:top]
+            for name, own, cum, depth in recs:
+                lines.append(f"  {own*1000:8.1f} | {cum*1000:8.1f}  {'  ' * depth}{name}")
+        return "\n".join(lines)
+
+_report: Optional[StartupReport] = None
+
+def enable(trace_imports: bool = True) -> StartupReport:
+    """Liga o relatório de abertura (chamar antes dos imports do app)."""
+    global _report
+    if _report is None:
+        _report = StartupReport(trace_imports=trace_imports)
+        _report.mark("início do processo")
+    return _report
+
+def mark(label: str):
+    """Registra um marco se o relatório estiver ligado (no-op caso contrário)."""
+    if _report is not None:
+        _report.mark(label)
+
+def current() -> Optional[StartupReport]:
+    return _report
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador de dados sintéticos no formato do WinThor, para benchmarks sem Oracle.
+- Produz os mesmos DataFrames (mesmas colunas) das queries SQL_* de sql_prisma:
+  mov, dev, fil, cli, est, produtos_unicos e entradas.
+- Escala configurável (linhas de venda: de 1 mil a 2 milhões).
+- Inclui textos com mojibake (latin1/utf-8), brindes (PUNIT = 0) e produtos sem EAN
+  (parte deles recuperável pelas notas de entrada).
+"""
+
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Dict, Any
+
+from .db import restore_none
+
+MOJIBAKE = [
+    "SÃƒO PAULO", "SÃ£O JOSÃ‰", "FARMÃ¡CIA BOA SAÃºDE", "DROGARIA AÃ§AÃ", "PERFUMARIA ESTRELA",
+    "CONCEIÃ§ÃƒO", "DISTRIBUIDORA GOIÃ¢NIA", "LOJA ï¿½NICA", "COSMÉTICOS BELÉM", "RIBEIRÃO PRETO",
+]
+CIDADES = [("SAO PAULO", "SP"), ("SÃƒO LUÃS", "MA"), ("GOIANIA", "GO"), ("BELÉM", "PA"),
+           ("CURITIBA", "PR"), ("RIBEIRÃ£O PRETO", "SP"), ("FORTALEZA", "CE"), ("MACEIÃ³", "AL")]
+PALAVRAS = ["SHAMPOO", "CONDICIONADOR", "CREME", "HIDRATANTE", "SABONETE", "PERFUME", "BATOM",
+            "ESMALTE", "MÃ¡SCARA", "LOÇÃO", "DESODORANTE", "PROTETOR SOLAR", "ÓLEO", "GEL"]
+
+# Colunas exatamente como selecionadas pelas queries SQL_* (ordem inclusa)
+COLUMNS = {
+    "mov": ["CODFILIAL", "RAZAOSOCIAL", "CGC", "FANTASIA_FILIAL", "ENDERECOFILIAL", "CEP", "CIDADE", "UF",
+            "TELEFONE", "CODCLI", "CLIENTE", "CGCENT", "FANTASIA_CLIENT", "ENDERECOCLI", "CEPENT", "MUNICENT",
+            "ESTENT", "TELENT", "CODPROD", "CODAUXILIAR", "NBM", "DESCRICAO", "CODFORNEC", "FORNECEDOR",
+            "PTABELA", "PUNIT", "QT", "PERCICM", "VLICMS", "SITTRIBUT", "NUMNOTA", "SERIE", "VLTOTAL",
+            "CHAVENFE", "DTSAIDA", "TIPO_OPERACAO", "BRINDE"],
+    "dev": ["CODFILIAL", "CLIENTE", "CODCLI", "CGCENT", "FANTASIA_CLIENT", "ENDERECOCLI", "CEPENT", "MUNICENT",
+            "ESTENT", "TELENT", "CODPROD", "CODAUXILIAR", "NBM", "DESCRICAO", "CODFORNEC", "FORNECEDOR",
+            "PTABELA", "PUNIT", "QT", "PERCICM", "VLICMS", "SITTRIBUT", "NUMNOTA", "SERIE", "VLTOTAL",
+            "CHAVENFE", "DTSAIDA", "TIPO_OPERACAO", "BRINDE", "MOTIVO_DEVOLUCAO"],
+    "fil": ["CODFILIAL", "RAZAOSOCIAL", "CGC", "FANTASIA_FILIAL", "ENDERECOFILIAL", "CEP", "CIDADE", "UF",
+            "TELEFONE"],
+    "cli": ["CODCLI", "CLIENTE", "CGCENT", "FANTASIA_CLIENT", "ENDERECOCLI", "CEPENT", "MUNICENT", "ESTENT",
+            "TELENT"],
+    "est": ["CODFILIAL", "CODPROD", "CODAUXILIAR", "NBM", "DESCRICAO", "CODFORNEC", "FORNECEDOR", "PTABELA",
+            "DT", "ESTOQUEATUAL"],
+    "produtos_unicos": ["CODPROD", "CODAUXILIAR", "NBM", "DESCRICAO", "CODFORNEC", "FORNECEDOR", "PTABELA"],
+    "entradas": ["CODPROD", "CODAUXILIAR", "PUNIT", "DTENT", "RN"],
+}
+
+def _digits(rng, n: int, size: int):
+    """n strings de `size` dígitos (primeiro dígito diferente de zero)."""
+    import numpy as np
+    out = None
+    first = True
+    while size > 0:
+        k = min(size, 18)
+        lo = 10 ** (k - 1) if first else 0
+        part = rng.integers(lo, 10 ** k, n, dtype=np.int64).astype(str)
+        if not first:
+            part = np.char.zfill(part, k)
+        out = part if out is None else np.char.add(out, part)
+        size -= k
+        first = False
+    return out.astype(object)
+
+def make_master(scale: int, seed: int = 0, codfilial: int = 1) -> Dict[str, Any]:
+    """
+    Cadastros (filial, clientes, fornecedores, produtos) proporcionais à escala.
+
+    Args:
+        scale: Quantidade de linhas de venda do dia de referência
+        seed: Semente do gerador (resultados reprodutíveis)
+        codfilial: Código da filial
+
+    Returns:
+        Dicionário de DataFrames {filial, clientes, fornecedores, produtos}
+    """
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+
+    n_cli = int(min(max(50, scale // 25), 200_000))
+    n_prod = int(min(max(100, scale // 15), 40_000))
+    n_forn = int(min(max(10, n_prod // 40), 2_000))
+
+    cid = rng.integers(0, len(CIDADES), n_cli)
+    pj = rng.random(n_cli) < 0.7
+    cgc = np.where(pj, _digits(rng, n_cli, 14), _digits(rng, n_cli, 11))
+    cgc = np.array([f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}" if len(d) == 14 else d for d in cgc],
+                   dtype=object)
+    moj = rng.random(n_cli) < 0.08
+    nomes = np.array([f"CLIENTE {i:06d} COSMETICOS LTDA" for i in range(n_cli)], dtype=object)
+    nomes[moj] = np.array(MOJIBAKE, dtype=object)[rng.integers(0, len(MOJIBAKE), int(moj.sum()))]
+    clientes = pd.DataFrame({
+        "CODCLI": np.arange(1000, 1000 + n_cli, dtype=np.int64),
+        "CLIENTE": nomes,
+        "CGCENT": cgc,
+        "FANTASIA": np.where(rng.random(n_cli) < 0.2, None, nomes),
+        "ENDERENT": np.array([f"RUA {i % 500} DA ESPERANÃ§A" if i % 17 == 0 else f"AV BRASIL {i % 900}"
+                              for i in range(n_cli)], dtype=object),
+        "NUMEROENT": np.where(rng.random(n_cli) < 0.1, None, rng.integers(1, 3000, n_cli).astype(str)),
+        "CEPENT": np.array([f"{d[:5]}-{d[5:]}" for d in _digits(rng, n_cli, 8)], dtype=object),
+        "MUNICENT": np.array([CIDADES[i][0] for i in cid], dtype=object),
+        "ESTENT": np.array([CIDADES[i][1] for i in cid], dtype=object),
+        "TELENT": np.where(rng.random(n_cli) < 0.15, None,
+                           np.array([f"({d[:2]}) {d[2:7]}-{d[7:]}" for d in _digits(rng, n_cli, 11)], dtype=object)),
+    })
+
+    fornecedores = pd.DataFrame({
+        "CODFORNEC": np.arange(1, n_forn + 1, dtype=np.int64),
+        "FORNECEDOR": np.array([f"FABRICANTE {i:04d} IND E COM" if i % 9 else "INDÃºSTRIA BELEZA S/A"
+                                for i in range(n_forn)], dtype=object),
+    })
+
+    pal = np.array(PALAVRAS, dtype=object)
+    desc = np.array([f"{pal[i % len(pal)]} {pal[(i * 7) % len(pal)]} {100 + i % 400}ML" for i in range(n_prod)],
+                    dtype=object)
+    ean = _digits(rng, n_prod, 13)
+    sem_ean = rng.random(n_prod) < 0.05
+    ean = np.where(sem_ean, None, ean)
+    pvenda = np.round(rng.gamma(2.0, 25.0, n_prod), 2)
+    pvenda[rng.random(n_prod) < 0.03] = 0.0
+    produtos = pd.DataFrame({
+        "CODPROD": np.arange(10_000, 10_000 + n_prod, dtype=np.int64),
+        "CODAUXILIAR": ean,
+        "NBM": _digits(rng, n_prod, 8),
+        "DESCRICAO": desc,
+        "CODFORNEC": rng.integers(1, n_forn + 1, n_prod),
+        "PVENDA": pvenda,
+        "CODEPTO": np.where(rng.random(n_prod) < 0.02, 196, 1),
+    })
+
+    filial = pd.DataFrame({
+        "CODIGO": [codfilial],
+        "RAZAOSOCIAL": ["PRISMA DISTRIBUIDORA DE COSMÃ‰TICOS LTDA"],
+        "CGC": ["12.345.678/0001-99"],
+        "FANTASIA": ["PRISMA CD"],
+        "ENDERECO": ["ROD BR 153 KM 5"],
+        "NUMERO": [None],
+        "CEP": ["74000-000"],
+        "CIDADE": ["GOIÃ¢NIA"],
+        "UF": ["GO"],
+        "TELEFONE": ["(62) 3200-0000"],
+    })
+    return {"filial": filial, "clientes": clientes, "fornecedores": fornecedores, "produtos": produtos}
+
+def generate_day(scale: int = 10_000, seed: int = 0, dia: date | None = None, codfilial: int = 1,
+                 master: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """
+    Gera os DataFrames de um dia no formato das queries SQL_*.
+
+    Args:
+        scale: Quantidade de linhas de venda (SQL_MOV)
+        seed: Semente do gerador (resultados reprodutíveis)
+        dia: Dia de referência (padrão: ontem)
+        codfilial: Código da filial
+        master: Cadastros de make_master (gerados se omitidos)
+
+    Returns:
+        Dicionário {mov, dev, fil, cli, est, produtos_unicos, entradas} de DataFrames
+    """
+    import numpy as np
+    import pandas as pd
+    dia = dia or (date.today() - timedelta(days=1))
+    master = master or make_master(scale, seed, codfilial)
+    rng = np.random.default_rng(seed + dia.toordinal())
+    clientes, produtos, fornecedores, filial = (master["clientes"], master["produtos"],
+                                                master["fornecedores"], master["filial"])
+
+    # produtos vendáveis: com EAN e fora do departamento 196 (mesmos filtros do SQL_MOV)
+    vend = produtos[produtos["CODAUXILIAR"].notna() & (produtos["CODEPTO"] != 196)].reset_index(drop=True)
+    vend = vend.merge(fornecedores, on="CODFORNEC", how="left")
+    fil = filial.iloc[0]
+    fil_cols = {
+        "CODFILIAL": int(fil["CODIGO"]),
+        "RAZAOSOCIAL": fil["RAZAOSOCIAL"],
+        "CGC": fil["CGC"],
+        "FANTASIA_FILIAL": fil["FANTASIA"],
+        "ENDERECOFILIAL": f"{fil['ENDERECO']},{fil['NUMERO'] or '0'}",
+        "CEP": fil["CEP"],
+        "CIDADE": fil["CIDADE"],
+        "UF": fil["UF"],
+        "TELEFONE": fil["TELEFONE"],
+    }
+
+    def client_cols(cl):
+        return {
+            "CODCLI": cl["CODCLI"].to_numpy(),
+            "CLIENTE": cl["CLIENTE"].to_numpy(),
+            "CGCENT": cl["CGCENT"].to_numpy(),
+            "FANTASIA_CLIENT": cl["FANTASIA"].where(cl["FANTASIA"].notna(), cl["CLIENTE"]).to_numpy(),
+            "ENDERECOCLI": (cl["ENDERENT"] + "," + cl["NUMEROENT"].fillna("0")).to_numpy(),
+            "CEPENT": cl["CEPENT"].to_numpy(),
+            "MUNICENT": cl["MUNICENT"].to_numpy(),
+            "ESTENT": cl["ESTENT"].to_numpy(),
+            "TELENT": cl["TELENT"].to_numpy(),
+        }
+
+    def product_cols(pr):
+        return {
+            "CODPROD": pr["CODPROD"].to_numpy(),
+            "CODAUXILIAR": pr["CODAUXILIAR"].to_numpy(),
+            "NBM": pr["NBM"].to_numpy(),
+            "DESCRICAO": pr["DESCRICAO"].to_numpy(),
+            "CODFORNEC": pr["CODFORNEC"].to_numpy(),
+            "FORNECEDOR": pr["FORNECEDOR"].to_numpy(),
+        }
+
+    def movement(n, tipo):
+        cl = clientes.iloc[rng.integers(0, len(clientes), n)].reset_index(drop=True)
+        pr = vend.iloc[rng.integers(0, len(vend), n)].reset_index(drop=True)
+        ptab = pr["PVENDA"].to_numpy().copy()
+        punit = np.round(ptab * rng.uniform(0.85, 1.0, n), 2)
+        brinde = rng.random(n) < 0.03
+        punit[brinde] = 0.0
+        percicm = rng.choice([0.0, 7.0, 12.0, 17.0, 18.0], n)
+        qt = rng.integers(1, 48, n)
+        lines_per_note = 8
+        numnota = 100_000 + np.arange(n) // lines_per_note
+        hour = rng.integers(7, 20, n)
+        dts = pd.to_datetime(dia) + pd.to_timedelta(hour, unit="h")
+        chave = _digits(rng, n, 44)
+        chave[rng.random(n) < 0.02] = None
+        out = {}
+        out.update(client_cols(cl))
+        out.update(product_cols(pr))
+        out.update({
+            "PTABELA": ptab,
+            "PUNIT": punit,
+            "QT": qt,
+            "PERCICM": percicm,
+            "VLICMS": np.round(punit * qt * percicm / 100.0, 2),
+            "SITTRIBUT": rng.choice(np.array(["60", "00", "10", None], dtype=object), n),
+            "NUMNOTA": numnota,
+            "SERIE": np.full(n, "1", dtype=object),
+            "VLTOTAL": np.round(punit * qt, 2),
+            "CHAVENFE": chave,
+            "DTSAIDA": dts,
+            "TIPO_OPERACAO": np.full(n, tipo, dtype=object),
+            "BRINDE": np.where(brinde, "S", "N").astype(object),
+        })
+        return out
+
+    m = movement(scale, "VENDA")
+    mov = pd.DataFrame({**{k: [v] * scale for k, v in fil_cols.items()}, **m})[COLUMNS["mov"]]
+    mov = mov.sort_values(["DTSAIDA", "NUMNOTA"], kind="stable").reset_index(drop=True)
+
+    n_dev = max(1, scale // 50)
+    d = movement(n_dev, "DEVOLUCAO")
+    d["BRINDE"] = np.full(n_dev, "N", dtype=object)
+    d["MOTIVO_DEVOLUCAO"] = rng.choice(np.array(["AVARIA", "DEVOLUCAO", "VENCIDO"], dtype=object), n_dev)
+    dev = pd.DataFrame({"CODFILIAL": [fil_cols["CODFILIAL"]] * n_dev, **d})[COLUMNS["dev"]]
+
+    fil_df = pd.DataFrame([fil_cols])[COLUMNS["fil"]]
+
+    cods = pd.unique(np.concatenate([mov["CODCLI"].to_numpy(), dev["CODCLI"].to_numpy()]))
+    cli = pd.DataFrame(client_cols(clientes[clientes["CODCLI"].isin(cods)]))[COLUMNS["cli"]]
+    cli = cli.sort_values("CODCLI").reset_index(drop=True)
+
+    # estoque: ~60% dos produtos com saldo positivo (inclui produtos sem EAN: não filtrados no SQL_ESTOQUE)
+    allp = produtos[produtos["CODEPTO"] != 196].merge(fornecedores, on="CODFORNEC", how="left")
+    com_saldo = allp[rng.random(len(allp)) < 0.6].reset_index(drop=True)
+    est = pd.DataFrame({
+        "CODFILIAL": fil_cols["CODFILIAL"],
+        **product_cols(com_saldo),
+        "PTABELA": com_saldo["PVENDA"].to_numpy(),
+        "DT": pd.Timestamp(dia),
+        "ESTOQUEATUAL": rng.integers(1, 5_000, len(com_saldo)),
+    })[COLUMNS["est"]]
+
+    # produtos únicos: com estoque + vendidos + devolvidos, todos com EAN (filtro do SQL_PRODUTOS_UNICOS)
+    usados = pd.unique(np.concatenate([com_saldo["CODPROD"].to_numpy(), mov["CODPROD"].to_numpy(),
+                                       dev["CODPROD"].to_numpy()]))
+    pu = allp[allp["CODPROD"].isin(usados) & allp["CODAUXILIAR"].notna()]
+    produtos_unicos = pd.DataFrame({**product_cols(pu), "PTABELA": pu["PVENDA"].to_numpy()})[COLUMNS["produtos_unicos"]]
+    produtos_unicos = produtos_unicos.sort_values("CODPROD").reset_index(drop=True)
+
+    # entradas do último ano: algumas por produto, EAN às vezes ausente no cadastro mas presente aqui
+    n_ent = max(10, len(produtos) * 3)
+    ent_prod = produtos.iloc[rng.integers(0, len(produtos), n_ent)].reset_index(drop=True)
+    ent_ean = ent_prod["CODAUXILIAR"].to_numpy().copy()
+    faltando = pd.isna(ent_ean)
+    ent_ean[faltando] = np.where(rng.random(int(faltando.sum())) < 0.7,
+                                 _digits(rng, int(faltando.sum()), 13), None)
+    entradas = pd.DataFrame({
+        "CODPROD": ent_prod["CODPROD"].to_numpy(),
+        "CODAUXILIAR": ent_ean,
+        "PUNIT": np.round(ent_prod["PVENDA"].to_numpy() * rng.uniform(0.4, 0.7, n_ent), 2),
+        "DTENT": pd.to_datetime(dia) - pd.to_timedelta(rng.integers(0, 365, n_ent), unit="D"),
+    })
+    entradas = entradas.sort_values(["CODPROD", "DTENT"], ascending=[True, False], kind="stable")
+    entradas["RN"] = entradas.groupby("CODPROD").cumcount() + 1
+    entradas = entradas.reset_index(drop=True)[COLUMNS["entradas"]]
+
+    frames = {"mov": mov, "dev": dev, "fil": fil_df, "cli": cli, "est": est,
+              "produtos_unicos": produtos_unicos, "entradas": entradas}
+    # texto como o driver entrega: objetos Python, NULL = None
+    for df in frames.values():
+        restore_none(df)
+    return frames
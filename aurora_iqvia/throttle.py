@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Controle de carga no Oracle do WinThor (throttle_enabled), para extrair em horário de operação do depósito.
+- Sessões: no máximo throttle_max_sessions consultas ao mesmo tempo (e o pool não passa disso).
+- Ritmo: no máximo throttle_max_queries_per_min consultas iniciadas em qualquer janela de 60 s.
+- Pausa adaptativa: cada consulta é comparada com a referência da mesma consulta (segundos por mil linhas,
+  em <saída>/throttle.json). Acima de throttle_slowdown × a referência, o ERP está carregado: as próximas
+  consultas esperam o tempo excedente (até throttle_max_pause_s).
+- Horário livre (throttle_quiet_hours, ex.: "22-06"): sem limites, e a referência é medida (média móvel).
+  Só ali: medida no pico, a referência já viria inflada. Sem referência da consulta (nenhuma execução no
+  horário livre ainda, ou horário livre vazio), não há pausa adaptativa.
+"""
+
+from __future__ import annotations
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+
+BASELINE_FILE = "throttle.json"
+WINDOW_S = 60.0
+# peso da última medida na referência (horário livre)
+EWMA = 0.3
+# consultas pequenas: abaixo de mil linhas o custo fixo domina, compara o tempo total
+MIN_ROWS = 1000
+
+def parse_hours(spec: str):
+    """
+    Intervalo de horas "HH-HH" (ex.: "22-06", atravessando a meia-noite); vazio = nunca.
+
+    Raises:
+        ValueError: Formato inválido
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return None
+    try:
+        a, b = (int(x) for x in spec.split("-"))
+    except ValueError:
+        raise ValueError(f"Horário livre inválido (use HH-HH, ex.: 22-06): {spec}")
+    if not (0 <= a <= 23 and 0 <= b <= 24):
+        raise ValueError(f"Horário livre inválido (use HH-HH, ex.: 22-06): {spec}")
+    return a, b
+
+def _unit(seconds: float, rows: int) -> float:
+    return seconds * MIN_ROWS / max(int(rows or 0), MIN_ROWS)
+
+class Throttle:
+    def __init__(self, max_sessions: int = 2, max_queries_per_min: int = 30, slowdown: float = 1.5,
+                 max_pause_s: float = 60.0, quiet_hours: str = "", out_dir: Optional[Path] = None,
+                 logger: Optional[Callable[[str], None]] = None, now: Callable[[], datetime] = datetime.now):
+        self.max_sessions = max(1, int(max_sessions or 1))
+        self.max_queries_per_min = max(0, int(max_queries_per_min or 0))
+        self.slowdown = max(1.0, float(slowdown or 1.0))
+        self.max_pause_s = max(0.0, float(max_pause_s or 0))
+        self.quiet = parse_hours(quiet_hours)
+        self.path = Path(out_dir) / BASELINE_FILE if out_dir else None
+        self.logger = logger
+        self.now = now
+        self._cond = threading.Condition()
+        self._active = 0
+        self._starts: deque = deque()
+        self._resume_at = 0.0
+        self.baseline: Dict[str, float] = {}
+        self.stats = {"waited_s": 0.0, "pauses": 0, "paused_s": 0.0, "queries": 0}
+        self._load()
+
+    def _load(self):
+        if self.path is None:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.baseline = {str(k): float(v) for k, v in data.get("baseline", {}).items()}
+        except Exception:
+            self.baseline = {}
+
+    def save(self):
+        """Grava a referência por consulta em <saída>/throttle.json."""
+        if self.path is None:
+            return
+        with self._cond:
+            data = {"baseline": dict(sorted(self.baseline.items())),
+                    "updated": self.now().strftime("%Y-%m-%d %H:%M:%S")}
+        try:
+            self.path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        except OSError:
+            pass
+
+    def is_quiet(self) -> bool:
+        """Se agora é horário livre (sem limites)."""
+        if self.quiet is None:
+            return False
+        a, b = self.quiet
+        h = self.now().hour
+        return a <= h < b if a < b else (h >= a or h < b)
+
+    def _wait_s(self, t: float) -> float:
+        # quanto falta para poder começar outra consulta (0 = pode agora)
+        if self._active >= self.max_sessions:
+            return 0.5
+        wait = max(0.0, self._resume_at - t)
+        if self.max_queries_per_min:
+            while self._starts and t - self._starts[0] >= WINDOW_S:
+                self._starts.popleft()
+            if len(self._starts) >= self.max_queries_per_min:
+                wait = max(wait, WINDOW_S - (t - self._starts[0]))
+        return wait
+
+    @contextmanager
+    def slot(self, name: str = "SQL"):
+        """
+        Reserva a vez de uma consulta: espera sessão livre, o ritmo por minuto e a pausa adaptativa
+        (nada disso no horário livre).
+        """
+        t0 = time.monotonic()
+        with self._cond:
+            if not self.is_quiet():
+                while True:
+                    wait = self._wait_s(time.monotonic())
+                    if wait <= 0:
+                        break
+                    self._cond.wait(timeout=wait)
+            self._active += 1
+            self._starts.append(time.monotonic())
+            self.stats["queries"] += 1
+            self.stats["waited_s"] += time.monotonic() - t0
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def observe(self, name: str, seconds: float, rows: int):
+        """
+        Compara a consulta com a referência e, se o ERP estiver lento, pausa as próximas.
+
+        Args:
+            name: Nome da consulta (ex.: SQL_MOV)
+            seconds: Tempo total (execute + fetch)
+            rows: Linhas retornadas
+        """
+        unit = _unit(seconds, rows)
+        quiet = self.is_quiet()
+        with self._cond:
+            base = self.baseline.get(name)
+            if quiet:
+                self.baseline[name] = unit if base is None else (1 - EWMA) * base + EWMA * unit
+                return
+            if base is None or base <= 0 or unit <= base * self.slowdown:
+                return
+            # o excedente sobre a referência, na escala da consulta medida
+            pause = min(self.max_pause_s, seconds * (1 - base / unit))
+            if pause <= 0:
+                return
+            self._resume_at = max(self._resume_at, time.monotonic() + pause)
+            self.stats["pauses"] += 1
+            self.stats["paused_s"] += pause
+        if self.logger and pause >= 1:
+            self.logger(f"🐢 ERP carregado: {name} {unit / base:.1f}× mais lenta que a referência; "
+                        f"pausando {pause:.0f}s antes da próxima consulta")
+
+    def summary(self) -> Dict[str, Any]:
+        """Esperas e pausas da execução (para o resumo)."""
+        with self._cond:
+            return {"max_sessions": self.max_sessions, "max_queries_per_min": self.max_queries_per_min,
+                    "queries": self.stats["queries"], "waited_s": round(self.stats["waited_s"], 1),
+                    "pauses": self.stats["pauses"], "paused_s": round(self.stats["paused_s"], 1)}
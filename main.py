@@ -1,4 +1,12 @@
 # -*- coding: utf-8 -*-
+import os
+import sys
+
+# Relatório de tempo de abertura: `python main.py --startup-report` (ou GDDI_STARTUP_REPORT=1)
+if "--startup-report" in sys.argv or os.environ.get("GDDI_STARTUP_REPORT"):
+    from aurora_iqvia import startup
+    startup.enable()
+
 from aurora_iqvia.gui import run_app
 
 if __name__ == "__main__":